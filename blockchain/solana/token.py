@@ -1,8 +1,9 @@
 # there are likely to be some API issues due to free tier  limitations such as ratelimits and slow response``
 import logging
 import aiohttp
+from services.http_session import get_http_session
 from solders.pubkey import Pubkey
-from solana.rpc.async_api import AsyncClient
+from blockchain.solana.utils import get_solana_client
 from typing import Dict, Optional
 import os
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
@@ -50,30 +51,30 @@ async def get_solana_token_info(token_address: str) -> Optional[Dict]:
         logger.error(f"Invalid Solana address format: {token_address} - Error: {str(e)}")
         return None
 
-    async with aiohttp.ClientSession() as session:
-        sol_price_usd = await get_sol_price(session)
+    session = get_http_session()
+    sol_price_usd = await get_sol_price(session)
 
-        # Try Dexscreener first (fastest)
-        token_info = await fetch_from_dexscreener(session, token_address, sol_price_usd)
-        if token_info:
-            logger.info(f"Fetched Solana token info from Dexscreener for {token_address}")
-            return token_info
+    # Try Dexscreener first (fastest)
+    token_info = await fetch_from_dexscreener(session, token_address, sol_price_usd)
+    if token_info:
+        logger.info(f"Fetched Solana token info from Dexscreener for {token_address}")
+        return token_info
+
+    # Fallback to Jupiter free tier (no auth needed)
+    token_info = await fetch_from_jupiter_free(session, token_address, sol_price_usd)
+    if token_info:
+        logger.info(f"Fetched Solana token info from Jupiter (free tier) for {token_address}")
+        return token_info
 
-        # Fallback to Jupiter free tier (no auth needed)
-        token_info = await fetch_from_jupiter_free(session, token_address, sol_price_usd)
+    # Authenticated Jupiter only if API key exists and free tier fails
+    if JUPITER_API_KEY:
+        token_info = await fetch_from_jupiter_authenticated(session, token_address, sol_price_usd)
         if token_info:
-            logger.info(f"Fetched Solana token info from Jupiter (free tier) for {token_address}")
+            logger.info(f"Fetched detailed Solana token info from Jupiter (authenticated) for {token_address}")
             return token_info
 
-        # Authenticated Jupiter only if API key exists and free tier fails
-        if JUPITER_API_KEY:
-            token_info = await fetch_from_jupiter_authenticated(session, token_address, sol_price_usd)
-            if token_info:
-                logger.info(f"Fetched detailed Solana token info from Jupiter (authenticated) for {token_address}")
-                return token_info
-
-        logger.error(f"No token info found for {token_address}")
-        return None
+    logger.error(f"No token info found for {token_address}")
+    return None
 
 async def fetch_from_dexscreener(session: aiohttp.ClientSession, token_address: str, sol_price_usd: float) -> Optional[Dict]:
     url = f"{DEXSCREENER_API}/{token_address}"
@@ -174,15 +175,15 @@ async def fetch_from_jupiter_free(session: aiohttp.ClientSession, token_address:
     # RPC for mintable/renounced only (skip holders_count to avoid rate limits)
     holders_count, mintable, renounced = 0, False, False
     if price_usd > 0 or name != "Unknown":
-        async with AsyncClient(SOLANA_RPC_URL) as rpc:
-            try:
-                pubkey = Pubkey.from_string(token_address)
-                mint_data = await rpc.get_account_info(pubkey)
-                if mint_data.value:
-                    mintable = mint_data.value.data.parsed["info"]["mintAuthority"] is not None
-                    renounced = mint_data.value.data.parsed["info"]["mintAuthority"] is None
-            except Exception as e:
-                logger.warning(f"RPC fetch skipped for {token_address} due to: {str(e)}")
+        rpc = get_solana_client(SOLANA_RPC_URL)
+        try:
+            pubkey = Pubkey.from_string(token_address)
+            mint_data = await rpc.get_account_info(pubkey)
+            if mint_data.value:
+                mintable = mint_data.value.data.parsed["info"]["mintAuthority"] is not None
+                renounced = mint_data.value.data.parsed["info"]["mintAuthority"] is None
+        except Exception as e:
+            logger.warning(f"RPC fetch skipped for {token_address} due to: {str(e)}")
 
         if price_impact == 0.0:
             trade_amount_usd = 0.01 * sol_price_usd
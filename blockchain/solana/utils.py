@@ -1,5 +1,6 @@
 import logging
-import aiohttp
+from typing import Dict
+from services.http_session import get_http_session
 from solders.pubkey import Pubkey
 from solana.rpc.async_api import AsyncClient
 
@@ -9,6 +10,27 @@ logger = logging.getLogger(__name__)
 SOLANA_RPC_URL = "https://api.mainnet-beta.solana.com"  # Replace with your own RPC if needed
 COINGECKO_API_URL = "https://api.coingecko.com/api/v3"
 
+# One RPC client per endpoint, kept open so calls reuse its pooled keep-alive connections
+_rpc_clients: Dict[str, AsyncClient] = {}
+
+def get_solana_client(endpoint: str = SOLANA_RPC_URL) -> AsyncClient:
+    """
+    Return the shared Solana RPC client for an endpoint, creating it on first use.
+
+    Callers must not close it (or use it as a context manager); close_solana_clients
+    releases every client on shutdown.
+    """
+    client = _rpc_clients.get(endpoint)
+    if client is None:
+        client = _rpc_clients[endpoint] = AsyncClient(endpoint)
+    return client
+
+async def close_solana_clients() -> None:
+    """Close every shared Solana RPC client."""
+    while _rpc_clients:
+        _, client = _rpc_clients.popitem()
+        await client.close()
+
 async def get_sol_balance(wallet_address: str) -> float:
     """
     Fetch the SOL balance for a given Solana wallet address.
@@ -26,13 +48,12 @@ async def get_sol_balance(wallet_address: str) -> float:
         Exception: If the wallet address is invalid or the RPC request fails.
     """
     try:
-        async with AsyncClient(SOLANA_RPC_URL) as client:
-            pubkey = Pubkey.from_string(wallet_address)
-            response = await client.get_balance(pubkey)
-            lamports = response.value  # Balance in lamports
-            sol = lamports / 1_000_000_000  # Convert lamports to SOL
-            logger.info(f"Fetched SOL balance for {wallet_address}: {sol} SOL")
-            return sol
+        pubkey = Pubkey.from_string(wallet_address)
+        response = await get_solana_client().get_balance(pubkey)
+        lamports = response.value  # Balance in lamports
+        sol = lamports / 1_000_000_000  # Convert lamports to SOL
+        logger.info(f"Fetched SOL balance for {wallet_address}: {sol} SOL")
+        return sol
     except Exception as e:
         logger.error(f"Error fetching SOL balance for {wallet_address}: {str(e)}")
         return 0.0
@@ -52,17 +73,17 @@ async def get_sol_price() -> float:
         Exception: If the network request fails or the API response is malformed.
     """
     try:
-        async with aiohttp.ClientSession() as session:
-            url = f"{COINGECKO_API_URL}/simple/price?ids=solana&vs_currencies=usd"
-            async with session.get(url) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    price = data.get("solana", {}).get("usd", 0.0)
-                    logger.info(f"Fetched SOL price: ${price}")
-                    return price
-                else:
-                    logger.error(f"Failed to fetch SOL price: {response.status}")
-                    return 0.0
+        session = get_http_session()
+        url = f"{COINGECKO_API_URL}/simple/price?ids=solana&vs_currencies=usd"
+        async with session.get(url) as response:
+            if response.status == 200:
+                data = await response.json()
+                price = data.get("solana", {}).get("usd", 0.0)
+                logger.info(f"Fetched SOL price: ${price}")
+                return price
+            else:
+                logger.error(f"Failed to fetch SOL price: {response.status}")
+                return 0.0
     except Exception as e:
         logger.error(f"Error fetching SOL price: {str(e)}")
         return 0.0
\ No newline at end of file
@@ -1,12 +1,15 @@
+import asyncio
 import logging
-import aiohttp
 from pytoniq_core import Address
+from yarl import URL
 from tonutils.client import TonapiClient
 from tonutils.jetton.dex.stonfi import StonfiRouterV2
 from tonutils.jetton.dex.stonfi.v2.pton.constants import PTONAddresses
 from tonutils.utils import to_nano, to_amount
-from tonutils.wallet import WalletV4R2
+from blockchain.ton.utils import REQUEST_TIMEOUT, wait_for_balance_change
+from blockchain.ton.wallet import load_ton_wallet
 from services.crypto import CIPHER
+from services.http_session import get_http_session, read_json
 from typing import Dict
 import os
 
@@ -17,6 +20,11 @@ API_KEY = os.getenv("TON_API_KEY", "AGVENPU5U7V6FDQAAAAEOR3JTJPI7Q7EFPHIOEUOEVVE
 IS_TESTNET = os.getenv("IS_TESTNET", "False") == "True"
 JETTON_DECIMALS = 9  # Assuming 9 decimals for the jetton (e.g., USD₮), adjust if needed
 DEFAULT_SLIPPAGE_BPS = 50  # Default 0.5% slippage
+# STON.fi simulate URL with the static jetton -> TON fields pre-encoded; callers only add per-swap fields.
+_STONFI_SIMULATE_URL = URL("https://api.ston.fi/v1/swap/simulate").with_query({
+    "ask_address": PTONAddresses.TESTNET if IS_TESTNET else PTONAddresses.MAINNET,
+    "dex_v2": "true",
+})
 
 def nano_to_units(nano_amount: int, decimals: int) -> float:
     """Convert nano units to human-readable units (TON or jetton)."""
@@ -24,69 +32,72 @@ def nano_to_units(nano_amount: int, decimals: int) -> float:
 
 async def get_router_address(from_jetton_address: str, jetton_amount: float, slippage_bps: int) -> str:
     """Fetch the router address for a jetton-to-TON swap using STON.fi API."""
-    url = "https://api.ston.fi/v1/swap/simulate"
-    headers = {"Accept": "application/json"}
-    slippage_tolerance = slippage_bps / 100
-    params = {
+    url = _STONFI_SIMULATE_URL.update_query({
         "offer_address": from_jetton_address,
-        "ask_address": PTONAddresses.TESTNET if IS_TESTNET else PTONAddresses.MAINNET,
         "units": to_nano(jetton_amount, JETTON_DECIMALS),
-        "slippage_tolerance": slippage_tolerance,
-        "dex_v2": "true",
-    }
-    logger.info(f"Fetching router address with params: {params}")
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, params=params, headers=headers) as response:
+        "slippage_tolerance": slippage_bps / 100,
+    })
+    logger.info("Fetching router address: %s", url)
+    session = get_http_session()
+    async with asyncio.timeout(REQUEST_TIMEOUT):
+        async with session.post(url) as response:
             if response.status == 200:
-                content = await response.json()
-                logger.info(f"STON.fi simulation response: {content}")
+                content = await read_json(response)
+                logger.info("STON.fi simulation response: %s", content)
                 router_address = content.get("router_address")
                 if not router_address:
                     raise ValueError("Router address not found in API response.")
                 ask_units = content.get("ask_units", "N/A")
                 min_ask_units = content.get("min_ask_units", "N/A")
-                logger.info(f"Expected TON output: {nano_to_units(int(ask_units), 9) if ask_units != 'N/A' else 'N/A':.9f} TON, "
-                            f"Min expected: {nano_to_units(int(min_ask_units), 9) if min_ask_units != 'N/A' else 'N/A':.9f} TON")
+                if ask_units != "N/A" and min_ask_units != "N/A":
+                    logger.info("Expected TON output: %.9f TON, Min expected: %.9f TON",
+                                nano_to_units(int(ask_units), 9), nano_to_units(int(min_ask_units), 9))
                 return router_address
             else:
                 error_text = await response.text()
-                logger.error(f"Failed to get router address. Status: {response.status}, Error: {error_text}")
+                logger.error("Failed to get router address. Status: %s, Error: %s", response.status, error_text)
                 raise Exception(f"Failed to get router address: {response.status}: {error_text}")
 
-async def execute_jetton_to_ton_swap(wallet, from_jetton_address: str, jetton_amount: float, slippage_bps: int = DEFAULT_SLIPPAGE_BPS) -> Dict:
+async def prepare_jetton_to_ton_swap(wallet, from_jetton_address: str, jetton_amount: float, slippage_bps: int = DEFAULT_SLIPPAGE_BPS) -> Dict:
     """
-    Execute a jetton-to-TON swap on STON.fi DEX (V2) with slippage and gas fee tracking.
+    Do everything for a jetton-to-TON swap short of sending it: load the wallet, fetch the
+    TON balance, resolve the STON.fi router and build the transfer.
+
+    Nothing is signed or sent, so callers can start this while they still validate the sell
+    and drop the result if validation fails. Pass the result to send_jetton_to_ton_swap.
     """
     try:
         client = TonapiClient(api_key=API_KEY, is_testnet=IS_TESTNET)
         try:
             decrypted_mnemonic = CIPHER.decrypt(wallet.encrypted_private_key.encode('utf-8')).decode('utf-8')
             mnemonic_list = decrypted_mnemonic.split()
-            ton_wallet, _, _, _ = WalletV4R2.from_mnemonic(client, mnemonic_list)
+            ton_wallet = load_ton_wallet(client, mnemonic_list, wallet.public_key)
         except Exception as e:
-            logger.error(f"Failed to decrypt mnemonic: {str(e)}")
+            logger.error("Failed to decrypt mnemonic: %s", e)
             raise ValueError("Invalid encrypted mnemonic or decryption key")
 
-        # Fetch TON balance before swap (for gas fees)
-        ton_balance_before = await client.get_account_balance(ton_wallet.address.to_str())
-        logger.info(f"TON balance before swap: {nano_to_units(ton_balance_before, 9):.9f} TON ({ton_balance_before} nanoTON)")
-
-        router_address = await get_router_address(from_jetton_address, jetton_amount, slippage_bps)
+        # The pre-swap TON balance (for gas fees) and the router lookup are independent
+        ton_balance_before, router_address = await asyncio.gather(
+            client.get_account_balance(ton_wallet.address.to_str()),
+            get_router_address(from_jetton_address, jetton_amount, slippage_bps),
+        )
+        logger.info("TON balance before swap: %.9f TON (%d nanoTON)", nano_to_units(ton_balance_before, 9), ton_balance_before)
         router = StonfiRouterV2(client, router_address=Address(router_address))
 
         offer_amount = to_nano(jetton_amount, JETTON_DECIMALS)
         min_ask_amount = int(offer_amount * (1 - slippage_bps / 10000))  # Minimum TON output after slippage
-        logger.info(f"Offer amount: {nano_to_units(offer_amount, JETTON_DECIMALS):.9f} jettons ({offer_amount} nanoJettons), "
-                    f"Min TON output: {nano_to_units(min_ask_amount, 9):.9f} TON ({min_ask_amount} nanoTON)")
-
-        to, value, body = await router.get_swap_jetton_to_ton_tx_params(
-            offer_jetton_address=Address(from_jetton_address),
-            receiver_address=ton_wallet.address,
-            user_wallet_address=ton_wallet.address,
-            offer_amount=offer_amount,
-            min_ask_amount=min_ask_amount,
-            refund_address=ton_wallet.address,
-        )
+        logger.info("Offer amount: %.9f jettons (%d nanoJettons), Min TON output: %.9f TON (%d nanoTON)",
+                    nano_to_units(offer_amount, JETTON_DECIMALS), offer_amount, nano_to_units(min_ask_amount, 9), min_ask_amount)
+
+        async with asyncio.timeout(REQUEST_TIMEOUT):
+            to, value, body = await router.get_swap_jetton_to_ton_tx_params(
+                offer_jetton_address=Address(from_jetton_address),
+                receiver_address=ton_wallet.address,
+                user_wallet_address=ton_wallet.address,
+                offer_amount=offer_amount,
+                min_ask_amount=min_ask_amount,
+                refund_address=ton_wallet.address,
+            )
 
         # Check if TON balance covers gas fees
         if value > ton_balance_before:
@@ -95,22 +106,52 @@ async def execute_jetton_to_ton_swap(wallet, from_jetton_address: str, jetton_am
                             f"{nano_to_units(ton_balance_before, 9):.9f} TON available. "
                             f"Please fund your wallet to continue: {wallet_address}")
 
+        return {
+            "client": client,
+            "ton_wallet": ton_wallet,
+            "to": to,
+            "value": value,
+            "body": body,
+            "ton_balance_before": ton_balance_before,
+        }
+
+    except Exception as e:
+        logger.error("Failed to prepare jetton-to-TON swap: %s", e, exc_info=True)
+        raise
+
+async def send_jetton_to_ton_swap(prepared: Dict) -> Dict:
+    """
+    Sign and send a swap built by prepare_jetton_to_ton_swap, then wait for it to settle.
+
+    Returns:
+        A dict with tx_id and gas_fees_used (nanoTON).
+    """
+    try:
+        client, ton_wallet = prepared["client"], prepared["ton_wallet"]
+        ton_balance_before = prepared["ton_balance_before"]
         tx_hash = await ton_wallet.transfer(
-            destination=to,
-            amount=to_amount(value),
-            body=body,
+            destination=prepared["to"],
+            amount=to_amount(prepared["value"]),
+            body=prepared["body"],
         )
-        logger.info(f"Jetton-to-TON swap transaction sent via STON.fi (V2): {tx_hash}")
+        logger.info("Jetton-to-TON swap transaction sent via STON.fi (V2): %s", tx_hash)
 
-        ton_balance_after = await client.get_account_balance(ton_wallet.address.to_str())
-        logger.info(f"TON balance after swap: {nano_to_units(ton_balance_after, 9):.9f} TON ({ton_balance_after} nanoTON)")
+        ton_balance_after = await wait_for_balance_change(client, ton_wallet.address.to_str(), ton_balance_before)
+        logger.info("TON balance after swap: %.9f TON (%d nanoTON)", nano_to_units(ton_balance_after, 9), ton_balance_after)
 
         # Calculate gas fees (TON spent, not including jetton deduction)
         gas_fees_used = ton_balance_before - ton_balance_after
-        logger.info(f"Gas fees used: {nano_to_units(gas_fees_used, 9):.9f} TON ({gas_fees_used} nanoTON)")
+        logger.info("Gas fees used: %.9f TON (%d nanoTON)", nano_to_units(gas_fees_used, 9), gas_fees_used)
 
         return {"tx_id": tx_hash, "gas_fees_used": gas_fees_used}
 
     except Exception as e:
-        logger.error(f"Failed to execute jetton-to-TON swap: {str(e)}", exc_info=True)
+        logger.error("Failed to execute jetton-to-TON swap: %s", e, exc_info=True)
         raise
+
+async def execute_jetton_to_ton_swap(wallet, from_jetton_address: str, jetton_amount: float, slippage_bps: int = DEFAULT_SLIPPAGE_BPS) -> Dict:
+    """
+    Execute a jetton-to-TON swap on STON.fi DEX (V2) with slippage and gas fee tracking.
+    """
+    prepared = await prepare_jetton_to_ton_swap(wallet, from_jetton_address, jetton_amount, slippage_bps)
+    return await send_jetton_to_ton_swap(prepared)
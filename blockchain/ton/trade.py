@@ -1,13 +1,16 @@
+import asyncio
 import logging
 import os
-import aiohttp
 from pytoniq_core import Address
+from yarl import URL
 from tonutils.client import TonapiClient
 from tonutils.jetton.dex.stonfi import StonfiRouterV2
 from tonutils.jetton.dex.stonfi.v2.pton.constants import PTONAddresses
-from tonutils.utils import to_nano, to_amount
-from tonutils.wallet import WalletV4R2
+from tonutils.utils import to_amount
+from blockchain.ton.utils import REQUEST_TIMEOUT, wait_for_balance_change
+from blockchain.ton.wallet import load_ton_wallet
 from services.crypto import CIPHER
+from services.http_session import get_http_session, read_json
 from typing import Dict
 
 logger = logging.getLogger(__name__)
@@ -17,73 +20,77 @@ API_KEY = os.getenv("TON_API_KEY", "AGVENPU5U7V6FDQAAAAEOR3JTJPI7Q7EFPHIOEUOEVVE
 IS_TESTNET = os.getenv("IS_TESTNET", "False") == "True"
 DECIMALS = 9
 DEFAULT_SLIPPAGE_BPS = 50
+# STON.fi simulate URL with the static TON -> jetton fields pre-encoded; callers only add per-swap fields.
+_STONFI_SIMULATE_URL = URL("https://api.ston.fi/v1/swap/simulate").with_query({
+    "offer_address": PTONAddresses.TESTNET if IS_TESTNET else PTONAddresses.MAINNET,
+    "dex_v2": "true",
+})
 
 def nano_to_ton(nano_amount: int) -> float:
     """Convert nanoTON to TON for logging."""
     return nano_amount / 10**DECIMALS
 
-async def get_router_address(token_mint: str, amount_ton: float, slippage_bps: int) -> str:
-    url = "https://api.ston.fi/v1/swap/simulate"
-    headers = {"Accept": "application/json"}
-    slippage_tolerance = slippage_bps / 100
-    params = {
-        "offer_address": PTONAddresses.TESTNET if IS_TESTNET else PTONAddresses.MAINNET,
+async def get_router_address(token_mint: str, nano_amount: int, slippage_bps: int) -> str:
+    url = _STONFI_SIMULATE_URL.update_query({
         "ask_address": token_mint,
-        "units": to_nano(amount_ton, DECIMALS),
-        "slippage_tolerance": slippage_tolerance,
-        "dex_v2": "true",
-    }
-    logger.info(f"Fetching router address with params: {params}")
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, params=params, headers=headers) as response:
+        "units": nano_amount,
+        "slippage_tolerance": slippage_bps / 100,
+    })
+    logger.info("Fetching router address: %s", url)
+    session = get_http_session()
+    async with asyncio.timeout(REQUEST_TIMEOUT):
+        async with session.post(url) as response:
             if response.status == 200:
-                content = await response.json()
-                logger.info(f"STON.fi simulation response: {content}")
+                content = await read_json(response)
+                logger.info("STON.fi simulation response: %s", content)
                 router_address = content.get("router_address")
                 if not router_address:
                     raise ValueError("Router address not found in API response.")
                 ask_units = content.get("ask_units", "N/A")
                 min_ask_units = content.get("min_ask_units", "N/A")
-                logger.info(f"Expected output: {ask_units} nanoTON, Min expected: {min_ask_units} nanoTON")
+                logger.info("Expected output: %s nanoTON, Min expected: %s nanoTON", ask_units, min_ask_units)
                 return router_address
             else:
                 error_text = await response.text()
-                logger.error(f"Failed to get router address. Status: {response.status}, Error: {error_text}")
+                logger.error("Failed to get router address. Status: %s, Error: %s", response.status, error_text)
                 raise Exception(f"Failed to get router address: {response.status}: {error_text}")
 
-async def execute_ton_swap(wallet, token_mint: str, amount_ton: float, slippage_bps: int = DEFAULT_SLIPPAGE_BPS) -> Dict:
+async def execute_ton_swap(wallet, token_mint: str, nano_amount: int, slippage_bps: int = DEFAULT_SLIPPAGE_BPS) -> Dict:
     """
     Execute a token swap on TON using STON.fi DEX (V2) with non-bounceable (UQ) address in logs.
+
+    The amount to spend is given in nanoTON and the slippage in basis points, both as integers.
     """
     try:
         client = TonapiClient(api_key=API_KEY, is_testnet=IS_TESTNET)
         try:
             decrypted_mnemonic = CIPHER.decrypt(wallet.encrypted_private_key.encode('utf-8')).decode('utf-8')
             mnemonic_list = decrypted_mnemonic.split()
-            ton_wallet, _, _, _ = WalletV4R2.from_mnemonic(client, mnemonic_list)
+            ton_wallet = load_ton_wallet(client, mnemonic_list, wallet.public_key)
         except Exception as e:
-            logger.error(f"Failed to decrypt mnemonic: {str(e)}")
+            logger.error("Failed to decrypt mnemonic: %s", e)
             raise ValueError("Invalid encrypted mnemonic or decryption key")
 
         wallet_balance_before = await client.get_account_balance(ton_wallet.address.to_str())
-        logger.info(f"Wallet balance before swap: {nano_to_ton(wallet_balance_before):.9f} TON ({wallet_balance_before} nanoTON)")
+        logger.info("Wallet balance before swap: %.9f TON (%d nanoTON)", nano_to_ton(wallet_balance_before), wallet_balance_before)
 
-        router_address = await get_router_address(token_mint, amount_ton, slippage_bps)
+        router_address = await get_router_address(token_mint, nano_amount, slippage_bps)
         router = StonfiRouterV2(client, router_address=Address(router_address))
 
-        offer_amount = to_nano(amount_ton, DECIMALS)
-        min_ask_amount = int(offer_amount * (1 - slippage_bps / 10000))
-        logger.info(f"Offer amount: {nano_to_ton(offer_amount):.9f} TON ({offer_amount} nanoTON), "
-                    f"Min ask amount: {nano_to_ton(min_ask_amount):.9f} TON ({min_ask_amount} nanoTON)")
-
-        to, value, body = await router.get_swap_ton_to_jetton_tx_params(
-            user_wallet_address=ton_wallet.address,
-            receiver_address=ton_wallet.address,
-            offer_jetton_address=Address(token_mint),
-            offer_amount=offer_amount,
-            min_ask_amount=min_ask_amount,
-            refund_address=ton_wallet.address,
-        )
+        offer_amount = nano_amount
+        min_ask_amount = offer_amount * (10_000 - slippage_bps) // 10_000
+        logger.info("Offer amount: %.9f TON (%d nanoTON), Min ask amount: %.9f TON (%d nanoTON)",
+                    nano_to_ton(offer_amount), offer_amount, nano_to_ton(min_ask_amount), min_ask_amount)
+
+        async with asyncio.timeout(REQUEST_TIMEOUT):
+            to, value, body = await router.get_swap_ton_to_jetton_tx_params(
+                user_wallet_address=ton_wallet.address,
+                receiver_address=ton_wallet.address,
+                offer_jetton_address=Address(token_mint),
+                offer_amount=offer_amount,
+                min_ask_amount=min_ask_amount,
+                refund_address=ton_wallet.address,
+            )
 
         if value > wallet_balance_before:
             wallet_address = ton_wallet.address.to_str(is_bounceable=False)  # Use non-bounceable (UQ) format
@@ -96,19 +103,19 @@ async def execute_ton_swap(wallet, token_mint: str, amount_ton: float, slippage_
             amount=to_amount(value),
             body=body,
         )
-        logger.info(f"TON swap transaction sent via STON.fi (V2): {tx_hash}")
+        logger.info("TON swap transaction sent via STON.fi (V2): %s", tx_hash)
 
-        wallet_balance_after = await client.get_account_balance(ton_wallet.address.to_str())
-        logger.info(f"Wallet balance after swap: {nano_to_ton(wallet_balance_after):.9f} TON ({wallet_balance_after} nanoTON)")
+        wallet_balance_after = await wait_for_balance_change(client, ton_wallet.address.to_str(), wallet_balance_before)
+        logger.info("Wallet balance after swap: %.9f TON (%d nanoTON)", nano_to_ton(wallet_balance_after), wallet_balance_after)
 
         total_deducted = wallet_balance_before - wallet_balance_after
         gas_fees_used = total_deducted - offer_amount
-        logger.info(f"Total TON deducted: {nano_to_ton(total_deducted):.9f} TON ({total_deducted} nanoTON)")
-        logger.info(f"Gas fees used: {nano_to_ton(gas_fees_used):.9f} TON ({gas_fees_used} nanoTON)")
+        logger.info("Total TON deducted: %.9f TON (%d nanoTON)", nano_to_ton(total_deducted), total_deducted)
+        logger.info("Gas fees used: %.9f TON (%d nanoTON)", nano_to_ton(gas_fees_used), gas_fees_used)
 
         return {"tx_id": tx_hash, "gas_fees_used": gas_fees_used}
 
     except Exception as e:
-        logger.error(f"Failed to execute TON swap: {str(e)}", exc_info=True)
+        logger.error("Failed to execute TON swap: %s", e, exc_info=True)
         raise
 
@@ -1,7 +1,8 @@
+import asyncio
 import logging
-import aiohttp
 from urllib.parse import quote
 import os
+from services.http_session import get_http_session, read_json
 
 logger = logging.getLogger(__name__)
 
@@ -12,6 +13,9 @@ TON_KEY = "10e841ca2386a37d2fd7bdef7bdd271143da092418ff3337cfc45b2bd5f1d73e"
 
 TON_API_URL = "https://testnet.toncenter.com/api/v2" if IS_TESTNET else "https://toncenter.com/api/v2"
 COINGECKO_API_URL = "https://api.coingecko.com/api/v3"
+REQUEST_TIMEOUT = 5.0  # Upper bound (seconds) on any single upstream API call
+# Delays (seconds) between balance polls after a broadcast; the last one repeats until the timeout
+_POLL_DELAYS = (0.2, 0.2, 0.5, 0.5, 1.0, 1.0, 2.0)
 
 
 # ======== Functions ========
@@ -32,11 +36,12 @@ async def get_ton_balance(wallet_address: str) -> float:
         url = f"{TON_API_URL}/getAddressInformation?address={encoded_address}"
         headers = {"X-API-Key": TON_KEY} if TON_KEY != "YOUR_TONCENTER_API_KEY_HERE" else {}
 
-        async with aiohttp.ClientSession() as session:
-            logger.info(f"Querying TON balance ({'Testnet' if IS_TESTNET else 'Mainnet'}): {wallet_address}")
+        session = get_http_session()
+        logger.info(f"Querying TON balance ({'Testnet' if IS_TESTNET else 'Mainnet'}): {wallet_address}")
+        async with asyncio.timeout(REQUEST_TIMEOUT):
             async with session.get(url, headers=headers) as response:
                 if response.status == 200:
-                    data = await response.json()
+                    data = await read_json(response)
                     if data.get("ok"):
                         nanotons = int(data["result"]["balance"])
                         tons = nanotons / 1_000_000_000  # Convert nanotons to TON
@@ -64,11 +69,12 @@ async def get_ton_price() -> float:
         float: Current TON price in USD (0.0 if failed).
     """
     try:
-        async with aiohttp.ClientSession() as session:
-            url = f"{COINGECKO_API_URL}/simple/price?ids=the-open-network&vs_currencies=usd"
+        session = get_http_session()
+        url = f"{COINGECKO_API_URL}/simple/price?ids=the-open-network&vs_currencies=usd"
+        async with asyncio.timeout(REQUEST_TIMEOUT):
             async with session.get(url) as response:
                 if response.status == 200:
-                    data = await response.json()
+                    data = await read_json(response)
                     price = data.get("the-open-network", {}).get("usd", 0.0)
                     logger.info(f"Fetched TON price: ${price}")
                     return price
@@ -79,3 +85,38 @@ async def get_ton_price() -> float:
         logger.error(f"Error fetching TON price: {str(e)}")
         return 0.0
 
+
+async def wait_for_balance_change(client, addr: str, baseline: int, timeout: float = 30.0) -> int:
+    """
+    Poll an account balance until it differs from a baseline, e.g. after broadcasting a transfer.
+
+    Polls start quickly and back off (see _POLL_DELAYS), so fast-confirming transactions
+    resolve in well under a second without hammering the API for slow ones.
+
+    Args:
+        client: tonutils client used to query the balance.
+        addr (str): Account address to watch.
+        baseline (int): Balance in nanoTON before the transaction.
+        timeout (float): Maximum number of seconds to wait.
+
+    Returns:
+        int: The changed balance in nanoTON, or the last observed balance if the timeout expired.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    balance = baseline
+    attempt = 0
+    while (remaining := deadline - loop.time()) > 0:
+        await asyncio.sleep(min(_POLL_DELAYS[min(attempt, len(_POLL_DELAYS) - 1)], remaining))
+        attempt += 1
+        try:
+            async with asyncio.timeout(REQUEST_TIMEOUT):
+                balance = await client.get_account_balance(addr)
+        except Exception as e:
+            logger.warning("Balance poll failed for %s: %s", addr, e)
+            continue
+        if balance != baseline:
+            return balance
+
+    logger.warning("Balance of %s unchanged after %ss", addr, timeout)
+    return balance
@@ -1,11 +1,48 @@
 import logging
+import os
+from pytoniq_core import Address
 from tonsdk.crypto import mnemonic_new
 from tonsdk.contract.wallet import Wallets, WalletVersionEnum
+from tonutils.client import TonapiClient
+from tonutils.wallet import WalletV4R2, WalletV5R1
 from services.crypto import CIPHER  
-from typing import Tuple
+from typing import List, Optional, Tuple, Union
 logger = logging.getLogger(__name__)
 
-def create_ton_wallet(version: str = "v4R2") -> Tuple[str, str]:
+IS_TESTNET = os.getenv("IS_TESTNET", "False") == "True"
+
+def load_ton_wallet(client: TonapiClient, mnemonic_list: List[str], address: Optional[str] = None) -> Union[WalletV4R2, WalletV5R1]:
+    """
+    Build the tonutils wallet contract matching a stored TON wallet.
+
+    Wallets created before v5R1 became the default are v4R2, so that contract is tried first;
+    the v5R1 contract is used when its derived address is the stored one.
+
+    Args:
+        client (TonapiClient): Client the wallet will send transactions through.
+        mnemonic_list (List[str]): The 24 decrypted mnemonic words.
+        address (Optional[str]): The stored wallet address. If omitted, v4R2 is assumed.
+
+    Returns:
+        Union[WalletV4R2, WalletV5R1]: The wallet contract owning the stored address.
+    """
+    wallet, _, _, _ = WalletV4R2.from_mnemonic(client, mnemonic_list)
+    if address is None:
+        return wallet
+
+    # tonsdk stores addresses in standard base64; pytoniq parses the url-safe alphabet
+    stored = Address(address.replace("+", "-").replace("/", "_"))
+    if wallet.address == stored:
+        return wallet
+
+    wallet_v5, _, _, _ = WalletV5R1.from_mnemonic(client, mnemonic_list)
+    if wallet_v5.address == stored:
+        return wallet_v5
+
+    logger.warning("Stored address %s matches neither v4R2 nor v5R1; using v4R2", address)
+    return wallet
+
+def create_ton_wallet(version: str = "v5R1") -> Tuple[str, str]:
     """
     Generate a new TON custodial wallet with a specified version (v4R2 or v5R1).
 
@@ -15,7 +52,7 @@ def create_ton_wallet(version: str = "v4R2") -> Tuple[str, str]:
 
     Args:
         version (str, optional): Wallet version to use. Accepts 'v4R2' or 'v5R1'.
-            Defaults to 'v4R2'. Falls back to 'v4R2' if 'v5R1' is unsupported.
+            Defaults to 'v5R1'. Any other value falls back to 'v4R2'.
 
     Returns:
         Tuple[str, str]: A tuple containing:
@@ -27,33 +64,34 @@ def create_ton_wallet(version: str = "v4R2") -> Tuple[str, str]:
             or encryption errors.
 
     Notes:
-        - Uses the tonsdk library to generate mnemonics and derive wallet details.
+        - Uses the tonsdk library to generate mnemonics and derive v4R2 wallet details.
+        - tonsdk has no v5R1 contract, so v5R1 addresses are derived with tonutils. v5R1 wallets
+          can sign up to 255 internal messages in one external message.
         - The mnemonic phrase is encrypted instead of the private key for recovery purposes.
-        - If 'v5R1' is specified but not supported by the tonsdk version, it falls back to 'v4R2'
-          with a logged warning.
+        - Use load_ton_wallet to rebuild the matching contract when signing transactions.
     """
     try:
-        wallet_version = (
-            WalletVersionEnum.v4r2 if version == "v4R2"
-            else WalletVersionEnum.v5r1 if version == "v5R1" and hasattr(WalletVersionEnum, "v5r1")
-            else WalletVersionEnum.v4r2
-        )
-        if version == "v5R1" and not hasattr(WalletVersionEnum, "v5r1"):
-            logger.warning("v5R1 not supported in this tonsdk version; falling back to v4R2")
-            wallet_version = WalletVersionEnum.v4r2
-
         mnemonics = mnemonic_new()  # 24-word mnemonic phrase
         mnemonic_str = " ".join(mnemonics)  # Convert list to string
-        _, _, private_key, wallet = Wallets.from_mnemonics(
-            mnemonics=mnemonics,
-            version=wallet_version,
-            workchain=0
-        )
-
-        address = wallet.address.to_string(
-            is_user_friendly=True,
-            is_bounceable=False
-        ).strip()
+
+        if version == "v5R1":
+            wallet_version = "v5R1"
+            # Address derivation is local; the client only supplies the network id
+            client = TonapiClient(api_key=os.getenv("TON_API_KEY", ""), is_testnet=IS_TESTNET)
+            wallet, _, _, _ = WalletV5R1.from_mnemonic(client, mnemonics)
+            address = wallet.address.to_str(is_user_friendly=True, is_bounceable=False).strip()
+        else:
+            wallet_version = WalletVersionEnum.v4r2
+            _, _, private_key, wallet = Wallets.from_mnemonics(
+                mnemonics=mnemonics,
+                version=wallet_version,
+                workchain=0
+            )
+
+            address = wallet.address.to_string(
+                is_user_friendly=True,
+                is_bounceable=False
+            ).strip()
 
         # Encrypt the mnemonic phrase instead of the private key
         encrypted_mnemonic = CIPHER.encrypt(mnemonic_str.encode('utf-8')).decode('utf-8')
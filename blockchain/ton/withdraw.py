@@ -1,66 +1,192 @@
+import asyncio
+import hashlib
 import logging
 import os
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import partial
 from tonutils.client import TonapiClient
-from tonutils.wallet import WalletV4R2
 from pytoniq_core import Address
+from blockchain.ton.wallet import load_ton_wallet
+from typing import Any, Dict, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
-async def send_ton_transaction(mnemonic: str, destination_address: str, nano_amount: int) -> str:
+# Read once at import; the key check is deferred to send time so importing never fails
+_TON_API_KEY = os.environ.get("TON_API_KEY")
+_TON_IS_TESTNET = os.environ.get("TON_IS_TESTNET", "False").lower() == "true"
+
+_client: Optional[TonapiClient] = None
+
+def _get_client() -> TonapiClient:
+    """Return the module-wide Tonapi client, creating it on first use."""
+    global _client
+    if _client is None:
+        if not _TON_API_KEY:
+            raise ValueError("TON_API_KEY environment variable is not set")
+        logger.debug("Using TON_API_KEY: %s... (masked)", _TON_API_KEY[:4])
+        logger.debug("Network: %s", "testnet" if _TON_IS_TESTNET else "mainnet")
+        _client = TonapiClient(api_key=_TON_API_KEY, is_testnet=_TON_IS_TESTNET)
+    return _client
+
+# Wallets derived from mnemonics (PBKDF2), keyed by a digest so the mnemonic itself isn't used as key
+_WALLET_CACHE_SIZE = 1024
+_wallet_cache: "OrderedDict[bytes, Any]" = OrderedDict()
+
+def _get_wallet(client: TonapiClient, mnemonic_words: Tuple[str, ...], source_address: Optional[str]):
+    """Return the wallet contract for a mnemonic, deriving it only on a cache miss."""
+    key = hashlib.blake2b(
+        f"{' '.join(mnemonic_words)}|{source_address or ''}".encode("utf-8"), digest_size=16
+    ).digest()
+    wallet = _wallet_cache.get(key)
+    if wallet is not None:
+        _wallet_cache.move_to_end(key)
+        return wallet
+
+    wallet = load_ton_wallet(client, list(mnemonic_words), source_address)
+    _wallet_cache[key] = wallet
+    if len(_wallet_cache) > _WALLET_CACHE_SIZE:
+        _wallet_cache.popitem(last=False)
+    return wallet
+
+# Cheap shape check run before the full base64 + CRC16 parse: user-friendly (EQ/UQ/kQ/0Q, either
+# base64 alphabet) or raw "workchain:hex" addresses
+_TON_ADDR_RE = re.compile(r"^(?:(?:EQ|UQ|kQ|0Q)[A-Za-z0-9_+/-]{46}|-?\d+:[0-9a-fA-F]{64})$")
+
+@dataclass(frozen=True, slots=True)
+class WithdrawalRequest:
+    """A TON withdrawal, validated once when it is created so the send path can trust it."""
+    mnemonic_words: Tuple[str, ...]
+    dest: str
+    nano: int
+    source_address: Optional[str] = None
+
+    def __post_init__(self):
+        if len(self.mnemonic_words) != 24:  # Standard TON mnemonic is 24 words
+            raise ValueError(f"Invalid mnemonic: Expected 24 words, got {len(self.mnemonic_words)}")
+        if not isinstance(self.nano, int) or self.nano <= 0:
+            raise ValueError("Amount must be a positive integer in nanoTON")
+        if not _TON_ADDR_RE.match(self.dest):
+            raise ValueError(f"Invalid TON destination address: {self.dest}")
+        try:
+            Address(self.dest)  # Verifies the checksum of well-formed addresses
+        except Exception:
+            raise ValueError(f"Invalid TON destination address: {self.dest}")
+
+# Withdrawals are queued and submitted in batches so concurrent users' transfers overlap
+_BATCH_WINDOW = 0.05  # Seconds to collect further transfers before submitting a batch
+_MAX_BATCH = 32
+_TRANSFER_TIMEOUT = 30.0  # Seconds a single wallet.transfer may take before it is abandoned
+_queue: Optional[asyncio.Queue] = None
+_worker: Optional[asyncio.Task] = None
+# Last submitted transfer task per wallet; the next one for that wallet waits for it
+_wallet_tails: Dict[Tuple[str, ...], asyncio.Task] = {}
+
+def _get_queue() -> asyncio.Queue:
+    """Return the withdrawal queue, (re)starting its worker task if needed."""
+    global _queue, _worker
+    if _queue is None:
+        _queue = asyncio.Queue()
+    if _worker is None or _worker.done():
+        _worker = asyncio.create_task(_withdrawal_worker(_queue))
+    return _queue
+
+async def _withdrawal_worker(queue: asyncio.Queue) -> None:
+    """Drain queued transfers every _BATCH_WINDOW seconds and start them without waiting on them."""
+    while True:
+        batch = [await queue.get()]
+        await asyncio.sleep(_BATCH_WINDOW)
+        while len(batch) < _MAX_BATCH and not queue.empty():
+            batch.append(queue.get_nowait())
+
+        # Transfers from the same wallet stay sequential so they don't race for its seqno
+        by_wallet: Dict[Tuple[str, ...], List[Tuple[WithdrawalRequest, asyncio.Future]]] = {}
+        for request, future in batch:
+            by_wallet.setdefault(request.mnemonic_words, []).append((request, future))
+        logger.debug("Submitting %d TON transfer(s) from %d wallet(s)", len(batch), len(by_wallet))
+        # Each wallet's transfers run as their own task, so a slow send never holds up the next
+        # batch; they are chained behind that wallet's previous task to keep its seqno order
+        for key, items in by_wallet.items():
+            task = asyncio.create_task(_run_transfers(items, _wallet_tails.get(key)))
+            _wallet_tails[key] = task
+            task.add_done_callback(partial(_release_tail, key))
+
+def _release_tail(key: Tuple[str, ...], task: asyncio.Task) -> None:
+    """Forget a wallet's finished transfer task unless a newer one has been chained behind it."""
+    if _wallet_tails.get(key) is task:
+        del _wallet_tails[key]
+
+async def _run_transfers(items: List[Tuple[WithdrawalRequest, asyncio.Future]], previous: Optional[asyncio.Task]) -> None:
+    """Send one wallet's queued transfers in order, after its previous batch, resolving each caller's future."""
+    if previous is not None:
+        await asyncio.wait((previous,))  # Only its completion matters; its outcome went to its callers
+    for request, future in items:
+        try:
+            tx_hash = await _send_transfer(request)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+        else:
+            if not future.done():
+                future.set_result(tx_hash)
+
+async def send_ton_transaction(mnemonic: str, destination_address: str, nano_amount: int, source_address: Optional[str] = None) -> str:
     """
     Send TON from the wallet identified by mnemonic to the destination address using tonutils.
+
+    The transfer is queued and submitted by a background worker together with any other
+    withdrawals that arrive within the batching window.
+
     Args:
         mnemonic: Wallet mnemonic phrase (space-separated words).
         destination_address: TON address to send to.
         nano_amount: Amount in nanoTON (1 TON = 10^9 nanoTON).
+        source_address: Stored address of the sending wallet, used to pick its contract version.
     Returns:
         Transaction hash as a string.
     Raises:
-        ValueError: If the API key is missing or destination address is invalid.
-        Exception: If the transaction fails.
+        Exception: If the API key is missing, the input is invalid, or the transaction fails.
     """
     try:
-        
-        api_key = os.getenv("TON_API_KEY")
-        if not api_key:
-            raise ValueError("TON_API_KEY environment variable is not set")
-        logger.debug(f"Using TON_API_KEY: {api_key[:4]}... (masked)")
-
-        # Initialize Tonapi client
-        is_testnet = os.getenv("TON_IS_TESTNET", "False").lower() == "true"
-        logger.debug(f"Network: {'testnet' if is_testnet else 'mainnet'}")
-        client = TonapiClient(api_key=api_key, is_testnet=is_testnet)
-
-        # Create wallet from mnemonic
-        mnemonic_list = mnemonic.split()
-        logger.debug(f"Mnemonic word count: {len(mnemonic_list)}")
-        if len(mnemonic_list) != 24:  # Standard TON mnemonic is 24 words
-            raise ValueError(f"Invalid mnemonic: Expected 24 words, got {len(mnemonic_list)}")
-        wallet, _, _, _ = WalletV4R2.from_mnemonic(client, mnemonic_list)
-        wallet_address = wallet.address.to_str(is_bounceable=False)
-        logger.debug(f"Wallet address: {wallet_address}")
-
-        # Validate amount and destination
-        if not isinstance(nano_amount, int) or nano_amount <= 0:
-            raise ValueError("Amount must be a positive integer in nanoTON")
-        amount_ton = nano_amount / 1_000_000_000
-        logger.debug(f"Amount: {amount_ton} TON ({nano_amount} nanoTON)")
-        
-        try:
-            Address(destination_address)
-            logger.debug(f"Destination address validated: {destination_address}")
-        except Exception:
-            raise ValueError(f"Invalid TON destination address: {destination_address}")
+        request = WithdrawalRequest(tuple(mnemonic.split()), destination_address, nano_amount, source_address)
+    except ValueError as e:
+        logger.error("Rejected TON withdrawal: %s", e)
+        raise Exception(f"TON transaction failed: {str(e)}")
+
+    future = asyncio.get_running_loop().create_future()
+    await _get_queue().put((request, future))
+    return await future
+
+async def _send_transfer(request: WithdrawalRequest) -> str:
+    """
+    Sign and broadcast a single, already validated TON transfer (see send_ton_transaction).
+
+    Raises:
+        Exception: If the API key is missing or the transaction fails.
+    """
+    try:
+        client = _get_client()
+        wallet = _get_wallet(client, request.mnemonic_words, request.source_address)
+        if logger.isEnabledFor(logging.DEBUG):  # Rendering the address is only worth it when logged
+            logger.debug("Wallet address: %s", wallet.address.to_str(is_bounceable=False))
+
+        amount_ton = request.nano / 1_000_000_000
+        logger.debug("Amount: %s TON (%d nanoTON) to %s", amount_ton, request.nano, request.dest)
 
         # Send the transaction
-        tx_hash = await wallet.transfer(
-            destination=destination_address,
-            amount=amount_ton,
-            body="Withdrawal via Not-Cotrader"
-        )
-        logger.info(f"TON transaction sent: {tx_hash}")
+        async with asyncio.timeout(_TRANSFER_TIMEOUT):
+            tx_hash = await wallet.transfer(
+                destination=request.dest,
+                amount=amount_ton,
+                body="Withdrawal via Not-Cotrader"
+            )
+        logger.info("TON transaction sent: %s", tx_hash)
         return tx_hash
 
+    except TimeoutError:
+        logger.error("TON transfer to %s timed out after %ss", request.dest, _TRANSFER_TIMEOUT)
+        raise Exception(f"TON transaction failed: no response within {_TRANSFER_TIMEOUT:.0f}s")
     except Exception as e:
-        logger.error(f"Failed to send TON transaction: {str(e)}", exc_info=True)
-        raise Exception(f"TON transaction failed: {str(e)}")
\ No newline at end of file
+        logger.error("Failed to send TON transaction: %s", e, exc_info=True)
+        raise Exception(f"TON transaction failed: {str(e)}")
@@ -1,10 +1,11 @@
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
 from langgraph.prebuilt import ToolNode, tools_condition
-from langgraph.checkpoint.memory import MemorySaver
 from bot.ai.state.agent_state import AgentState
+from bot.ai.state.checkpoint import create_checkpointer
 from langchain_groq import ChatGroq
-from langchain_core.messages import AIMessage
+from langchain_core.messages import AIMessage, message_chunk_to_message
+import functools
 import logging
 
 logger = logging.getLogger(__name__)
@@ -19,32 +20,41 @@ tools = [
     get_token_details, buy_ton_tokens, sell_ton_tokens
 ]
 
-# Initialize ChatGroq with the latest model
-llm = ChatGroq(
-    model="llama-3.3-70b-versatile",
-    temperature=0.7,
-    max_tokens=100
-).bind_tools(tools)
+@functools.lru_cache(maxsize=1)
+def _get_llm():
+    """Build ChatGroq with the tools bound once; binding generates every tool's JSON schema."""
+    return ChatGroq(
+        model="llama-3.3-70b-versatile",
+        temperature=0.7,
+        max_tokens=100
+    ).bind_tools(tools)
 
 # Define the chatbot node
 async def chatbot(state: AgentState) -> AgentState:
-    logger.info(f"Processing state: {state}")
+    logger.info("Processing %d messages for user %s", len(state["messages"]), state["user_id"])
     user_id = state["user_id"]
     messages = state["messages"]
     
-    # Invoke the LLM with the current messages
-    response = await llm.ainvoke(messages)
+    # Stream the completion so graph consumers (stream_mode="messages") get tokens as they arrive
+    llm = _get_llm()
+    response = None
+    async for chunk in llm.astream(messages):
+        response = chunk if response is None else response + chunk
+    if response is None:
+        # Nothing streamed back; fall back to a plain (non-streaming) call
+        logger.warning("Empty completion stream for user %s, retrying without streaming", user_id)
+        response = await llm.ainvoke(messages)
+    else:
+        response = message_chunk_to_message(response)
     
+    # Return only the new message: the add_messages reducer appends it, and the checkpointer
+    # holds live objects, so the incoming state must not be mutated in place
     if response.tool_calls:
-        # Add the tool call message to the state
-        messages.append(response)
         # Prepare tool calls with correct user_id
         for tool_call in response.tool_calls:
             tool_call["args"]["user_id"] = user_id  # Ensure user_id is correct
-    else:
-        messages.append(AIMessage(content=response.content))
-    
-    return {"messages": messages}
+        return {"messages": [response]}
+    return {"messages": [AIMessage(content=response.content)]}
 
 # Build the graph
 graph_builder = StateGraph(AgentState)
@@ -56,6 +66,6 @@ graph_builder.add_edge(START, "chatbot")
 graph_builder.add_conditional_edges("chatbot", tools_condition, {"tools": "tools", END: END})
 graph_builder.add_edge("tools", "chatbot")
 
-# Add memory
-memory = MemorySaver()
+# Add memory (in-process; state objects are kept live rather than pickled on every step)
+memory = create_checkpointer()
 trading_agent = graph_builder.compile(checkpointer=memory)
\ No newline at end of file
@@ -1,12 +1,29 @@
+import hashlib
+from collections import OrderedDict
 from groq import Groq
 from bot.ai.config import GROQ_API_KEY, DEFAULT_MODEL
 
 client = Groq(api_key=GROQ_API_KEY)
 
-def query_groq(prompt, model=DEFAULT_MODEL):
+# Completions for repeated prompts, keyed by a digest of (model, prompt); least recently used evicted first
+_CACHE_SIZE = 2048
+_cache = OrderedDict()
+
+def query_groq(prompt, model=DEFAULT_MODEL, cacheable=True):
+    """Send a single-turn prompt to Groq; pass cacheable=False to always hit the API."""
+    key = hashlib.blake2b(f"{model}\0{prompt}".encode("utf-8"), digest_size=16).digest()
+    if cacheable and key in _cache:
+        _cache.move_to_end(key)
+        return _cache[key]
+
     response = client.chat.completions.create(
         model=model,
         messages=[{"role": "user", "content": prompt}],
         max_tokens=100
     )
-    return response.choices[0].message.content
\ No newline at end of file
+    content = response.choices[0].message.content
+    if cacheable:
+        _cache[key] = content
+        if len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    return content
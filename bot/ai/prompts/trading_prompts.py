@@ -1,3 +1,5 @@
+from langchain_core.messages import SystemMessage
+
 TRADING_PROMPT = """
 You’re a co-trader cheeky, fast-talking trading bot. Keep it short, fun, and sharp. 
 Use these tools when needed:
@@ -12,4 +14,8 @@ make sure to reply casually,
 
 If unsure, ask for clarification (e.g., 'Which chain? How much? Where to?'). dont ever call a tool unless you have all the requiremrnts
 eg if a user wants to purchase a token u must ask it the address the amount etc 
-"""
\ No newline at end of file
+"""
+
+# Built once and shared by every conversation. The fixed id lets the checkpointer's message
+# reducer recognise the prompt instead of appending a fresh copy each time AI mode starts.
+TRADING_SYSTEM_MESSAGE = SystemMessage(content=TRADING_PROMPT, id="trading-system-prompt")
@@ -0,0 +1,26 @@
+from typing import Any, Tuple
+from langgraph.checkpoint.memory import MemorySaver
+
+class LiveObjectSerializer:
+    """
+    Checkpoint serializer that stores state objects as-is instead of pickling them.
+
+    Only safe for a checkpointer that never leaves the process, and only as long as graph nodes
+    return new values rather than mutating the state they were given.
+    """
+
+    def dumps(self, obj: Any) -> Any:
+        return obj
+
+    def loads(self, data: Any) -> Any:
+        return data
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, Any]:
+        return "live", obj
+
+    def loads_typed(self, data: Tuple[str, Any]) -> Any:
+        return data[1]
+
+def create_checkpointer() -> MemorySaver:
+    """In-process, dict-backed checkpointer that keeps live state objects per thread."""
+    return MemorySaver(serde=LiveObjectSerializer())
@@ -1,18 +1,66 @@
+import asyncio
+import bisect
 import logging
 from sqlalchemy.ext.asyncio import AsyncSession
-from database.db import get_async_session
-from services.utils import get_wallet_balance_and_usd
-from services.wallet_management import get_wallet
+from services.utils import get_wallet_balance_and_usd, invalidate_balance_cache, to_base_units, percent_to_bps, GAS_RESERVE_UNITS
+from services.wallet_management import cached_get_wallet
 from services.crypto import CIPHER
 from solders.keypair import Keypair
 from blockchain.ton.withdraw import send_ton_transaction
-import base58
-from services.token_info import get_token_info, detect_chain
+import based58
+from services.token_info import get_token_info, detect_chain, is_ton_address
 from services.ton_swap import execute_ton_swap, execute_jetton_to_ton_swap
 from langchain_core.tools import tool
 
 logger = logging.getLogger(__name__)
 
+# Success replies, parsed once at import and filled with format_map
+_WITHDRAW_OK = (
+    "Withdrew {amount:.6f} {unit} to `{dest}`\n"
+    "Tx: [TONScan](https://tonscan.org/tx/{tx})"
+).format_map
+_TOKEN_DETAILS = (
+    "Token scoop for `{address}`:\n"
+    "📛 Name: {name} ({symbol})\n"
+    "🌊 Liquidity: {liquidity}\n"
+    "💰 Market Cap: {market_cap}"
+).format_map
+_BUY_OK = (
+    "Snagged some tokens, bruv!\n"
+    "Spent: {amount:.6f} TON + {gas:.6f} TON gas\n"
+    "Tx: [TONScan](https://tonscan.org/tx/{tx})"
+).format_map
+_SELL_OK = (
+    "Dumped those tokens, fam!\n"
+    "Sold: {amount:.6f} tokens, Gas: {gas:.6f} TON\n"
+    "Tx: [TONScan](https://tonscan.org/tx/{tx})"
+).format_map
+
+def _exported_key(chain: str, encrypted_key: str) -> str:
+    """
+    Decrypt a stored key and render it for export (base58 keypair for Solana, mnemonic for TON).
+
+    Deliberately not cached: exports are rare, and the plaintext shouldn't outlive the reply.
+    """
+    decrypted_bytes = CIPHER.decrypt(encrypted_key.encode('utf-8'))
+    if chain == "solana":
+        keypair = Keypair.from_seed(decrypted_bytes[:32])
+        # based58 wraps a native Base58 codec; same output as the pure-Python base58 package.
+        # bytes(keypair) is the 64-byte secret||pubkey form, built in one go by solders.
+        return based58.b58encode(bytes(keypair)).decode('ascii')
+    return decrypted_bytes.decode('utf-8')
+
+# (threshold, divisor, suffix) in ascending order; _fmt_usd picks a row with one bisect
+_USD_SCALES = ((0.0, 1, ""), (1_000.0, 1_000, "k"), (1_000_000.0, 1_000_000, "m"))
+_USD_THRESHOLDS = tuple(threshold for threshold, _, _ in _USD_SCALES)
+
+def _fmt_usd(value: float) -> str:
+    """Format a USD amount compactly: $1.23m, $4.56k, $7.89, or Nil when zero/unknown."""
+    if not value > 0:
+        return "Nil"
+    _, divisor, suffix = _USD_SCALES[bisect.bisect_right(_USD_THRESHOLDS, value) - 1]
+    return f"${value / divisor:.2f}{suffix}"
+
 @tool
 async def show_wallet_info(user_id: int, chain: str) -> str:
     """Show wallet details for the given chain (solana or ton).
@@ -21,18 +69,17 @@ async def show_wallet_info(user_id: int, chain: str) -> str:
         user_id: The Telegram user ID.
         chain: The blockchain ('solana' or 'ton').
     """
-    async with await get_async_session() as session:
-        wallet = await get_wallet(str(user_id), chain, session)
-        if not wallet:
-            return f"No {chain.capitalize()} wallet found."
-        address = wallet.public_key
-        balance, usd_value = await get_wallet_balance_and_usd(address, chain)
-        chain_unit = "SOL" if chain == "solana" else "TON"
-        return (
-            f"{chain.capitalize()} Wallet:\n"
-            f"Address: `{address}`\n"
-            f"Balance: {balance:.6f} {chain_unit} (${usd_value:.2f})"
-        )
+    wallet = await cached_get_wallet(str(user_id), chain)
+    if not wallet:
+        return f"No {chain.capitalize()} wallet found."
+    address = wallet.public_key
+    balance, usd_value = await get_wallet_balance_and_usd(address, chain)
+    chain_unit = "SOL" if chain == "solana" else "TON"
+    return (
+        f"{chain.capitalize()} Wallet:\n"
+        f"Address: `{address}`\n"
+        f"Balance: {balance:.6f} {chain_unit} (${usd_value:.2f})"
+    )
 
 @tool
 async def export_wallet_key(user_id: int, chain: str) -> str:
@@ -42,29 +89,22 @@ async def export_wallet_key(user_id: int, chain: str) -> str:
         user_id: The Telegram user ID.
         chain: The blockchain ('solana' or 'ton').
     """
-    async with await get_async_session() as session:
-        wallet = await get_wallet(str(user_id), chain, session)
-        if not wallet or not wallet.encrypted_private_key:
-            return f"No {chain.capitalize()} wallet or private key found."
-        try:
-            encrypted_key = wallet.encrypted_private_key.encode('utf-8')
-            decrypted_bytes = CIPHER.decrypt(encrypted_key)
-            chain_display = "Solana" if chain == "solana" else "TON"
-            if chain == "solana":
-                keypair = Keypair.from_seed(decrypted_bytes[:32])
-                exported_key = base58.b58encode(keypair.secret() + bytes(keypair.pubkey())).decode('ascii')
-                key_label = "Private Key"
-            else:
-                exported_key = decrypted_bytes.decode('utf-8')
-                key_label = "Mnemonic Phrase"
-            return (
-                f"{chain_display} Wallet {key_label}:\n"
-                f"`{exported_key}`\n\n"
-                "⚠️ **Store this securely!** Do not share it."
-            )
-        except Exception as e:
-            logger.error(f"Export failed for {chain} wallet for user {user_id}: {str(e)}")
-            return f"Failed to export {chain.capitalize()} key."
+    wallet = await cached_get_wallet(str(user_id), chain)
+    if not wallet or not wallet.encrypted_private_key:
+        return f"No {chain.capitalize()} wallet or private key found."
+    try:
+        # Decryption and base58 encoding are CPU-bound; keep them off the event loop
+        exported_key = await asyncio.to_thread(_exported_key, chain, wallet.encrypted_private_key)
+        chain_display = "Solana" if chain == "solana" else "TON"
+        key_label = "Private Key" if chain == "solana" else "Mnemonic Phrase"
+        return (
+            f"{chain_display} Wallet {key_label}:\n"
+            f"`{exported_key}`\n\n"
+            "⚠️ **Store this securely!** Do not share it."
+        )
+    except Exception as e:
+        logger.error("Export failed for %s wallet for user %s: %s", chain, user_id, e)
+        return f"Failed to export {chain.capitalize()} key."
 
 @tool
 async def withdraw_tokens(user_id: int, chain: str, amount: float, destination_address: str) -> str:
@@ -77,32 +117,37 @@ async def withdraw_tokens(user_id: int, chain: str, amount: float, destination_a
         destination_address: The destination wallet address.
     """
     chain_unit = "SOL" if chain == "solana" else "TON"
-    gas_reserve = 0.0001 if chain == "solana" else 0.003
-    async with await get_async_session() as session:
-        wallet = await get_wallet(str(user_id), chain, session)
-        if not wallet:
-            return f"No {chain.capitalize()} wallet found."
-        balance, _ = await get_wallet_balance_and_usd(wallet.public_key, chain)
-        if balance <= gas_reserve:
-            return f"Insufficient {chain_unit}. Balance: {balance:.6f}, need > {gas_reserve:.6f}."
-        max_withdrawable = balance - gas_reserve
-        if amount <= 0 or amount > max_withdrawable:
-            return f"Invalid amount. Must be between 0 and {max_withdrawable:.6f} {chain_unit}."
-        encrypted_key = wallet.encrypted_private_key.encode('utf-8')
-        private_key = CIPHER.decrypt(encrypted_key)
-        try:
-            if chain == "ton":
-                mnemonic = private_key.decode('utf-8')
-                nano_amount = int(amount * 1_000_000_000)
-                tx_id = await send_ton_transaction(mnemonic, destination_address, nano_amount)
-                return (
-                    f"Withdrew {amount:.6f} {chain_unit} to `{destination_address}`\n"
-                    f"Tx: [TONScan](https://tonscan.org/tx/{tx_id})"
-                )
-            return "Solana withdrawal not yet implemented."
-        except Exception as e:
-            logger.error(f"Withdrawal failed for user {user_id}: {str(e)}")
-            return f"Withdrawal failed: {str(e)}"
+    gas_reserve_units = GAS_RESERVE_UNITS.get(chain, GAS_RESERVE_UNITS["ton"])
+    gas_reserve = gas_reserve_units / 1_000_000_000
+    wallet = await cached_get_wallet(str(user_id), chain)
+    if not wallet:
+        return f"No {chain.capitalize()} wallet found."
+    # Decrypt in a worker thread while the balance request is in flight; the two don't depend on each other
+    balance_task = asyncio.create_task(get_wallet_balance_and_usd(wallet.public_key, chain))
+    try:
+        private_key = await asyncio.to_thread(CIPHER.decrypt, wallet.encrypted_private_key.encode('utf-8'))
+    except BaseException:
+        balance_task.cancel()
+        raise
+    balance, _ = await balance_task
+    # Compare in integer lamports/nanoTON; the model supplies amounts in whole coins
+    balance_units = to_base_units(balance)
+    if balance_units <= gas_reserve_units:
+        return f"Insufficient {chain_unit}. Balance: {balance:.6f}, need > {gas_reserve:.6f}."
+    max_withdrawable_units = balance_units - gas_reserve_units
+    nano_amount = to_base_units(amount)
+    if nano_amount <= 0 or nano_amount > max_withdrawable_units:
+        return f"Invalid amount. Must be between 0 and {max_withdrawable_units / 1_000_000_000:.6f} {chain_unit}."
+    try:
+        if chain == "ton":
+            mnemonic = private_key.decode('utf-8')
+            tx_id = await send_ton_transaction(mnemonic, destination_address, nano_amount, wallet.public_key)
+            invalidate_balance_cache(wallet.public_key, chain)
+            return _WITHDRAW_OK({"amount": amount, "unit": chain_unit, "dest": destination_address, "tx": tx_id})
+        return "Solana withdrawal not yet implemented."
+    except Exception as e:
+        logger.error("Withdrawal failed for user %s: %s", user_id, e)
+        return f"Withdrawal failed: {str(e)}"
 
 
 @tool
@@ -115,27 +160,19 @@ async def get_token_details(token_address: str) -> str:
             return "No dice, fam! Couldn’t snag details for that token."
         
         token_info, _ = result
-        liquidity = (
-            f"${token_info['liquidity']/1000:.2f}k" if token_info['liquidity'] >= 1000
-            else f"${token_info['liquidity']:.2f}" if token_info['liquidity'] > 0 else "Nil"
-        )
-        market_cap = (
-            f"${token_info['market_cap']/1000000:.2f}m" if token_info['market_cap'] >= 1000000
-            else f"${token_info['market_cap']/1000:.2f}k" if token_info['market_cap'] > 0 else "Nil"
-        )
+        liquidity = _fmt_usd(token_info['liquidity'])
+        market_cap = _fmt_usd(token_info['market_cap'])
         name = token_info.get("name", "Unknown")
         symbol = token_info.get("symbol", "N/A")
         
-        return (
-            f"Token scoop for `{token_address}`:\n"
-            f"📛 Name: {name} ({symbol})\n"
-            f"🌊 Liquidity: {liquidity}\n"
-            f"💰 Market Cap: {market_cap}"
-        )
+        return _TOKEN_DETAILS({
+            "address": token_address, "name": name, "symbol": symbol,
+            "liquidity": liquidity, "market_cap": market_cap,
+        })
     except ValueError:
         return "That’s a dodgy address, mate! Needs to be a proper Solana or TON token."
     except Exception as e:
-        logger.error(f"Error fetching token details for {token_address}: {str(e)}")
+        logger.error("Error fetching token details for %s: %s", token_address, e)
         return "Whoops, hit a snag grabbing that token’s deets!"
     
 @tool
@@ -145,28 +182,23 @@ async def buy_ton_tokens(user_id: int, token_address: str, amount_ton: float, sl
         return "Can’t buy with zero TON, genius! Gimme a real amount."
     
     try:
-        chain = detect_chain(token_address)
-        if chain != "ton":
+        if not is_ton_address(token_address):
             return "Oi, mate! That’s not a TON token address. Stick to TON for now!"
         
-        async with await get_async_session() as session:
-            wallet = await get_wallet(str(user_id), "ton", session)
-            if not wallet:
-                return "No TON wallet found, fam! Set one up first!"
+        wallet = await cached_get_wallet(str(user_id), "ton")
+        if not wallet:
+            return "No TON wallet found, fam! Set one up first!"
             
-            slippage_bps = int(slippage * 100)  # Convert percentage to basis points (e.g., 0.5% -> 50 bps)
-            result = await execute_ton_swap(wallet, token_address, amount_ton, slippage_bps)
-            tx_hash = result["tx_id"]
-            gas_fees = result["gas_fees_used"] / 10**9  # Convert nanoTON to TON
-            return (
-                f"Snagged some tokens, bruv!\n"
-                f"Spent: {amount_ton:.6f} TON + {gas_fees:.6f} TON gas\n"
-                f"Tx: [TONScan](https://tonscan.org/tx/{tx_hash})"
-            )
+        slippage_bps = percent_to_bps(slippage)  # Convert percentage to basis points (e.g., 0.5% -> 50 bps)
+        result = await execute_ton_swap(wallet, token_address, to_base_units(amount_ton), slippage_bps)
+        invalidate_balance_cache(wallet.public_key, "ton", token_address)
+        tx_hash = result["tx_id"]
+        gas_fees = result["gas_fees_used"] / 10**9  # Convert nanoTON to TON
+        return _BUY_OK({"amount": amount_ton, "gas": gas_fees, "tx": tx_hash})
     except ValueError as e:
         return f"Buy flopped! {str(e)}"
     except Exception as e:
-        logger.error(f"Buy failed for user {user_id}, token {token_address}: {str(e)}")
+        logger.error("Buy failed for user %s, token %s: %s", user_id, token_address, e)
         return f"Oof, buy went sideways! Error: {str(e)}"
 
 @tool
@@ -176,27 +208,22 @@ async def sell_ton_tokens(user_id: int, token_address: str, amount_tokens: float
         return "Can’t sell zero tokens, mate! Gimme a real amount."
     
     try:
-        chain = detect_chain(token_address)
-        if chain != "ton":
+        if not is_ton_address(token_address):
             return "Yo, that’s not a TON token! Keep it TON for now, yeah?"
         
-        async with await get_async_session() as session:
-            wallet = await get_wallet(str(user_id), "ton", session)
-            if not wallet:
-                return "No TON wallet found, fam! Set one up first!"
+        wallet = await cached_get_wallet(str(user_id), "ton")
+        if not wallet:
+            return "No TON wallet found, fam! Set one up first!"
             
-            slippage_bps = int(slippage * 100)  # Convert percentage to basis points
-            result = await execute_jetton_to_ton_swap(wallet, token_address, amount_tokens, slippage_bps)
-            tx_hash = result["tx_id"]
-            gas_fees = result["gas_fees_used"] / 10**9  # Convert nanoTON to TON
-            return (
-                f"Dumped those tokens, fam!\n"
-                f"Sold: {amount_tokens:.6f} tokens, Gas: {gas_fees:.6f} TON\n"
-                f"Tx: [TONScan](https://tonscan.org/tx/{tx_hash})"
-            )
+        slippage_bps = percent_to_bps(slippage)  # Convert percentage to basis points
+        result = await execute_jetton_to_ton_swap(wallet, token_address, to_base_units(amount_tokens), slippage_bps)
+        invalidate_balance_cache(wallet.public_key, "ton", token_address)
+        tx_hash = result["tx_id"]
+        gas_fees = result["gas_fees_used"] / 10**9  # Convert nanoTON to TON
+        return _SELL_OK({"amount": amount_tokens, "gas": gas_fees, "tx": tx_hash})
     except ValueError as e:
         return f"Sell tanked! {str(e)}"
     except Exception as e:
-        logger.error(f"Sell failed for user {user_id}, token {token_address}: {str(e)}")
+        logger.error("Sell failed for user %s, token %s: %s", user_id, token_address, e)
         return f"Whoops, sell hit the skids! Error: {str(e)}"
 
@@ -1,58 +1,102 @@
+import asyncio
 import logging
+import re
+from decimal import Decimal, InvalidOperation
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CallbackQueryHandler, ContextTypes, ConversationHandler, MessageHandler, filters
-from database.db import get_async_session
-from services.wallet_management import get_wallet
-from services.utils import get_wallet_balance_and_usd
-from services.token_info import get_token_info, format_token_info, detect_chain
+from services.wallet_management import cached_get_wallet
+from database.db import upsert_position
+from database.models import AsyncSessionFactory
+from services.utils import get_wallet_balance_and_usd, invalidate_balance_cache, to_base_units, percent_to_bps
+from services.token_info import get_token_info, invalidate_token_info, format_token_info, format_token_static, format_token_dynamic, detect_chain
 from blockchain.solana.trade import execute_solana_swap
 from blockchain.ton.trade import execute_ton_swap
+from bot.handlers.constants import MAIN_MENU, MAIN_MENU_BTN
 
 logger = logging.getLogger(__name__)
 
 # Conversation states
 TOKEN_ADDRESS, SET_AMOUNT, SET_SLIPPAGE, CONFIRM = range(4)
 
-# Import MAIN_MENU from main.py (we'll assume it's available)
-from handlers.constants import MAIN_MENU  # Adjust this import based on your file structure
+# chain -> (unit, default buy amount, swap function, explorer tx link). Only the Solana swap
+# reports output_amount (in 10^-9 units); the TON swap returns just tx_id and gas_fees_used
+_CHAIN_CONST = {
+    "solana": ("SOL", 0.5, execute_solana_swap, "[Solscan](https://solscan.io/tx/{})"),
+    "ton": ("TON", 1.5, execute_ton_swap, "[TONScan](https://tonscan.org/tx/{})"),
+}
+
+# Keyboard rows that never change; only the slippage/amount row is rebuilt
+_TRADE_ACTION_ROWS = (
+    (InlineKeyboardButton("Execute Trade", callback_data="buy_execute_trade"),
+     InlineKeyboardButton("Refresh", callback_data="refresh_token")),
+    (MAIN_MENU_BTN,),
+)
+
+def _render_token_view(context: ContextTypes.DEFAULT_TYPE, token_info: dict, chain: str,
+                       wallet_balance: float, chain_price_usd: float) -> tuple:
+    """
+    Build the token message and keyboard, reusing the parts cached in user_data.
+
+    The static part of the message is re-formatted only when token_info changes, and the
+    keyboard only when the slippage or amount does.
+    """
+    cached_static = context.user_data.get("formatted_static")
+    if cached_static is None or cached_static[0] != token_info:
+        cached_static = (token_info, format_token_static(token_info, chain))
+        context.user_data["formatted_static"] = cached_static
+    formatted_info = cached_static[1] + format_token_dynamic(token_info, chain, wallet_balance, chain_price_usd, context)
+
+    unit, default_amount, _, _ = _CHAIN_CONST[chain]
+    kb_key = (context.user_data.get("slippage", 5.0),
+              context.user_data.get("buy_amount", default_amount), unit)
+    cached_kb = context.user_data.get("kb")
+    if cached_kb is None or cached_kb[0] != kb_key:
+        slippage, buy_amount, _ = kb_key
+        cached_kb = (kb_key, InlineKeyboardMarkup((
+            (InlineKeyboardButton(f"Slippage: {slippage}%", callback_data="set_slippage"),
+             InlineKeyboardButton(f"Amount: {buy_amount} {unit}", callback_data="set_amount")),
+            *_TRADE_ACTION_ROWS,
+        )))
+        context.user_data["kb"] = cached_kb
+    return formatted_info, cached_kb[1]
 
 async def buy_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
     await query.answer()
-    user_id = str(update.effective_user.id)
 
-    if query.data == "buy_execute_trade":
-        return await confirm_buy(update, context)
-
-    if query.data.startswith("set_amount"):
-        await query.edit_message_text("Enter the amount to buy (e.g., 0.5 for SOL, 1.5 for TON):", parse_mode="Markdown")
-        return SET_AMOUNT
-
-    if query.data.startswith("set_slippage"):
-        await query.edit_message_text("Enter slippage percentage (e.g., 5):", parse_mode="Markdown")
-        return SET_SLIPPAGE
-
-    if query.data == "refresh_token":
-        return await refresh_token(update, context)
+    # "buy" (and anything unrecognised) starts the flow by asking for a token address
+    action = _BUY_ACTIONS.get(query.data, _prompt_token_address)
+    return await action(update, context)
 
+async def _prompt_token_address(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     msg = "Please send the token address you want to buy:"
-    await query.edit_message_text(msg, parse_mode="Markdown")
+    await update.callback_query.edit_message_text(msg, parse_mode="Markdown")
     return TOKEN_ADDRESS
 
+async def _prompt_amount(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    await update.callback_query.edit_message_text("Enter the amount to buy (e.g., 0.5 for SOL, 1.5 for TON):", parse_mode="Markdown")
+    return SET_AMOUNT
+
+async def _prompt_slippage(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    await update.callback_query.edit_message_text("Enter slippage percentage (e.g., 5):", parse_mode="Markdown")
+    return SET_SLIPPAGE
+
 async def token_address_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     user_id = str(update.effective_user.id)
     token_address = update.message.text.strip()
     chain = detect_chain(token_address)
-    unit = "SOL" if chain == "solana" else "TON"
 
-    async with await get_async_session() as session:
-        wallet = await get_wallet(user_id, chain, session)
-        if not wallet:
-            await update.message.reply_text(f"No {chain.capitalize()} wallet found. Create one first!", parse_mode="Markdown")
-            return ConversationHandler.END
-        wallet_balance, usd_value = await get_wallet_balance_and_usd(wallet.public_key, chain)
+    # Token metadata doesn't depend on the wallet, so fetch it while the wallet and balance load
+    token_task = asyncio.create_task(get_token_info(token_address))
+    wallet = await cached_get_wallet(user_id, chain)
+    if not wallet:
+        token_task.cancel()
+        await update.message.reply_text(f"No {chain.capitalize()} wallet found. Create one first!", parse_mode="Markdown")
+        return ConversationHandler.END
+    (wallet_balance, usd_value), result = await asyncio.gather(
+        get_wallet_balance_and_usd(wallet.public_key, chain), token_task
+    )
 
-    result = await get_token_info(token_address)
     if not result:
         await update.message.reply_text("Couldn’t fetch token info. Check the address and try again.")
         return TOKEN_ADDRESS
@@ -61,31 +105,28 @@ async def token_address_handler(update: Update, context: ContextTypes.DEFAULT_TY
     context.user_data["token_address"] = token_address
     context.user_data["token_info"] = token_info
     context.user_data["chain"] = chain
-    context.user_data["buy_amount"] = 0.5 if chain == "solana" else 1.5
+    context.user_data["buy_amount"] = _CHAIN_CONST[chain][1]
+    context.user_data["buy_amount_nano"] = to_base_units(context.user_data["buy_amount"])
     context.user_data["slippage"] = 5.0  # Default manual slippage
+    context.user_data["slippage_bps"] = 500
 
-    formatted_info = await format_token_info(token_info, chain, wallet_balance, chain_price_usd, context)
-    keyboard = [
-        [InlineKeyboardButton(f"Slippage: {context.user_data['slippage']}%", callback_data="set_slippage"),
-         InlineKeyboardButton(f"Amount: {context.user_data['buy_amount']} {unit}", callback_data="set_amount")],
-        [InlineKeyboardButton("Execute Trade", callback_data="buy_execute_trade"),
-         InlineKeyboardButton("Refresh", callback_data="refresh_token")],
-        [InlineKeyboardButton("Main Menu", callback_data="main_menu")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
-    await update.message.reply_text(formatted_info, reply_markup=reply_markup, parse_mode="Markdown")
-    logger.info(f"Displayed token details for {token_address} to user {user_id}")
+    formatted_info, reply_markup = _render_token_view(context, token_info, chain, wallet_balance, chain_price_usd)
+
+    sent = await update.message.reply_text(formatted_info, reply_markup=reply_markup, parse_mode="Markdown")
+    context.user_data["last_render_hash"] = (sent.message_id, hash((formatted_info, reply_markup)))
+    logger.info("Displayed token details for %s to user %s", token_address, user_id)
     return CONFIRM
 
 async def set_amount_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     user_id = str(update.effective_user.id)
     try:
-        amount = float(update.message.text.strip())
-        if amount <= 0:
+        amount = Decimal(update.message.text.strip())
+        if not amount.is_finite() or amount <= 0:
             raise ValueError
-        context.user_data["buy_amount"] = amount
-    except ValueError:
+        # The float is only for display; trades use the exact integer amount in nanoTON/lamports
+        context.user_data["buy_amount"] = float(amount)
+        context.user_data["buy_amount_nano"] = to_base_units(amount)
+    except (ValueError, InvalidOperation):
         await update.message.reply_text("Invalid amount. Enter a positive number (e.g., 0.5 for SOL, 1.5 for TON).", parse_mode="Markdown")
         return SET_AMOUNT
     return await refresh_token(update, context, from_message=True)
@@ -93,11 +134,12 @@ async def set_amount_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
 async def set_slippage_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     user_id = str(update.effective_user.id)
     try:
-        slippage = float(update.message.text.strip())
-        if slippage < 0 or slippage > 100:
+        slippage = Decimal(update.message.text.strip())
+        if not slippage.is_finite() or slippage < 0 or slippage > 100:
             raise ValueError
-        context.user_data["slippage"] = slippage
-    except ValueError:
+        context.user_data["slippage"] = float(slippage)
+        context.user_data["slippage_bps"] = percent_to_bps(slippage)
+    except (ValueError, InvalidOperation):
         await update.message.reply_text("Invalid slippage. Enter a number between 0 and 100 (e.g., 5).", parse_mode="Markdown")
         return SET_SLIPPAGE
     return await refresh_token(update, context, from_message=True)
@@ -112,11 +154,13 @@ async def refresh_token(update: Update, context: ContextTypes.DEFAULT_TYPE, from
         )
         return ConversationHandler.END
 
-    async with await get_async_session() as session:
-        wallet = await get_wallet(user_id, chain, session)
-        wallet_balance, usd_value = await get_wallet_balance_and_usd(wallet.public_key, chain)
+    # Balance (chain RPC) and token info (DEX APIs) are independent; wait only for the slower one
+    token_task = asyncio.create_task(get_token_info(token_address))
+    wallet = await cached_get_wallet(user_id, chain)
+    (wallet_balance, usd_value), result = await asyncio.gather(
+        get_wallet_balance_and_usd(wallet.public_key, chain), token_task
+    )
 
-    result = await get_token_info(token_address)
     if not result:
         await (update.message.reply_text if from_message else update.callback_query.edit_message_text)(
             "Couldn’t refresh token info. Try again later.", parse_mode="Markdown"
@@ -125,25 +169,21 @@ async def refresh_token(update: Update, context: ContextTypes.DEFAULT_TYPE, from
     token_info, chain_price_usd = result
     context.user_data["token_info"] = token_info
 
-    formatted_info = await format_token_info(token_info, chain, wallet_balance, chain_price_usd, context)
-    unit = "SOL" if chain == "solana" else "TON"
-    buy_amount = context.user_data.get("buy_amount", 0.5 if chain == "solana" else 1.5)
-    slippage = context.user_data.get("slippage", 5.0)
-
-    keyboard = [
-        [InlineKeyboardButton(f"Slippage: {slippage}%", callback_data="set_slippage"),
-         InlineKeyboardButton(f"Amount: {buy_amount} {unit}", callback_data="set_amount")],
-        [InlineKeyboardButton("Execute Trade", callback_data="buy_execute_trade"),
-         InlineKeyboardButton("Refresh", callback_data="refresh_token")],
-        [InlineKeyboardButton("Main Menu", callback_data="main_menu")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    formatted_info, reply_markup = _render_token_view(context, token_info, chain, wallet_balance, chain_price_usd)
 
+    render_hash = hash((formatted_info, reply_markup))
     if from_message:
-        await update.message.reply_text(formatted_info, reply_markup=reply_markup, parse_mode="Markdown")
+        sent = await update.message.reply_text(formatted_info, reply_markup=reply_markup, parse_mode="Markdown")
+        context.user_data["last_render_hash"] = (sent.message_id, render_hash)
     else:
+        # Telegram rejects edits that change nothing, so don't send them at all
+        message_id = update.callback_query.message.message_id
+        if context.user_data.get("last_render_hash") == (message_id, render_hash):
+            logger.debug("Token details for %s unchanged for user %s; skipping edit", token_address, user_id)
+            return CONFIRM
         await update.callback_query.edit_message_text(formatted_info, reply_markup=reply_markup, parse_mode="Markdown")
-    logger.info(f"Refreshed token details for {token_address} for user {user_id}")
+        context.user_data["last_render_hash"] = (message_id, render_hash)
+    logger.info("Refreshed token details for %s for user %s", token_address, user_id)
     return CONFIRM
 
 async def confirm_buy(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -154,12 +194,16 @@ async def confirm_buy(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
     token_address = context.user_data["token_address"]
     chain = context.user_data["chain"]
     amount = context.user_data["buy_amount"]
-    slippage = context.user_data["slippage"]
-    unit = "SOL" if chain == "solana" else "TON"
+    amount_nano = context.user_data.get("buy_amount_nano", to_base_units(amount))
+    slippage_bps = context.user_data.get("slippage_bps", percent_to_bps(context.user_data["slippage"]))
+    unit, _, swap, tx_link = _CHAIN_CONST[chain]
 
-    async with await get_async_session() as session:
-        wallet = await get_wallet(user_id, chain, session)
-        balance, usd_value = await get_wallet_balance_and_usd(wallet.public_key, chain)
+    # Refresh the token's price alongside the wallet and balance lookups
+    token_task = asyncio.create_task(get_token_info(token_address))
+    wallet = await cached_get_wallet(user_id, chain)
+    (balance, usd_value), result = await asyncio.gather(
+        get_wallet_balance_and_usd(wallet.public_key, chain), token_task
+    )
 
     if balance < amount + 0.01:
         await query.edit_message_text(
@@ -168,51 +212,45 @@ async def confirm_buy(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
         )
         return ConversationHandler.END
 
-    token_info = context.user_data["token_info"]
-    formatted_info = await format_token_info(token_info, chain, balance, 0, context)
+    if result:
+        token_info, chain_price_usd = result
+        context.user_data["token_info"] = token_info
+    else:
+        token_info, chain_price_usd = context.user_data["token_info"], 0
+    formatted_info = format_token_info(token_info, chain, balance, chain_price_usd, context)
 
     try:
-        if chain == "solana":
-            swap_result = await execute_solana_swap(wallet, token_address, amount, slippage)
-            output_amount = swap_result["output_amount"] / 1_000_000_000
-            entry_price = amount / output_amount if output_amount > 0 else 0.0 
-            tx_id = swap_result["tx_id"]
-            msg = (
-                f"{formatted_info}\n\n"
-                f"Buy Order Executed:\n"
-                f"Spent: {amount:.2f} SOL\n"
-                f"Received: {output_amount:.6f} {token_info['symbol']}\n"
-                f"Tx: [Solscan](https://solscan.io/tx/{tx_id})"
-            )
-        elif chain == "ton":
-            swap_result = await execute_ton_swap(wallet, token_address, amount, slippage)
-            output_amount = swap_result["output_amount"] / 1_000_000_000
-            entry_price = amount / output_amount if output_amount > 0 else 0.0 
-            tx_id = swap_result["tx_id"]
-            msg = (
-                f"{formatted_info}\n\n"
-                f"Buy Order Executed:\n"
-                f"Spent: {amount:.2f} TON\n"
-                f"Received: {output_amount:.6f} {token_info['symbol']}\n"
-                f"Tx: [TONScan](https://tonscan.org/tx/{tx_id})"
-            )
-        else:
-            raise ValueError(f"Unsupported chain: {chain}")
-        
-        # Store position data
-        if "positions" not in context.user_data:
-            context.user_data["positions"] = {}
-        context.user_data["positions"][token_address] = {
-            "entry_price": entry_price,
-            "chain": chain
-        }
+        swap_result = await swap(wallet, token_address, amount_nano, slippage_bps)
+        # The trade is broadcast; drop stale balances before anything below can fail
+        invalidate_balance_cache(wallet.public_key, chain, token_address)
+        invalidate_token_info(token_address)
+
+        output_units = swap_result.get("output_amount")
+        received = "" if output_units is None else f"Received: {output_units / 1_000_000_000:.6f} {token_info['symbol']}\n"
+        msg = (
+            f"{formatted_info}\n\n"
+            f"Buy Order Executed:\n"
+            f"Spent: {amount:.2f} {unit}\n"
+            f"{received}"
+            f"Tx: {tx_link.format(swap_result['tx_id'])}"
+        )
+
+        # Store position data; a failed write only loses the PnL baseline, not the trade.
+        # Without a reported output amount there is no entry price to record.
+        if output_units:
+            entry_price = amount / (output_units / 1_000_000_000)
+            try:
+                async with AsyncSessionFactory() as session:
+                    await upsert_position(user_id, token_address, chain, entry_price, session)
+            except Exception:
+                logger.warning("Could not record position in %s for user %s", token_address, user_id)
 
         await query.edit_message_text(msg, parse_mode="Markdown")
-        logger.info(f"User {user_id} executed buy {amount} {unit} of {token_address} on {chain}")
+        logger.info("User %s executed buy %s %s of %s on %s", user_id, amount, unit, token_address, chain)
 
     except Exception as e:
         await query.edit_message_text(f"Failed to execute {chain.capitalize()} trade: {str(e)}", parse_mode="Markdown")
-        logger.error(f"Swap failed for user {user_id}: {str(e)}", exc_info=True)
+        logger.error("Swap failed for user %s: %s", user_id, e, exc_info=True)
 
     return ConversationHandler.END
 
@@ -220,24 +258,28 @@ async def cancel_buy(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
     await query.answer()
     await query.edit_message_text("Buy cancelled. Choose an option:", reply_markup=MAIN_MENU, parse_mode="Markdown")
-    logger.info(f"User {update.effective_user.id} cancelled buy")
+    logger.info("User %s cancelled buy", update.effective_user.id)
     return ConversationHandler.END
 
+# Callback data handled by buy_handler, other than the "buy" entry itself
+_BUY_ACTIONS = {
+    "buy_execute_trade": confirm_buy,
+    "set_amount": _prompt_amount,
+    "set_slippage": _prompt_slippage,
+    "refresh_token": refresh_token,
+}
+_BUY_ENTRY_PATTERN = re.compile(r"^(buy|buy_execute_trade|set_amount|set_slippage|refresh_token)$", re.ASCII)
+_BUY_CONFIRM_PATTERN = re.compile(r"^(buy_execute_trade|set_amount|set_slippage|refresh_token)$", re.ASCII)
+
 # Define the ConversationHandler separately
 buy_conv_handler = ConversationHandler(
-    entry_points=[
-        CallbackQueryHandler(buy_handler, pattern="^buy$"),
-        CallbackQueryHandler(buy_handler, pattern="^buy_execute_trade$"),
-        CallbackQueryHandler(buy_handler, pattern="^set_amount$"),
-        CallbackQueryHandler(buy_handler, pattern="^set_slippage$"),
-        CallbackQueryHandler(buy_handler, pattern="^refresh_token$"),
-    ],
+    entry_points=[CallbackQueryHandler(buy_handler, pattern=_BUY_ENTRY_PATTERN)],
     states={
         TOKEN_ADDRESS: [MessageHandler(filters.TEXT & ~filters.COMMAND, token_address_handler)],
         SET_AMOUNT: [MessageHandler(filters.TEXT & ~filters.COMMAND, set_amount_handler)],
         SET_SLIPPAGE: [MessageHandler(filters.TEXT & ~filters.COMMAND, set_slippage_handler)],
         CONFIRM: [
-            CallbackQueryHandler(buy_handler, pattern="^(buy_execute_trade|set_amount|set_slippage|refresh_token)$"),
+            CallbackQueryHandler(buy_handler, pattern=_BUY_CONFIRM_PATTERN),
             CallbackQueryHandler(cancel_buy, pattern="^main_menu$"),
         ]
     },
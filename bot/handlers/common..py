@@ -1,9 +1,8 @@
 import logging
-from telegram import Update, InlineKeyboardMarkup
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.constants import ParseMode
 from telegram.ext import ContextTypes
-from database.db import get_async_session
-from services.wallet_management import get_wallet
-from services.utils import get_wallet_balance_and_usd
+from bot.handlers.constants import MAIN_MENU_BTN
 from bot.handlers.start import TRADING_MENU  # Import TRADING_MENU globally
 
 logger = logging.getLogger(__name__)
@@ -20,7 +19,7 @@ async def refresh_handler(update: Update, context: ContextTypes.DEFAULT_TYPE, ca
     """
     query = update.callback_query
     await query.answer()
-    user_id = str(update.effective_user.id)
+    user_id = update.effective_user.id
 
     # Re-run the previous message function to refresh data
     await prev_message_func(update, context)
@@ -28,32 +27,27 @@ async def refresh_handler(update: Update, context: ContextTypes.DEFAULT_TYPE, ca
 
 async def main_menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Reusable handler to return to the TRADING_MENU."""
+    from services.utils import fetch_natives  # Imported on first use, like in positions_handler
+
     query = update.callback_query
     await query.answer()
-    user_id = str(update.effective_user.id)
+    user_id = update.effective_user.id
 
-    async with get_async_session() as session:
-        sol_wallet = await get_wallet(user_id, "solana", session)
-        ton_wallet = await get_wallet(user_id, "ton", session)
-        sol_address = sol_wallet.public_key if sol_wallet else "Not set"
-        ton_address = ton_wallet.public_key if ton_wallet else "Not set"
-        sol_balance, sol_usd = await get_wallet_balance_and_usd(sol_address, "solana") if sol_wallet else (0.0, 0.0)
-        ton_balance, ton_usd = await get_wallet_balance_and_usd(ton_address, "ton") if ton_wallet else (0.0, 0.0)
+    (sol_wallet, sol_balance, sol_usd), (ton_wallet, ton_balance, ton_usd) = await fetch_natives(user_id)
+    sol_address = sol_wallet.public_key if sol_wallet else "Not set"
+    ton_address = ton_wallet.public_key if ton_wallet else "Not set"
 
     msg = (
         "Not-Cotrader\n\n"
-        f"Sol-Wallet: {sol_balance:.2f} SOL (${sol_usd:.2f})\n`{sol_address}`\n(tap to copy)\n\n"
-        f"TON-Wallet: {ton_balance:.2f} TON (${ton_usd:.2f})\n`{ton_address}`\n(tap to copy)\n\n"
+        f"Sol-Wallet: {sol_balance:.2f} SOL (${sol_usd:.2f})\n<code>{sol_address}</code>\n(tap to copy)\n\n"
+        f"TON-Wallet: {ton_balance:.2f} TON (${ton_usd:.2f})\n<code>{ton_address}</code>\n(tap to copy)\n\n"
         "Start trading by typing a mint/contract address"
     )
-    await query.edit_message_text(msg, reply_markup=TRADING_MENU, parse_mode="Markdown")
+    await query.edit_message_text(msg, reply_markup=TRADING_MENU, parse_mode=ParseMode.HTML)
     logger.info(f"Returned to TRADING_MENU for user {user_id}")
 
+
 def add_common_buttons(keyboard: list, callback_data: str) -> InlineKeyboardMarkup:
     """Add reusable 'Refresh' and 'Main Menu' buttons to an existing keyboard."""
-    common_buttons = [
-        InlineKeyboardButton("Refresh", callback_data=f"refresh_{callback_data}"),
-        InlineKeyboardButton("Main Menu", callback_data="main_menu")
-    ]
-    keyboard.insert(0, common_buttons)  # Add at the top
+    keyboard.insert(0, [InlineKeyboardButton("Refresh", callback_data=f"refresh_{callback_data}"), MAIN_MENU_BTN])  # Add at the top
     return InlineKeyboardMarkup(keyboard)
\ No newline at end of file
@@ -12,4 +12,11 @@ MAIN_MENU = InlineKeyboardMarkup([
      InlineKeyboardButton("Settings", callback_data="settings"),
      InlineKeyboardButton("Feedback", callback_data="feedback")],
     [InlineKeyboardButton("Help", callback_data="help")]
-])
\ No newline at end of file
+])
+
+# The one Main Menu button; keyboards elsewhere reuse it instead of building their own
+MAIN_MENU_BTN = InlineKeyboardButton("🏠 Main Menu", callback_data="main_menu")
+
+# Single-button keyboards shared by handlers that only offer a way back or out
+MAIN_MENU_ONLY = InlineKeyboardMarkup([[MAIN_MENU_BTN]])
+FEEDBACK_CANCEL_KB = InlineKeyboardMarkup([[InlineKeyboardButton("Cancel", callback_data="cancel_feedback")]])
@@ -1,8 +1,11 @@
 # bot/handlers/feedback.py
+import html
 import logging
 import os
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update
+from telegram.constants import ParseMode
 from telegram.ext import ContextTypes, ConversationHandler, MessageHandler, filters, CallbackQueryHandler
+from bot.handlers.constants import MAIN_MENU_ONLY, FEEDBACK_CANCEL_KB
 
 logger = logging.getLogger(__name__)
 from dotenv import load_dotenv
@@ -22,16 +25,30 @@ async def feedback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     query = update.callback_query
     await query.answer()
     
-    keyboard = [[InlineKeyboardButton("Cancel", callback_data="cancel_feedback")]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
     await query.edit_message_text(
         "We appreciate your feedback! Please share your thoughts, suggestions, or any issues you've encountered:",
-        reply_markup=reply_markup
+        reply_markup=FEEDBACK_CANCEL_KB
     )
     logger.info(f"User {update.effective_user.id} started feedback process")
     return FEEDBACK_TEXT
 
+async def _send_feedback(context: ContextTypes.DEFAULT_TYPE, user_id: int, chat_id: int, feedback_message: str) -> None:
+    """Post a formatted feedback message to the feedback channel, telling the user if that fails."""
+    try:
+        await context.bot.send_message(
+            chat_id=FEEDBACK_CHANNEL_ID,
+            text=feedback_message,
+            parse_mode=ParseMode.HTML
+        )
+        logger.info(f"Feedback from user {user_id} successfully sent to channel {FEEDBACK_CHANNEL_ID}")
+    except Exception as e:
+        logger.error(f"Failed to send feedback from user {user_id} to channel: {str(e)}")
+        await context.bot.send_message(
+            chat_id=chat_id,
+            text="Sorry, we couldn't deliver your feedback. Please try again later.",
+            reply_markup=MAIN_MENU_ONLY
+        )
+
 async def receive_feedback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handle the feedback text and send it to the channel."""
     user = update.effective_user
@@ -40,31 +57,17 @@ async def receive_feedback(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     # Format the feedback message
     feedback_message = (
         f"New Feedback Received\n"
-        f"From: {user.full_name} (ID: {user.id})\n"
+        f"From: {html.escape(user.full_name)} (ID: {user.id})\n"
         f"Username: @{user.username if user.username else 'N/A'}\n" # pulic for now can be anonymous best practice
-        f"Message: {feedback_text}"
+        f"Message: {html.escape(feedback_text)}"
     )
     
-    # Send feedback to the channel
-    try:
-        await context.bot.send_message(
-            chat_id=FEEDBACK_CHANNEL_ID,
-            text=feedback_message,
-            parse_mode="Markdown"
-        )
-        logger.info(f"Feedback from user {user.id} successfully sent to channel {FEEDBACK_CHANNEL_ID}")
-        
-        # Confirm with the user
-        await update.message.reply_text(
-            "Thank you for your feedback! It has been successfully submitted. stay in touch",
-            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("Main Menu", callback_data="main_menu")]])
-        )
-    except Exception as e:
-        logger.error(f"Failed to send feedback to channel: {str(e)}")
-        await update.message.reply_text(
-            "Sorry, there was an error submitting your feedback. Please try again later.",
-            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("Main Menu", callback_data="main_menu")]])
-        )
+    # Post to the channel in the background; the user is thanked without waiting on that round-trip
+    context.application.create_task(_send_feedback(context, user.id, update.effective_chat.id, feedback_message), update=update)
+    await update.message.reply_text(
+        "Thank you for your feedback! It has been received and will be sent to the team. stay in touch",
+        reply_markup=MAIN_MENU_ONLY
+    )
     
     return ConversationHandler.END
 
@@ -75,7 +78,7 @@ async def cancel_feedback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     
     await query.edit_message_text(
         "Feedback cancelled.",
-        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("Main Menu", callback_data="main_menu")]])
+        reply_markup=MAIN_MENU_ONLY
     )
     logger.info(f"User {update.effective_user.id} cancelled feedback")
     return ConversationHandler.END
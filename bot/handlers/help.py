@@ -1,27 +1,28 @@
 from telegram import Update
+from telegram.constants import ParseMode
 from telegram.ext import CommandHandler, CallbackQueryHandler, ContextTypes
 import logging
 
 logger = logging.getLogger(__name__)
 
+HELP_MESSAGE = (
+    "👋 Welcome to <b>Not-Cotrader</b>! I'm your multi-chain trading bot, here to help you swap tokens on TON and Solana.\n\n"
+    "🔹 <b>What I can do</b>:\n"
+    "  - Swap TON tokens via STON.fi\n"
+    "  - Swap Solana tokens via Jupiter DEX\n"
+    "  - Provide token info and wallet balances\n\n"
+    "For more help or to report issues, contact my creator: @aystek on Telegram.\n"
+    "Use /start to begin trading!"
+)
+
 async def help_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Display an introductory message about the bot and support contact."""
-    user_id = str(update.effective_user.id)
-    help_message = (
-        "👋 Welcome to *Not-Cotrader*! I'm your multi-chain trading bot, here to help you swap tokens on TON and Solana.\n\n"
-        "🔹 *What I can do*:\n"
-        "  - Swap TON tokens via STON.fi\n"
-        "  - Swap Solana tokens via Jupiter DEX\n"
-        "  - Provide token info and wallet balances\n\n"
-        "For more help or to report issues, contact my creator: @aystek on Telegram.\n"
-        "Use /start to begin trading!"
-    )
-
+    user_id = update.effective_user.id
     if update.callback_query:
         await update.callback_query.answer()
-        await update.callback_query.edit_message_text(help_message, parse_mode="Markdown")
+        await update.callback_query.edit_message_text(HELP_MESSAGE, parse_mode=ParseMode.HTML)
     else:
-        await update.message.reply_text(help_message, parse_mode="Markdown")
+        await update.message.reply_text(HELP_MESSAGE, parse_mode=ParseMode.HTML)
 
     logger.info(f"Displayed help message to user {user_id}")
 
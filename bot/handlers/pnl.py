@@ -1,28 +1,28 @@
 import logging
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import CommandHandler, CallbackQueryHandler, ContextTypes
+from telegram import Update
+from telegram.constants import ParseMode
+from telegram.ext import CallbackQueryHandler, ContextTypes
+from bot.handlers.constants import MAIN_MENU_ONLY
 
 logger = logging.getLogger(__name__)
 
+PNL_PREVIEW_MESSAGE = (
+    "💰 <b>Your PnL (AI Mode Preview)</b>\n\n"
+    "Here’s a sample of your trading performance:\n"
+    "- <b>Total Trades</b>: 15\n"
+    "- <b>TON Portfolio</b>: +$35.20 (+12.5%)\n"
+    "- <b>SOL Portfolio</b>: +$67.80 (+8.9%)\n"
+    "- <b>Overall PnL</b>: +$103.00\n\n"
+    "This is a sneak peek! Full PnL tracking coming soon."
+)
+
 async def pnl_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Display a placeholder for user’s PnL in AI Mode."""
-    user_id = str(update.effective_user.id)
+    user_id = update.effective_user.id
     query = update.callback_query
     await query.answer()
 
-    placeholder_message = (
-        "💰 *Your PnL (AI Mode Preview)*\n\n"
-        "Here’s a sample of your trading performance:\n"
-        "- *Total Trades*: 15\n"
-        "- *TON Portfolio*: +$35.20 (+12.5%)\n"
-        "- *SOL Portfolio*: +$67.80 (+8.9%)\n"
-        "- *Overall PnL*: +$103.00\n\n"
-        "This is a sneak peek! Full PnL tracking coming soon."
-    )
-    keyboard = [[InlineKeyboardButton("🏠 Main Menu", callback_data="main_menu")]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
-    await query.edit_message_text(placeholder_message, reply_markup=reply_markup, parse_mode="Markdown")
+    await query.edit_message_text(PNL_PREVIEW_MESSAGE, reply_markup=MAIN_MENU_ONLY, parse_mode=ParseMode.HTML)
     logger.info(f"Displayed AI Mode PnL to user {user_id}")
 
 # Export handler
@@ -1,108 +1,142 @@
+import asyncio
+import html
 import logging
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update
+from telegram.constants import ParseMode
 from telegram.ext import CallbackQueryHandler, ContextTypes
-from database.db import get_async_session
-from services.wallet_management import get_wallet
-from services.token_info import get_token_info, detect_chain
-from services.utils import get_wallet_balance_and_usd, get_token_balance  # Import get_token_balance
+from bot.handlers.constants import MAIN_MENU_ONLY
 
 logger = logging.getLogger(__name__)
 
+_POSITIONS_HEADER = "📊 <b>Your Positions</b>\n\n"
+_NO_WALLETS_MESSAGE = _POSITIONS_HEADER + "You don’t have any wallets set up yet. Start trading to see positions!"
+_NO_POSITIONS_MESSAGE = "You don’t hold any tokens yet. Start trading to build your positions!"
+# Position rows, parsed once and filled with format_map; natives show 4 decimals, tokens 6
+_NATIVE_ROW = (
+    "- <b>{symbol}</b>: {balance:.4f} {symbol}\n"
+    "  Entry: ${entry:.2f}, Current: ${price:.2f}, PnL: {sign}${pnl:.2f}\n"
+).format_map
+_TOKEN_ROW = (
+    "- <b>{symbol}</b>: {balance:.6f} {symbol}\n"
+    "  Entry: ${entry:.2f}, Current: ${price:.2f}, PnL: {sign}${pnl:.2f}\n"
+).format_map
+
+def _position_row(template, symbol: str, balance: float, entry: float, price: float) -> str:
+    """Render one position row with its PnL against the entry price."""
+    pnl = (price - entry) * balance
+    return template({
+        "symbol": symbol, "balance": balance, "entry": entry, "price": price,
+        "sign": "+" if pnl >= 0 else "", "pnl": pnl,
+    })
+
+# Upper bound on concurrent balance lookups per chain when building the positions view
+_POSITION_FETCH_CONCURRENCY = 8
+
+async def _fetch_token_balances(wallet_address: str, chain: str, token_addresses: list) -> list:
+    """
+    Fetch the wallet's balance of each token concurrently, capped by a semaphore.
+
+    Returns (token_address, balance) for every token with a positive balance, in the order
+    of token_addresses.
+    """
+    from services.utils import get_token_balance
+
+    semaphore = asyncio.Semaphore(_POSITION_FETCH_CONCURRENCY)
+
+    async def fetch(token_address: str):
+        async with semaphore:
+            return token_address, await get_token_balance(wallet_address, token_address, chain)
+
+    results = await asyncio.gather(*(fetch(token_address) for token_address in token_addresses))
+    return [(token_address, balance) for token_address, balance in results if balance > 0]
+
+async def _load_positions(user_id: int) -> dict:
+    """Load the user's recorded positions (entry prices by token address) from the database."""
+    from database.db import get_positions
+    from database.models import AsyncSessionFactory
+
+    async with AsyncSessionFactory() as session:
+        return await get_positions(user_id, session)
+
 async def positions_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Display the user’s actual trading positions."""
-    user_id = str(update.effective_user.id)
+    # Imported on first use so the wallet/RPC service stack isn't loaded until Positions is opened
+    from services.utils import on_cooldown
+
+    user_id = update.effective_user.id
     query = update.callback_query
+    if on_cooldown(context, "_last_positions_ts"):
+        await query.answer("Please wait…")
+        return
+    if context.chat_data.get("_positions_pending"):
+        # A previous press is still being rendered into this chat; let that edit land instead
+        await query.answer("Loading…")
+        return
     await query.answer()
 
-    # Initialize positions if not present (temporary storage in context.user_data)
-    if "positions" not in context.user_data:
-        context.user_data["positions"] = {}
-
-    async with await get_async_session() as session:
-        # Get user wallets
-        sol_wallet = await get_wallet(user_id, "solana", session)
-        ton_wallet = await get_wallet(user_id, "ton", session)
-
-        if not sol_wallet and not ton_wallet:
-            message = "📊 *Your Positions*\n\nYou don’t have any wallets set up yet. Start trading to see positions!"
-            keyboard = [[InlineKeyboardButton("🏠 Main Menu", callback_data="main_menu")]]
-            await query.edit_message_text(message, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode="Markdown")
-            logger.info(f"No wallets found for user {user_id} in positions")
-            return
-
-        # Fetch wallet balances (native tokens)
-        sol_balance, sol_usd = await get_wallet_balance_and_usd(sol_wallet.public_key, "solana") if sol_wallet else (0.0, 0.0)
-        ton_balance, ton_usd = await get_wallet_balance_and_usd(ton_wallet.public_key, "ton") if ton_wallet else (0.0, 0.0)
-
-        # Fetch token positions from context.user_data
-        positions = context.user_data["positions"]
-        message = "📊 *Your Positions*\n\n"
-        has_positions = False
-
-        # Add native token positions if they exist
-        if sol_balance > 0:
-            sol_price = sol_usd / sol_balance if sol_balance > 0 else 0.0
-            sol_entry = positions.get("SOL", {}).get("entry_price", sol_price)  # Default to current if no entry
-            sol_pnl = (sol_price - sol_entry) * sol_balance
-            message += (
-                f"- *SOL*: {sol_balance:.4f} SOL\n"
-                f"  Entry: ${sol_entry:.2f}, Current: ${sol_price:.2f}, PnL: {'+' if sol_pnl >= 0 else ''}${sol_pnl:.2f}\n"
-            )
-            has_positions = True
-
-        if ton_balance > 0:
-            ton_price = ton_usd / ton_balance if ton_balance > 0 else 0.0
-            ton_entry = positions.get("TON", {}).get("entry_price", ton_price)  # Default to current if no entry
-            ton_pnl = (ton_price - ton_entry) * ton_balance
-            message += (
-                f"- *TON*: {ton_balance:.4f} TON\n"
-                f"  Entry: ${ton_entry:.2f}, Current: ${ton_price:.2f}, PnL: {'+' if ton_pnl >= 0 else ''}${ton_pnl:.2f}\n"
-            )
-            has_positions = True
-
-        # Fetch and display other token positions
-        if sol_wallet:
-            for token_address, data in positions.items():
-                chain = detect_chain(token_address)
-                if chain == "solana":
-                    token_balance = await get_token_balance(sol_wallet.public_key, token_address, "solana")
-                    if token_balance > 0:
-                        result = await get_token_info(token_address)
-                        if result:
-                            token_info, _ = result
-                            current_price = float(token_info["price_usd"])
-                            entry_price = data.get("entry_price", current_price)  # Default to current if no entry
-                            pnl = (current_price - entry_price) * token_balance
-                            message += (
-                                f"- *{token_info['symbol']}*: {token_balance:.6f} {token_info['symbol']}\n"
-                                f"  Entry: ${entry_price:.2f}, Current: ${current_price:.2f}, PnL: {'+' if pnl >= 0 else ''}${pnl:.2f}\n"
-                            )
-                            has_positions = True
-
-        if ton_wallet:
-            for token_address, data in positions.items():
-                chain = detect_chain(token_address)
-                if chain == "ton":
-                    token_balance = await get_token_balance(ton_wallet.public_key, token_address, "ton")
-                    if token_balance > 0:
-                        result = await get_token_info(token_address)
-                        if result:
-                            token_info, _ = result
-                            current_price = float(token_info["price_usd"])
-                            entry_price = data.get("entry_price", current_price)  # Default to current if no entry
-                            pnl = (current_price - entry_price) * token_balance
-                            message += (
-                                f"- *{token_info['symbol']}*: {token_balance:.6f} {token_info['symbol']}\n"
-                                f"  Entry: ${entry_price:.2f}, Current: ${current_price:.2f}, PnL: {'+' if pnl >= 0 else ''}${pnl:.2f}\n"
-                            )
-                            has_positions = True
-
-        if not has_positions:
-            message += "You don’t hold any tokens yet. Start trading to build your positions!"
-
-        keyboard = [[InlineKeyboardButton("🏠 Main Menu", callback_data="main_menu")]]
-        await query.edit_message_text(message, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode="Markdown")
-        logger.info(f"Displayed actual positions to user {user_id}")
+    context.chat_data["_positions_pending"] = True
+    try:
+        await _show_positions(query, context, user_id)
+    finally:
+        context.chat_data.pop("_positions_pending", None)
+
+async def _show_positions(query, context: ContextTypes.DEFAULT_TYPE, user_id: int) -> None:
+    """Fetch the user's balances and edit the callback message into the positions view."""
+    from services.token_info import detect_chain, get_token_infos
+    from services.utils import CHAINS, fetch_natives
+
+    # Wallets in one query, then the native balances concurrently; the recorded positions load alongside
+    natives, positions = await asyncio.gather(fetch_natives(user_id), _load_positions(user_id))
+    wallets = {chain: wallet for (chain, _), (wallet, _, _) in zip(CHAINS, natives)}
+
+    if not any(wallets.values()):
+        await query.edit_message_text(_NO_WALLETS_MESSAGE, reply_markup=MAIN_MENU_ONLY, parse_mode=ParseMode.HTML)
+        logger.info(f"No wallets found for user {user_id} in positions")
+        return
+
+    # Rows are collected and joined once at the end
+    parts = [_POSITIONS_HEADER]
+
+    # Add native token positions if they exist
+    for (_, symbol), (_, balance, usd_value) in zip(CHAINS, natives):
+        if balance > 0:
+            price = usd_value / balance
+            entry = positions.get(symbol, {}).get("entry_price", price)  # Default to current if no entry
+            parts.append(_position_row(_NATIVE_ROW, symbol, balance, entry, price))
+
+    # Partition the tracked tokens by chain in one pass; native entries ("SOL", "TON") are skipped
+    by_chain = {chain: [] for chain, _ in CHAINS}
+    for token_address in positions:
+        try:
+            by_chain[detect_chain(token_address)].append(token_address)
+        except ValueError:
+            continue
+
+    # Balances per chain (a bounded number at a time), then the info for every held token in one batch
+    held = [
+        holding
+        for holdings in await asyncio.gather(*(
+            _fetch_token_balances(wallet.public_key, chain, by_chain[chain])
+            for chain, wallet in wallets.items() if wallet and by_chain[chain]
+        ))
+        for holding in holdings
+    ]
+    token_infos = await get_token_infos([token_address for token_address, _ in held]) if held else {}
+
+    for token_address, token_balance in held:
+        token_info = token_infos.get(token_address)
+        if token_info:
+            current_price = float(token_info["price_usd"])
+            entry_price = positions[token_address].get("entry_price", current_price)  # Default to current if no entry
+            symbol = html.escape(token_info["symbol"])  # Token symbols come from the token's own metadata
+            parts.append(_position_row(_TOKEN_ROW, symbol, token_balance, entry_price, current_price))
+
+    if len(parts) == 1:
+        parts.append(_NO_POSITIONS_MESSAGE)
+    message = "".join(parts)
+
+    await query.edit_message_text(message, reply_markup=MAIN_MENU_ONLY, parse_mode=ParseMode.HTML)
+    logger.info(f"Displayed actual positions to user {user_id}")
 
 # Export handler
 positions_handler = CallbackQueryHandler(positions_handler, pattern="^positions$")
\ No newline at end of file
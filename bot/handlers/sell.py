@@ -1,63 +1,153 @@
+import asyncio
 import logging
+import re
+import time
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CallbackQueryHandler, ContextTypes, ConversationHandler, MessageHandler, filters
-from database.db import get_async_session
-from services.wallet_management import get_wallet
-from services.utils import get_wallet_balance_and_usd, get_token_balance
-from services.token_info import get_token_info, format_token_info, detect_chain
-from blockchain.solana.trade import execute_solana_swap  # Placeholder for sell swap if needed
-from blockchain.ton.sell import execute_jetton_to_ton_swap
-from handlers.constants import MAIN_MENU
+from services.wallet_management import cached_get_wallet
+from services.utils import get_wallet_balance_and_usd, get_token_balance, invalidate_balance_cache, percent_to_bps
+from services.token_info import get_token_info, invalidate_token_info, format_token_info, detect_chain
+from blockchain.ton.sell import prepare_jetton_to_ton_swap, send_jetton_to_ton_swap
+from bot.handlers.constants import MAIN_MENU, MAIN_MENU_BTN
 
 logger = logging.getLogger(__name__)
 
 # Conversation states
 TOKEN_ADDRESS, SET_AMOUNT, SET_SLIPPAGE, CONFIRM = range(4)
 
+# Per-chain details of a sell. A swap is built by prepare (no signing or sending) and then
+# submitted by send. Solana has no token -> SOL swap yet (prepare is None).
+# A send result may report the native output (output_amount, divided by divisor); the
+# TON swap doesn't, since the TON it returns arrives after the swap transaction is sent.
+CHAIN_META = {
+    "solana": {
+        "unit": "SOL",
+        "gas_buffer": 0.01,
+        "prepare": None,
+        "send": None,
+        "divisor": 1_000_000_000,
+        "tx_link": "[Solscan](https://solscan.io/tx/{})",
+    },
+    "ton": {
+        "unit": "TON",
+        "gas_buffer": 0.2,
+        "prepare": prepare_jetton_to_ton_swap,
+        "send": send_jetton_to_ton_swap,
+        "divisor": 1_000_000_000,
+        "tx_link": "[TONScan](https://tonscan.org/tx/{})",
+    },
+}
+
+_SELL_OK = (
+    "{info}\n\n"
+    "Sell Order Executed:\n"
+    "Sold: {amount:.6f} {symbol}\n"
+    "{received}"
+    "Tx: {tx}"
+)
+_SELL_RECEIVED = "Received: {output:.6f} {unit}\n"
+
+# Plain non-negative decimals ("1", "0.5", ".5") in ASCII digits. Checked before float(), which
+# would also accept "inf", "nan", "1e3" and raise (costly) on everything else.
+_NUMERIC_RE = re.compile(r"\d+(?:\.\d*)?|\.\d+", re.ASCII)
+
+# How long balances shown on the token card are trusted when the user confirms the sell
+BALANCE_MAX_AGE = 5.0
+
+# Static buttons of the sell card; only the slippage and amount labels change per render
+_EXECUTE_BTN = InlineKeyboardButton("Execute Trade", callback_data="sell_execute_trade")
+_REFRESH_BTN = InlineKeyboardButton("Refresh", callback_data="sell_refresh")
+_MAIN_MENU_ROW = (MAIN_MENU_BTN,)
+
+def _sell_keyboard(slippage: float, sell_amount: float, symbol: str) -> InlineKeyboardMarkup:
+    """Build the sell card keyboard around the prebuilt static buttons."""
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(f"Slippage: {slippage}%", callback_data="sell_set_slippage"),
+         InlineKeyboardButton(f"Amount: {sell_amount} {symbol}", callback_data="sell_set_amount")],
+        [_EXECUTE_BTN, _REFRESH_BTN],
+        _MAIN_MENU_ROW,
+    ])
+
+async def resolved_wallet(context: ContextTypes.DEFAULT_TYPE, user_id: str, chain: str):
+    """
+    Return the user's wallet for chain, memoized in user_data for the rest of the sell conversation.
+
+    The card, its refreshes and the confirmation all use the same wallet, so only the first
+    lookup goes to cached_get_wallet (and, on a cold cache, the database). Misses are not stored.
+    """
+    wallets = context.user_data.setdefault("wallets", {})
+    wallet = wallets.get(chain)
+    if wallet is None:
+        wallet = await cached_get_wallet(user_id, chain)
+        if wallet is not None:
+            wallets[chain] = wallet
+    return wallet
+
+async def _fetch_sell_view(wallet, token_address: str, chain: str) -> tuple:
+    """
+    Fetch what the sell card shows: (token balance, native balance, get_token_info result).
+
+    The balance RPCs and the token lookup are independent, so they run concurrently in a
+    TaskGroup; if one raises, the others are cancelled instead of running to completion.
+    All three are TTL-cached in their services, so quick redraws reuse the results.
+    """
+    async with asyncio.TaskGroup() as tg:
+        token_balance = tg.create_task(get_token_balance(wallet.public_key, token_address, chain))
+        wallet_balance = tg.create_task(get_wallet_balance_and_usd(wallet.public_key, chain))
+        token_info = tg.create_task(get_token_info(token_address))
+    return token_balance.result(), wallet_balance.result()[0], token_info.result()
+
+def _stash_balances(context: ContextTypes.DEFAULT_TYPE, wallet, token_address: str, token_balance: float, wallet_balance: float) -> None:
+    """Remember the balances just displayed so confirm_sell can skip re-fetching them."""
+    context.user_data["balances"] = {
+        "token": token_balance,
+        "native": wallet_balance,
+        "fetched_at": time.monotonic(),
+        "wallet_pubkey": wallet.public_key,
+        "token_address": token_address,
+    }
+
 async def sell_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
-    await query.answer()
     user_id = str(update.effective_user.id)
-    logger.debug(f"sell_handler called with callback: {query.data} for user {user_id}")
-
-    if query.data == "sell_execute_trade":
-        logger.debug(f"Execute Trade button pressed for user {user_id}")
-        return await confirm_sell(update, context)
+    logger.debug("sell_handler called with callback: %s for user %s", query.data, user_id)
 
-    if query.data.startswith("set_amount"):
-        await query.edit_message_text("Enter the amount of tokens to sell (e.g., 1.0):", parse_mode="Markdown")
-        return SET_AMOUNT
-
-    if query.data.startswith("set_slippage"):
-        await query.edit_message_text("Enter slippage percentage (e.g., 5):", parse_mode="Markdown")
-        return SET_SLIPPAGE
-
-    if query.data == "refresh_token":
-        return await refresh_token(update, context)
+    # The answer doesn't affect what the handler sends, so both Bot API calls go out together
+    handler = _SELL_ROUTES.get(query.data, _prompt_token_address)
+    _, state = await asyncio.gather(query.answer(), handler(update, context))
+    return state
 
+async def _prompt_token_address(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    # A new sell starts here; look the wallet up afresh in case it changed since the last one
+    context.user_data.pop("wallets", None)
     msg = "Please send the token address you want to sell:"
-    await query.edit_message_text(msg, parse_mode="Markdown")
+    await update.callback_query.edit_message_text(msg, parse_mode="Markdown")
     return TOKEN_ADDRESS
 
+async def _prompt_amount(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    await update.callback_query.edit_message_text("Enter the amount of tokens to sell (e.g., 1.0):", parse_mode="Markdown")
+    return SET_AMOUNT
+
+async def _prompt_slippage(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    await update.callback_query.edit_message_text("Enter slippage percentage (e.g., 5):", parse_mode="Markdown")
+    return SET_SLIPPAGE
+
 async def token_address_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     user_id = str(update.effective_user.id)
     token_address = update.message.text.strip()
     chain = detect_chain(token_address)
-    unit = "SOL" if chain == "solana" else "TON"
 
-    async with await get_async_session() as session:
-        wallet = await get_wallet(user_id, chain, session)
-        if not wallet:
-            await update.message.reply_text(f"No {chain.capitalize()} wallet found. Create one first!", parse_mode="Markdown")
-            return ConversationHandler.END
-        token_balance = await get_token_balance(wallet.public_key, token_address, chain)
-        wallet_balance, _ = await get_wallet_balance_and_usd(wallet.public_key, chain)
+    wallet = await resolved_wallet(context, user_id, chain)
+    if not wallet:
+        await update.message.reply_text(f"No {chain.capitalize()} wallet found. Create one first!", parse_mode="Markdown")
+        return ConversationHandler.END
 
-    result = await get_token_info(token_address)
+    token_balance, wallet_balance, result = await _fetch_sell_view(wallet, token_address, chain)
     if not result:
         await update.message.reply_text("Couldn’t fetch token info. Check the address and try again.")
         return TOKEN_ADDRESS
     token_info, chain_price_usd = result
+    _stash_balances(context, wallet, token_address, token_balance, wallet_balance)
 
     context.user_data["token_address"] = token_address
     context.user_data["token_info"] = token_info
@@ -65,42 +155,29 @@ async def token_address_handler(update: Update, context: ContextTypes.DEFAULT_TY
     context.user_data["sell_amount"] = 1.0  # Default sell amount
     context.user_data["slippage"] = 5.0  # Default slippage
 
-    formatted_info = await format_token_info(token_info, chain, wallet_balance, chain_price_usd, context)
-    keyboard = [
-        [InlineKeyboardButton(f"Slippage: {context.user_data['slippage']}%", callback_data="set_slippage"),
-         InlineKeyboardButton(f"Amount: {context.user_data['sell_amount']} {token_info['symbol']}", callback_data="set_amount")],
-        [InlineKeyboardButton("Execute Trade", callback_data="sell_execute_trade"),
-         InlineKeyboardButton("Refresh", callback_data="refresh_token")],
-        [InlineKeyboardButton("Main Menu", callback_data="main_menu")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    formatted_info = format_token_info(token_info, chain, wallet_balance, chain_price_usd, context, is_sell=True)
+    reply_markup = _sell_keyboard(context.user_data['slippage'], context.user_data['sell_amount'], token_info['symbol'])
 
     await update.message.reply_text(formatted_info, reply_markup=reply_markup, parse_mode="Markdown")
-    logger.info(f"Displayed token details for sell {token_address} to user {user_id}")
+    logger.info("Displayed token details for sell %s to user %s", token_address, user_id)
     return CONFIRM
 
 async def set_amount_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     user_id = str(update.effective_user.id)
-    try:
-        amount = float(update.message.text.strip())
-        if amount <= 0:
-            raise ValueError
-        context.user_data["sell_amount"] = amount
-    except ValueError:
+    text = update.message.text.strip()
+    if not _NUMERIC_RE.fullmatch(text) or (amount := float(text)) <= 0:
         await update.message.reply_text("Invalid amount. Enter a positive number (e.g., 1.0).", parse_mode="Markdown")
         return SET_AMOUNT
+    context.user_data["sell_amount"] = amount
     return await refresh_token(update, context, from_message=True)
 
 async def set_slippage_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     user_id = str(update.effective_user.id)
-    try:
-        slippage = float(update.message.text.strip())
-        if slippage < 0 or slippage > 100:
-            raise ValueError
-        context.user_data["slippage"] = slippage
-    except ValueError:
+    text = update.message.text.strip()
+    if not _NUMERIC_RE.fullmatch(text) or (slippage := float(text)) > 100:
         await update.message.reply_text("Invalid slippage. Enter a number between 0 and 100 (e.g., 5).", parse_mode="Markdown")
         return SET_SLIPPAGE
+    context.user_data["slippage"] = slippage
     return await refresh_token(update, context, from_message=True)
 
 async def refresh_token(update: Update, context: ContextTypes.DEFAULT_TYPE, from_message: bool = False) -> int:
@@ -113,12 +190,9 @@ async def refresh_token(update: Update, context: ContextTypes.DEFAULT_TYPE, from
         )
         return ConversationHandler.END
 
-    async with await get_async_session() as session:
-        wallet = await get_wallet(user_id, chain, session)
-        token_balance = await get_token_balance(wallet.public_key, token_address, chain)
-        wallet_balance, usd_value = await get_wallet_balance_and_usd(wallet.public_key, chain)
+    wallet = await resolved_wallet(context, user_id, chain)
 
-    result = await get_token_info(token_address)
+    token_balance, wallet_balance, result = await _fetch_sell_view(wallet, token_address, chain)
     if not result:
         await (update.message.reply_text if from_message else update.callback_query.edit_message_text)(
             "Couldn’t refresh token info. Try again later.", parse_mode="Markdown"
@@ -126,48 +200,61 @@ async def refresh_token(update: Update, context: ContextTypes.DEFAULT_TYPE, from
         return CONFIRM
     token_info, chain_price_usd = result
     context.user_data["token_info"] = token_info
+    _stash_balances(context, wallet, token_address, token_balance, wallet_balance)
 
-    formatted_info = await format_token_info(token_info, chain, wallet_balance, chain_price_usd, context, is_sell=True)
+    formatted_info = format_token_info(token_info, chain, wallet_balance, chain_price_usd, context, is_sell=True)
     sell_amount = context.user_data.get("sell_amount", 1.0)
     slippage = context.user_data.get("slippage", 5.0)
 
-    keyboard = [
-        [InlineKeyboardButton(f"Slippage: {slippage}%", callback_data="set_slippage"),
-         InlineKeyboardButton(f"Amount: {sell_amount} {token_info['symbol']}", callback_data="set_amount")],
-        [InlineKeyboardButton("Execute Trade", callback_data="sell_execute_trade"),
-         InlineKeyboardButton("Refresh", callback_data="refresh_token")],
-        [InlineKeyboardButton("Main Menu", callback_data="main_menu")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = _sell_keyboard(slippage, sell_amount, token_info['symbol'])
 
     if from_message:
         await update.message.reply_text(formatted_info, reply_markup=reply_markup, parse_mode="Markdown")
     else:
         await update.callback_query.edit_message_text(formatted_info, reply_markup=reply_markup, parse_mode="Markdown")
-    logger.info(f"Refreshed token details for sell {token_address} for user {user_id}")
+    logger.info("Refreshed token details for sell %s for user %s", token_address, user_id)
     return CONFIRM
 
 async def confirm_sell(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    # Reached through sell_handler, which answers the callback query
     query = update.callback_query
-    await query.answer()
     user_id = str(update.effective_user.id)
-    logger.debug(f"confirm_sell called for user {user_id}")
+    logger.debug("confirm_sell called for user %s", user_id)
 
     token_address = context.user_data.get("token_address")
     chain = context.user_data.get("chain")
     amount = context.user_data.get("sell_amount")
     slippage = context.user_data.get("slippage")
-    unit = "SOL" if chain == "solana" else "TON"
 
     if not all([token_address, chain, amount, slippage]):
-        logger.error(f"Missing context data for sell: {context.user_data}")
+        logger.error("Missing context data for sell: %s", context.user_data)
         await query.edit_message_text("Error: Missing trade details. Please start over.", parse_mode="Markdown")
         return ConversationHandler.END
-
-    async with await get_async_session() as session:
-        wallet = await get_wallet(user_id, chain, session)
-        token_balance = await get_token_balance(wallet.public_key, token_address, chain)
-        wallet_balance, _ = await get_wallet_balance_and_usd(wallet.public_key, chain)
+    meta = CHAIN_META[chain]
+    unit = meta["unit"]
+
+    wallet = await resolved_wallet(context, user_id, chain)
+
+    # Build the swap (router lookup, tx params) while the balances are checked below; it is
+    # only sent once they pass, and dropped otherwise
+    prepare_task = None
+    if meta["prepare"] is not None:
+        prepare_task = asyncio.create_task(meta["prepare"](wallet, token_address, amount, percent_to_bps(slippage)))
+        prepare_task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    balances = context.user_data.get("balances")
+    if (
+        balances
+        and balances["wallet_pubkey"] == wallet.public_key
+        and balances["token_address"] == token_address
+        and time.monotonic() - balances["fetched_at"] <= BALANCE_MAX_AGE
+    ):
+        token_balance, wallet_balance = balances["token"], balances["native"]
+    else:
+        token_balance, (wallet_balance, _) = await asyncio.gather(
+            get_token_balance(wallet.public_key, token_address, chain),
+            get_wallet_balance_and_usd(wallet.public_key, chain),
+        )
 
     if token_balance < amount:
         await query.edit_message_text(
@@ -175,76 +262,75 @@ async def confirm_sell(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
             f"need {amount:.6f}.",
             parse_mode="Markdown"
         )
+        if prepare_task is not None:
+            prepare_task.cancel()
         return ConversationHandler.END
 
-    gas_buffer = 0.01 if chain == "solana" else 0.2
+    gas_buffer = meta["gas_buffer"]
     if wallet_balance < gas_buffer:
         await query.edit_message_text(
             f"Insufficient {unit} for gas. You have {wallet_balance:.6f} {unit}, need at least {gas_buffer:.6f}.",
             parse_mode="Markdown"
         )
+        if prepare_task is not None:
+            prepare_task.cancel()
         return ConversationHandler.END
 
     token_info = context.user_data["token_info"]
-    formatted_info = await format_token_info(token_info, chain, wallet_balance, 0, context, is_sell=True)
+    formatted_info = format_token_info(token_info, chain, wallet_balance, 0, context, is_sell=True)
 
     try:
-        if chain == "solana":
-            # Placeholder: Replace with actual Solana sell function
-            swap_result = await execute_solana_sell_swap(wallet, token_address, amount, slippage)
-            output_amount = swap_result["output_amount"] / 1_000_000_000  # Assuming SOL output in lamports
-            tx_id = swap_result["tx_id"]
-            msg = (
-                f"{formatted_info}\n\n"
-                f"Sell Order Executed:\n"
-                f"Sold: {amount:.6f} {token_info['symbol']}\n"
-                f"Received: {output_amount:.6f} SOL\n"
-                f"Tx: [Solscan](https://solscan.io/tx/{tx_id})"
-            )
-        elif chain == "ton":
-            swap_result = await execute_jetton_to_ton_swap(wallet, token_address, amount, int(slippage * 100))
-            output_amount = swap_result.get("output_amount", 0) / 1_000_000_000  # TON in nanoTON
-            tx_id = swap_result["tx_id"]
-            msg = (
-                f"{formatted_info}\n\n"
-                f"Sell Order Executed:\n"
-                f"Sold: {amount:.6f} {token_info['symbol']}\n"
-                f"Received: {output_amount:.6f} TON\n"
-                f"Tx: [TONScan](https://tonscan.org/tx/{tx_id})"
-            )
-        else:
-            raise ValueError(f"Unsupported chain: {chain}")
+        if prepare_task is None:
+            raise ValueError(f"{chain.capitalize()} sells are not supported yet")
+        swap_result = await meta["send"](await prepare_task)
+        output_units = swap_result.get("output_amount")
+        received = "" if output_units is None else _SELL_RECEIVED.format(output=output_units / meta["divisor"], unit=unit)
+        msg = _SELL_OK.format(
+            info=formatted_info, amount=amount, symbol=token_info["symbol"], received=received,
+            tx=meta["tx_link"].format(swap_result["tx_id"]),
+        )
+        invalidate_balance_cache(wallet.public_key, chain, token_address)
+        invalidate_token_info(token_address)
+        context.user_data.pop("balances", None)
 
         await query.edit_message_text(msg, parse_mode="Markdown")
-        logger.info(f"User {user_id} executed sell {amount} {token_info['symbol']} for {unit} on {chain}")
+        logger.info("User %s executed sell %s %s for %s on %s", user_id, amount, token_info['symbol'], unit, chain)
 
     except Exception as e:
         await query.edit_message_text(f"Failed to execute {chain.capitalize()} sell: {str(e)}", parse_mode="Markdown")
-        logger.error(f"Sell failed for user {user_id}: {str(e)}", exc_info=True)
+        logger.error("Sell failed for user %s: %s", user_id, e, exc_info=True)
 
     return ConversationHandler.END
 
 async def cancel_sell(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
-    await query.answer()
-    await query.edit_message_text("Sell cancelled. Choose an option:", reply_markup=MAIN_MENU, parse_mode="Markdown")
-    logger.info(f"User {update.effective_user.id} cancelled sell")
+    await asyncio.gather(
+        query.answer(),
+        query.edit_message_text("Sell cancelled. Choose an option:", reply_markup=MAIN_MENU, parse_mode="Markdown"),
+    )
+    logger.info("User %s cancelled sell", update.effective_user.id)
     return ConversationHandler.END
 
+# Exact callback_data -> handler; anything else (the "sell" entry button) asks for a token address
+_SELL_ROUTES = {
+    "sell_execute_trade": confirm_sell,
+    "sell_set_amount": _prompt_amount,
+    "sell_set_slippage": _prompt_slippage,
+    "sell_refresh": refresh_token,
+}
+# One precompiled pattern per handler. The buttons carry a "sell_" prefix so they don't collide
+# with the buy card's set_amount/set_slippage/refresh_token, which buy_conv_handler claims first.
+_SELL_ENTRY_PATTERN = re.compile(r"^(sell|sell_execute_trade|sell_set_amount|sell_set_slippage|sell_refresh)$", re.ASCII)
+_SELL_CONFIRM_PATTERN = re.compile(r"^(sell_execute_trade|sell_set_amount|sell_set_slippage|sell_refresh)$", re.ASCII)
+
 sell_conv_handler = ConversationHandler(
-    entry_points=[
-        CallbackQueryHandler(sell_handler, pattern="^sell$"),
-        CallbackQueryHandler(sell_handler, pattern="^sell_execute_trade$"),
-        CallbackQueryHandler(sell_handler, pattern="^set_amount$"),
-        CallbackQueryHandler(sell_handler, pattern="^set_slippage$"),
-        CallbackQueryHandler(sell_handler, pattern="^refresh_token$"),
-    ],
+    entry_points=[CallbackQueryHandler(sell_handler, pattern=_SELL_ENTRY_PATTERN)],
     states={
         TOKEN_ADDRESS: [MessageHandler(filters.TEXT & ~filters.COMMAND, token_address_handler)],
         SET_AMOUNT: [MessageHandler(filters.TEXT & ~filters.COMMAND, set_amount_handler)],
         SET_SLIPPAGE: [MessageHandler(filters.TEXT & ~filters.COMMAND, set_slippage_handler)],
         CONFIRM: [
-            CallbackQueryHandler(sell_handler, pattern="^(sell_execute_trade|set_amount|set_slippage|refresh_token)$"),
+            CallbackQueryHandler(sell_handler, pattern=_SELL_CONFIRM_PATTERN),
             CallbackQueryHandler(cancel_sell, pattern="^main_menu$"),
         ]
     },
@@ -1,42 +1,90 @@
+import asyncio
 import logging
+from collections import ChainMap
+from functools import partial
+from types import MappingProxyType
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CommandHandler, CallbackQueryHandler, ContextTypes, MessageHandler, filters
+from bot.handlers.constants import MAIN_MENU_BTN
 
 logger = logging.getLogger(__name__)
 
-# Default chain-specific settings (removed slippage)
-DEFAULT_TON_SETTINGS = {
+# Default chain-specific settings (removed slippage); read-only, shared by every user
+DEFAULT_TON_SETTINGS = MappingProxyType({
     "gas_fee": "medium",  # low, medium, high
     "notifications": True,
     "wallet_format": "user_friendly",
     "currency": "USD"
-}
+})
 
-DEFAULT_SOLANA_SETTINGS = {
+DEFAULT_SOLANA_SETTINGS = MappingProxyType({
     "gas_fee": "medium",
     "notifications": True,
     "wallet_format": "user_friendly",
     "currency": "USD"
-}
+})
+
+_DEFAULT_SETTINGS = {"ton": DEFAULT_TON_SETTINGS, "solana": DEFAULT_SOLANA_SETTINGS}
+
+
+def chain_settings(context: ContextTypes.DEFAULT_TYPE, chain: str) -> ChainMap:
+    """
+    Return a user's settings for a chain, layered over the defaults.
+
+    Only values the user has changed are stored (in user_data["settings_overrides"]);
+    reads fall through to the defaults and writes go into the user's layer.
+    """
+    overrides = context.user_data.setdefault("settings_overrides", {}).setdefault(chain, {})
+    return ChainMap(overrides, _DEFAULT_SETTINGS[chain])
+
+# Submenu keyboards hold nothing user-specific, so they are built once
+_BACK_BTN = InlineKeyboardButton("Back", callback_data="settings_back")
+_DONE_BTN = InlineKeyboardButton("Done", callback_data="settings_done")
+
+GAS_FEE_MENU = InlineKeyboardMarkup([
+    [MAIN_MENU_BTN],
+    [InlineKeyboardButton("Low", callback_data="gas_low"),
+     InlineKeyboardButton("Medium", callback_data="gas_medium"),
+     InlineKeyboardButton("High", callback_data="gas_high")],
+    [_BACK_BTN]
+])
+
+WALLET_FORMAT_MENU = InlineKeyboardMarkup([
+    [MAIN_MENU_BTN],
+    [InlineKeyboardButton("User Friendly", callback_data="wallet_user_friendly"),
+     InlineKeyboardButton("Raw", callback_data="wallet_raw")],
+    [_BACK_BTN]
+])
+
+SETTINGS_ROOT_MENU = InlineKeyboardMarkup([
+    [MAIN_MENU_BTN],
+    [InlineKeyboardButton("TON Settings", callback_data="chain_settings_ton"),
+     InlineKeyboardButton("Solana Settings", callback_data="chain_settings_solana")]
+])
+
+CURRENCY_MENU = InlineKeyboardMarkup([
+    [MAIN_MENU_BTN],
+    [InlineKeyboardButton("USD", callback_data="currency_USD"),
+     InlineKeyboardButton("EUR", callback_data="currency_EUR")],
+    [_BACK_BTN]
+])
+
 
 
 async def settings_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Prompt user to choose which chain's settings to edit."""
-    user_id = str(update.effective_user.id)
+    if update.callback_query:
+        # Opened from the main menu router, which leaves answering the query to the view
+        await asyncio.gather(update.callback_query.answer(), _show_settings_root(update))
+    else:
+        await _show_settings_root(update)
 
-    # Initialize user settings if they don't exist
-    if "settings" not in context.user_data:
-        context.user_data["settings"] = {
-            "ton": DEFAULT_TON_SETTINGS.copy(),
-            "solana": DEFAULT_SOLANA_SETTINGS.copy()
-        }
 
-    keyboard = [
-        [InlineKeyboardButton("🏠 Main Menu", callback_data="main_menu")],
-        [InlineKeyboardButton("TON Settings", callback_data="chain_settings_ton"),
-         InlineKeyboardButton("Solana Settings", callback_data="chain_settings_solana")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+async def _show_settings_root(update: Update) -> None:
+    """Send or edit in the chain choice; callers answer the callback query themselves."""
+    user_id = str(update.effective_user.id)
+
+    reply_markup = SETTINGS_ROOT_MENU
 
     if update.message:
         await update.message.reply_text(
@@ -49,83 +97,85 @@ async def settings_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
             reply_markup=reply_markup
         )
 
-    logger.info(f"Prompted user {user_id} to choose settings chain")
+    logger.info("Prompted user %s to choose settings chain", user_id)
 
 
 async def settings_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle settings menu interactions."""
     query = update.callback_query
-    await query.answer()
-    user_id = str(update.effective_user.id)
-    settings = context.user_data["settings"]
-
-    # Extract data and current chain
     data = query.data
+
+    # Exact buttons first, then value buttons keyed on their prefix (e.g. gas_low -> "gas", "low")
+    handler = _SETTINGS_ROUTES.get(data)
+    value = None
+    if handler is None:
+        prefix, _, value = data.partition("_")
+        handler = _SETTINGS_PREFIX_ROUTES.get(prefix, _on_unknown)
+    if handler not in _CHAINLESS_HANDLERS and context.user_data.get("current_chain") is None:
+        # No chain picked (e.g. a button pressed after a restart); start over at the chain choice
+        handler = _on_back
+
+    # Answer the callback alongside the menu edit rather than before it
+    await asyncio.gather(query.answer(), handler(update, context, value))
+
+
+async def _on_unknown(update: Update, context: ContextTypes.DEFAULT_TYPE, _value) -> None:
+    await update.callback_query.edit_message_text("Unknown option. Please try again.")
+    logger.warning("User %s selected unknown option: %s", update.effective_user.id, update.callback_query.data)
+
+
+async def _on_chain_select(update: Update, context: ContextTypes.DEFAULT_TYPE, value: str) -> None:
+    chain = value.partition("_")[2]  # "settings_<chain>"
+    context.user_data["current_chain"] = chain
+    await show_chain_settings_menu(update.callback_query, context, chain)
+    logger.info("User %s selected %s settings", update.effective_user.id, chain)
+
+
+async def _set_chain_setting(key: str, label: str, update: Update, context: ContextTypes.DEFAULT_TYPE, value: str) -> None:
+    """Store a picked value (e.g. gas_low -> gas_fee="low") and redraw the chain menu; bound per key in the routes."""
     chain = context.user_data.get("current_chain")
+    chain_settings(context, chain)[key] = value
+    await show_chain_settings_menu(update.callback_query, context, chain)
+    logger.info("User %s set %s %s to %s", update.effective_user.id, chain, label, value)
 
-    if data.startswith("chain_settings_"):
-        chain = data.split("_")[2]
-        context.user_data["current_chain"] = chain
-        await show_chain_settings_menu(query, context, chain)
-        logger.info(f"User {user_id} selected {chain} settings")
-
-    elif data == "set_gas_fee":
-        await show_gas_fee_menu(query, chain)
-
-    elif data.startswith("gas_"):
-        gas_fee = data.split("_")[1]
-        settings[chain]["gas_fee"] = gas_fee
-        await show_chain_settings_menu(query, context, chain)
-        logger.info(f"User {user_id} set {chain} gas fee to {gas_fee}")
-
-    elif data == "toggle_notifications":
-        settings[chain]["notifications"] = not settings[chain]["notifications"]
-        await show_chain_settings_menu(query, context, chain)
-        logger.info(f"User {user_id} toggled {chain} notifications to {settings[chain]['notifications']}")
-
-    elif data == "set_wallet_format":
-        await show_wallet_format_menu(query, chain)
-
-    elif data.startswith("wallet_"):
-        format_type = "_".join(data.split("_")[1:])
-        settings[chain]["wallet_format"] = format_type
-        await show_chain_settings_menu(query, context, chain)
-        logger.info(f"User {user_id} set {chain} wallet format to {format_type}")
-
-    elif data == "set_currency":
-        await show_currency_menu(query, chain)
-
-    elif data.startswith("currency_"):
-        currency = data.split("_")[1]
-        settings[chain]["currency"] = currency
-        await show_chain_settings_menu(query, context, chain)
-        logger.info(f"User {user_id} set {chain} currency to {currency}")
-
-    elif data == "settings_done":
-        await query.edit_message_text(
-            f"✅ {chain.capitalize()} settings saved! Use /settings to adjust anytime."
-        )
-        logger.info(f"User {user_id} saved {chain} settings: {settings[chain]}")
-        del context.user_data["current_chain"]
 
-    elif data == "settings_back":
-        await settings_handler(update, context)
+async def _on_toggle_notifications(update: Update, context: ContextTypes.DEFAULT_TYPE, _value) -> None:
+    chain = context.user_data.get("current_chain")
+    settings = chain_settings(context, chain)
+    settings["notifications"] = not settings["notifications"]
+    await show_chain_settings_menu(update.callback_query, context, chain)
+    logger.info("User %s toggled %s notifications to %s", update.effective_user.id, chain, settings['notifications'])
+
+
+async def _open_submenu(show, update: Update, context: ContextTypes.DEFAULT_TYPE, _value) -> None:
+    """Open one of the static option submenus for the current chain; bound per menu in the routes."""
+    await show(update.callback_query, context.user_data.get("current_chain"))
+
+
+async def _on_done(update: Update, context: ContextTypes.DEFAULT_TYPE, _value) -> None:
+    chain = context.user_data.get("current_chain")
+    await update.callback_query.edit_message_text(
+        f"✅ {chain.capitalize()} settings saved! Use /settings to adjust anytime."
+    )
+    if logger.isEnabledFor(logging.INFO):  # Skip building the settings snapshot when it won't be logged
+        logger.info("User %s saved %s settings: %s", update.effective_user.id, chain, dict(chain_settings(context, chain)))
+    del context.user_data["current_chain"]
 
-    else:
-        await query.edit_message_text("Unknown option. Please try again.")
-        logger.warning(f"User {user_id} selected unknown option: {data}")
+
+async def _on_back(update: Update, context: ContextTypes.DEFAULT_TYPE, _value) -> None:
+    await _show_settings_root(update)  # settings_callback already answers the query
 
 
 async def show_chain_settings_menu(query, context: ContextTypes.DEFAULT_TYPE, chain: str) -> None:
     """Display chain-specific settings menu."""
-    settings = context.user_data["settings"][chain]
+    settings = chain_settings(context, chain)
     keyboard = [
-        [InlineKeyboardButton("🏠 Main Menu", callback_data="main_menu")],
+        [MAIN_MENU_BTN],
         [InlineKeyboardButton(f"Gas Fee: {settings['gas_fee'].capitalize()}", callback_data="set_gas_fee")],
         [InlineKeyboardButton(f"Notifications: {'On' if settings['notifications'] else 'Off'}", callback_data="toggle_notifications")],
         [InlineKeyboardButton(f"Wallet Format: {settings['wallet_format'].replace('_', ' ').capitalize()}", callback_data="set_wallet_format")],
         [InlineKeyboardButton(f"Currency: {settings['currency']}", callback_data="set_currency")],
-        [InlineKeyboardButton("Done", callback_data="settings_done")]
+        [_DONE_BTN]
     ]
 
     await query.edit_message_text(
@@ -136,52 +186,59 @@ async def show_chain_settings_menu(query, context: ContextTypes.DEFAULT_TYPE, ch
 
 async def show_gas_fee_menu(query, chain: str) -> None:
     """Show gas fee options."""
-    keyboard = [
-        [InlineKeyboardButton("🏠 Main Menu", callback_data="main_menu")],
-        [InlineKeyboardButton("Low", callback_data="gas_low"),
-         InlineKeyboardButton("Medium", callback_data="gas_medium"),
-         InlineKeyboardButton("High", callback_data="gas_high")],
-        [InlineKeyboardButton("Back", callback_data="settings_back")]
-    ]
     await query.edit_message_text(
         f"Select gas fee preference for {chain.upper()}:",
-        reply_markup=InlineKeyboardMarkup(keyboard)
+        reply_markup=GAS_FEE_MENU
     )
 
 
 async def show_wallet_format_menu(query, chain: str) -> None:
     """Show wallet format options."""
-    keyboard = [
-        [InlineKeyboardButton("🏠 Main Menu", callback_data="main_menu")],
-        [InlineKeyboardButton("User Friendly", callback_data="wallet_user_friendly"),
-         InlineKeyboardButton("Raw", callback_data="wallet_raw")],
-        [InlineKeyboardButton("Back", callback_data="settings_back")]
-    ]
     await query.edit_message_text(
         f"Select wallet address format for {chain.upper()}:",
-        reply_markup=InlineKeyboardMarkup(keyboard)
+        reply_markup=WALLET_FORMAT_MENU
     )
 
 
 async def show_currency_menu(query, chain: str) -> None:
     """Show currency options."""
-    keyboard = [
-        [InlineKeyboardButton("🏠 Main Menu", callback_data="main_menu")],
-        [InlineKeyboardButton("USD", callback_data="currency_USD"),
-         InlineKeyboardButton("EUR", callback_data="currency_EUR")],
-        [InlineKeyboardButton("Back", callback_data="settings_back")]
-    ]
     await query.edit_message_text(
         f"Select fiat currency for {chain.upper()}:",
-        reply_markup=InlineKeyboardMarkup(keyboard)
+        reply_markup=CURRENCY_MENU
     )
 
 
+# settings_callback dispatch tables: exact callback_data, then the part before the first "_"
+_SETTINGS_ROUTES = {
+    "set_gas_fee": partial(_open_submenu, show_gas_fee_menu),
+    "toggle_notifications": _on_toggle_notifications,
+    "set_wallet_format": partial(_open_submenu, show_wallet_format_menu),
+    "set_currency": partial(_open_submenu, show_currency_menu),
+    "settings_done": _on_done,
+    "settings_back": _on_back,
+}
+_SETTINGS_PREFIX_ROUTES = {
+    "chain": _on_chain_select,
+    "gas": partial(_set_chain_setting, "gas_fee", "gas fee"),
+    "wallet": partial(_set_chain_setting, "wallet_format", "wallet format"),
+    "currency": partial(_set_chain_setting, "currency", "currency"),
+}
+
+# Handlers that work without a current_chain; every other route is sent back to the chain choice
+_CHAINLESS_HANDLERS = frozenset((_on_chain_select, _on_back, _on_unknown))
+
+
+# Callback data claimed by settings_callback_handler
+_SETTINGS_PREFIXES = ("set_", "chain_", "gas_", "toggle_notifications", "wallet_", "currency_", "settings_", "main_menu")
+
+
+def _is_settings_callback(data) -> bool:
+    """CallbackQueryHandler pattern: a C-level prefix test instead of matching a regex alternation."""
+    return isinstance(data, str) and data.startswith(_SETTINGS_PREFIXES)
+
+
 # Export handlers
 settings_command_handler = CommandHandler("settings", settings_handler)
-settings_callback_handler = CallbackQueryHandler(
-    settings_callback,
-    pattern=r"^(set_|chain_|gas_|toggle_notifications|wallet_|currency_|settings_|main_menu)"
-)
+settings_callback_handler = CallbackQueryHandler(settings_callback, pattern=_is_settings_callback)
 settings_input_handler = MessageHandler(filters.TEXT & ~filters.COMMAND, lambda u, c: None)
 
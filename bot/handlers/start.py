@@ -1,9 +1,11 @@
+import asyncio
 import logging
+import re
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, CommandHandler, CallbackQueryHandler
 from database.db import get_async_session, get_user, add_user
-from services.wallet_management import create_user_wallet, get_wallet
-from services.utils import get_wallet_balance_and_usd, get_sol_price, get_ton_price  # Added price imports
+from services.wallet_management import create_user_wallet, get_wallets
+from services.utils import get_wallet_balance_and_usd, get_wallet_balance_or_zero, fetch_natives, get_sol_price, get_ton_price  # Added price imports
 logger = logging.getLogger(__name__)
 
 import os
@@ -68,28 +70,31 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
                 await update.message.reply_text(welcome_msg, reply_markup=keyboard, parse_mode="Markdown")
                 logger.info(f"Sent welcome message to new user {telegram_id}")
             else:
-                # Returning user: Ensure wallets exist, then show trading interface
-                sol_wallet = await get_wallet(telegram_id, "solana", session)
+                # Returning user: Ensure wallets exist, then show trading interface.
+                # Both wallets come from one query (the session can't run two at once).
+                wallets = await get_wallets(telegram_id, session)
+                sol_wallet = wallets.get("solana")
                 if not sol_wallet:
                     sol_wallet = await create_user_wallet(telegram_id, "solana", session)
                     await session.commit()
                     logger.info(f"Created Solana wallet for returning user {telegram_id}")
 
-                ton_wallet = await get_wallet(telegram_id, "ton", session)
+                ton_wallet = wallets.get("ton")
                 if not ton_wallet:
                     ton_wallet = await create_user_wallet(telegram_id, "ton", session)
                     await session.commit()
                     logger.info(f"Created TON wallet for returning user {telegram_id}")
 
-                # Fetch prices and wallet info
-                sol_price = await get_sol_price()
-                ton_price = await get_ton_price()
                 sol_address = sol_wallet.public_key if sol_wallet else "Not set"
                 ton_address = ton_wallet.public_key if ton_wallet else "Not set"
 
-                # Fetch balances and USD values
-                sol_balance, sol_usd = await get_wallet_balance_and_usd(sol_address, "solana") if sol_wallet else (0.0, 0.0)
-                ton_balance, ton_usd = await get_wallet_balance_and_usd(ton_address, "ton") if ton_wallet else (0.0, 0.0)
+                # Prices and balances come from independent APIs; fetch them concurrently
+                sol_price, ton_price, (sol_balance, sol_usd), (ton_balance, ton_usd) = await asyncio.gather(
+                    get_sol_price(),
+                    get_ton_price(),
+                    get_wallet_balance_or_zero(sol_wallet, "solana"),
+                    get_wallet_balance_or_zero(ton_wallet, "ton"),
+                )
 
                 trading_msg = (
                     "🔄 *Not-Cotrader*\n\n"
@@ -114,18 +119,21 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     if query.data == "agree":
         # New user agrees: Create wallets and show setup options
         async with await get_async_session() as session:
-            sol_wallet = await get_wallet(user_id, "solana", session)
+            wallets = await get_wallets(user_id, session)
+            sol_wallet = wallets.get("solana")
             if not sol_wallet:
                 sol_wallet = await create_user_wallet(user_id, "solana", session)
                 await session.commit()
-            ton_wallet = await get_wallet(user_id, "ton", session)
+            ton_wallet = wallets.get("ton")
             if not ton_wallet:
                 ton_wallet = await create_user_wallet(user_id, "ton", session)
                 await session.commit()
 
             # Fetch balances and USD values
-            sol_balance, sol_usd = await get_wallet_balance_and_usd(sol_wallet.public_key, "solana")
-            ton_balance, ton_usd = await get_wallet_balance_and_usd(ton_wallet.public_key, "ton")
+            (sol_balance, sol_usd), (ton_balance, ton_usd) = await asyncio.gather(
+                get_wallet_balance_and_usd(sol_wallet.public_key, "solana"),
+                get_wallet_balance_and_usd(ton_wallet.public_key, "ton"),
+            )
 
             setup_msg = (
                 "🔑 *Your Trading Wallets Are Ready!*\n\n"
@@ -145,38 +153,34 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 
     elif query.data in ["main_menu", "import_wallet"]:
         # After Main Menu or Import: Show trading interface
-        async with await get_async_session() as session:
-            sol_price = await get_sol_price()
-            ton_price = await get_ton_price()
-            
-            sol_wallet = await get_wallet(user_id, "solana", session)
-            ton_wallet = await get_wallet(user_id, "ton", session)
-            sol_address = sol_wallet.public_key if sol_wallet else "Not set"
-            ton_address = ton_wallet.public_key if ton_wallet else "Not set"
-
-            # Fetch balances and USD values
-            sol_balance, sol_usd = await get_wallet_balance_and_usd(sol_address, "solana") if sol_wallet else (0.0, 0.0)
-            ton_balance, ton_usd = await get_wallet_balance_and_usd(ton_address, "ton") if ton_wallet else (0.0, 0.0)
-
-            trading_msg = (
-                   "🤖 *Not-Cotrader — Your Smart Trading Sidekick*\n\n"
-                    f"💧 SOL Price: ${sol_price:.2f}  |  💎 TON Price: ${ton_price:.2f}\n\n"
-                    f"💧 *Sol-Wallet*: {sol_balance:.4f} SOL (${sol_usd:.2f})\n`{sol_address}`\n(tap to copy)\n\n"
-                    f"💎 *TON-Wallet*: {ton_balance:.4f} TON (${ton_usd:.2f})\n`{ton_address}`\n(tap to copy)\n\n"
-                    "⚡ *How to Trade:*\n"
-                    "1. Type a mint/contract address to start trading.\n"
-                    "2. Or use the menu below for quick actions.\n\n"
-                    "🧠 *AI Mode:* Use `/ai` to turn the AI *on* or *off*. When AI’s on, just chat — Co-Trader gets you. When off, go full degen with commands.\n\n"
-                    "Ready to dive in? Let’s trade! 🚀"
-                )
+        # Prices, the (cached) wallets and their balances, all fetched concurrently
+        sol_price, ton_price, natives = await asyncio.gather(
+            get_sol_price(), get_ton_price(), fetch_natives(user_id)
+        )
+        (sol_wallet, sol_balance, sol_usd), (ton_wallet, ton_balance, ton_usd) = natives
+        sol_address = sol_wallet.public_key if sol_wallet else "Not set"
+        ton_address = ton_wallet.public_key if ton_wallet else "Not set"
+
+        trading_msg = (
+               "🤖 *Not-Cotrader — Your Smart Trading Sidekick*\n\n"
+                f"💧 SOL Price: ${sol_price:.2f}  |  💎 TON Price: ${ton_price:.2f}\n\n"
+                f"💧 *Sol-Wallet*: {sol_balance:.4f} SOL (${sol_usd:.2f})\n`{sol_address}`\n(tap to copy)\n\n"
+                f"💎 *TON-Wallet*: {ton_balance:.4f} TON (${ton_usd:.2f})\n`{ton_address}`\n(tap to copy)\n\n"
+                "⚡ *How to Trade:*\n"
+                "1. Type a mint/contract address to start trading.\n"
+                "2. Or use the menu below for quick actions.\n\n"
+                "🧠 *AI Mode:* Use `/ai` to turn the AI *on* or *off*. When AI’s on, just chat — Co-Trader gets you. When off, go full degen with commands.\n\n"
+                "Ready to dive in? Let’s trade! 🚀"
+            )
 
-            await query.edit_message_text(trading_msg, reply_markup=TRADING_MENU, parse_mode="Markdown")
-            logger.info(f"Displayed trading interface for user {user_id} after {query.data}")
+        await query.edit_message_text(trading_msg, reply_markup=TRADING_MENU, parse_mode="Markdown")
+        logger.info(f"Displayed trading interface for user {user_id} after {query.data}")
 
-            # Stub for import_wallet
-            if query.data == "import_wallet":
-                logger.info(f"User {user_id} clicked Import Wallet - stubbed for now")
+        # Stub for import_wallet
+        if query.data == "import_wallet":
+            logger.info(f"User {user_id} clicked Import Wallet - stubbed for now")
 
 # Export handlers
 start_handler = CommandHandler("start", start)
-start_callback_handler = CallbackQueryHandler(handle_callback, pattern="^(agree|main_menu|import_wallet)$")
\ No newline at end of file
+_START_CALLBACK_PATTERN = re.compile(r"^(agree|main_menu|import_wallet)$", re.ASCII)
+start_callback_handler = CallbackQueryHandler(handle_callback, pattern=_START_CALLBACK_PATTERN)
\ No newline at end of file
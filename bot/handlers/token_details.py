@@ -1,9 +1,9 @@
+import asyncio
 import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes  # No need for MessageHandler here
 from services.token_info import get_token_info, format_token_info, detect_chain
-from database.db import get_async_session
-from services.wallet_management import get_wallet
+from services.wallet_management import cached_get_wallet
 from services.utils import get_wallet_balance_and_usd
 
 logger = logging.getLogger(__name__)
@@ -16,20 +16,24 @@ async def token_details(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     try:
         chain = detect_chain(user_input)  # This raises ValueError if not a valid address
         unit = "SOL" if chain == "solana" else "TON"
-        result = await get_token_info(user_input)
+        # Token info doesn't depend on the wallet; start it before the wallet lookup
+        token_task = asyncio.create_task(get_token_info(user_input))
+        try:
+            wallet = await cached_get_wallet(user_id, chain)
+            if not wallet:
+                await update.message.reply_text(f"No {chain.capitalize()} wallet found. Create one first!", parse_mode="Markdown")
+                return
+            result, (wallet_balance, usd_value) = await asyncio.gather(
+                token_task, get_wallet_balance_and_usd(wallet.public_key, chain)
+            )
+        finally:
+            token_task.cancel()  # No-op once it has finished; stops it on every early exit
         if not result:
             await update.message.reply_text("Couldn’t fetch token info. Check the address and try again.")
             return
         token_info, chain_price_usd = result
 
-        async with (await get_async_session()) as session:
-            wallet = await get_wallet(user_id, chain, session)
-            if not wallet:
-                await update.message.reply_text(f"No {chain.capitalize()} wallet found. Create one first!", parse_mode="Markdown")
-                return
-            wallet_balance, usd_value = await get_wallet_balance_and_usd(wallet.public_key, chain)
-
-        formatted_info = await format_token_info(token_info, chain, wallet_balance, chain_price_usd)
+        formatted_info = format_token_info(token_info, chain, wallet_balance, chain_price_usd)
         default_amount = 0.5  # Default buy amount
 
         # Store trade setup in context
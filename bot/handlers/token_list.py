@@ -1,11 +1,23 @@
 import logging
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import CommandHandler, CallbackQueryHandler, ContextTypes
-import aiohttp
-import asyncio
+from telegram import Update
+from telegram.ext import CallbackQueryHandler, ContextTypes
+from services.http_session import get_http_session
+from bot.handlers.constants import MAIN_MENU_ONLY
 
 logger = logging.getLogger(__name__)
 
+# Shown when the live prices can't be fetched
+TOKEN_LIST_FALLBACK_MESSAGE = (
+    "📋 *Token List (AI Mode)*\n\n"
+    "Unable to fetch live prices right now. Here's a preview:\n"
+    "- *TON*: $2.60 (+3.2%)\n"
+    "- *USDT*: $1.00 (Stable)\n"
+    "- *SOL*: $144.50 (+1.8%)\n"
+    "- *USDC*: $1.00 (Stable)\n"
+    "- *SHIB*: $0.000013 (+5.1%)\n\n"
+    "Live data will be restored soon!"
+)
+
 async def fetch_token_prices():
     """Fetch real-time token prices from CoinGecko API."""
     url = "https://api.coingecko.com/api/v3/simple/price"
@@ -23,21 +35,21 @@ async def fetch_token_prices():
         "include_24hr_change": "true"
     }
     
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.get(url, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return {tokens[key]: {
-                        "price": data[key]["usd"],
-                        "change": data[key]["usd_24h_change"]
-                    } for key in data}
-                else:
-                    logger.error(f"API request failed with status {response.status}")
-                    return None
-        except Exception as e:
-            logger.error(f"Error fetching token prices: {str(e)}")
-            return None
+    session = get_http_session()
+    try:
+        async with session.get(url, params=params) as response:
+            if response.status == 200:
+                data = await response.json()
+                return {tokens[key]: {
+                    "price": data[key]["usd"],
+                    "change": data[key]["usd_24h_change"]
+                } for key in data}
+            else:
+                logger.error(f"API request failed with status {response.status}")
+                return None
+    except Exception as e:
+        logger.error(f"Error fetching token prices: {str(e)}")
+        return None
 
 async def token_list_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Display a list of tokens with real-time prices in AI Mode."""
@@ -63,22 +75,9 @@ async def token_list_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
             "\n\nData sourced from CoinGecko API. Prices update live!"
         )
     else:
-        # Fallback message if API fails
-        message = (
-            "📋 *Token List (AI Mode)*\n\n"
-            "Unable to fetch live prices right now. Here's a preview:\n"
-            "- *TON*: $2.60 (+3.2%)\n"
-            "- *USDT*: $1.00 (Stable)\n"
-            "- *SOL*: $144.50 (+1.8%)\n"
-            "- *USDC*: $1.00 (Stable)\n"
-            "- *SHIB*: $0.000013 (+5.1%)\n\n"
-            "Live data will be restored soon!"
-        )
-
-    keyboard = [[InlineKeyboardButton("🏠 Main Menu", callback_data="main_menu")]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+        message = TOKEN_LIST_FALLBACK_MESSAGE
 
-    await query.edit_message_text(message, reply_markup=reply_markup, parse_mode="Markdown")
+    await query.edit_message_text(message, reply_markup=MAIN_MENU_ONLY, parse_mode="Markdown")
     logger.info(f"Displayed token list with live prices to user {user_id}")
 
 # Export handler
@@ -1,11 +1,12 @@
 # bot/handlers/wallet.py
 import logging
-import base58
+import based58
+from decimal import Decimal, InvalidOperation
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CallbackQueryHandler, ContextTypes, ConversationHandler, MessageHandler, filters
 from database.db import get_async_session
 from services.wallet_management import get_wallet
-from services.utils import get_wallet_balance_and_usd, refresh_handler, main_menu_handler, add_common_buttons
+from services.utils import get_wallet_balance_and_usd, invalidate_balance_cache, refresh_handler, main_menu_handler, add_common_buttons, edit_if_changed, to_base_units, GAS_RESERVE_UNITS
 from services.crypto import CIPHER
 from solders.keypair import Keypair
 from blockchain.ton.withdraw import send_ton_transaction  # For TON withdrawals
@@ -15,6 +16,8 @@ logger = logging.getLogger(__name__)
 # Conversation states for withdrawal
 WITHDRAW_AMOUNT, DESTINATION_ADDRESS, CONFIRM_WITHDRAW = range(3)
 
+DECRYPTED_KEY_TTL = 60  # Seconds a decrypted key may stay in user_data before it is wiped
+
 WALLET_MAIN_MENU = InlineKeyboardMarkup([
     [InlineKeyboardButton("Solana Wallet", callback_data="solana_wallet"),
      InlineKeyboardButton("TON Wallet", callback_data="ton_wallet")],
@@ -31,6 +34,39 @@ def get_detailed_wallet_menu(chain: str) -> InlineKeyboardMarkup:
     ]
     return add_common_buttons(keyboard, f"{chain}_wallet")
 
+async def get_decrypted_key(context: ContextTypes.DEFAULT_TYPE, user_id: str, chain: str, wallet) -> bytearray:
+    """
+    Return the wallet's decrypted private key/mnemonic, reusing a recent decryption.
+
+    The plaintext is kept in user_data for DECRYPTED_KEY_TTL seconds, so an export followed by a
+    withdrawal decrypts once. It is only cached when the job queue can wipe it afterwards.
+    """
+    cache_key = (chain, wallet.encrypted_private_key)
+    cached = context.user_data.get("decrypted_key")
+    if cached and cached[0] == cache_key:
+        return cached[1]
+
+    decrypted = bytearray(CIPHER.decrypt(wallet.encrypted_private_key.encode('utf-8')))
+    if context.job_queue:
+        _wipe_decrypted_key_now(context.user_data)
+        context.user_data["decrypted_key"] = (cache_key, decrypted)
+        name = f"wipe_decrypted_key_{user_id}"
+        for job in context.job_queue.get_jobs_by_name(name):
+            job.schedule_removal()
+        context.job_queue.run_once(_wipe_decrypted_key, DECRYPTED_KEY_TTL, user_id=int(user_id), name=name)
+    return decrypted
+
+def _wipe_decrypted_key_now(user_data: dict) -> None:
+    """Overwrite and drop the cached decrypted key, if any."""
+    cached = user_data.pop("decrypted_key", None)
+    if cached:
+        key = cached[1]
+        key[:] = bytes(len(key))
+
+async def _wipe_decrypted_key(context: ContextTypes.DEFAULT_TYPE) -> None:
+    _wipe_decrypted_key_now(context.user_data)
+    logger.debug("Wiped cached decrypted key for user %s", context.job.user_id)
+
 async def wallet_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     query = update.callback_query
     await query.answer()
@@ -73,7 +109,7 @@ async def detailed_wallet_handler(update: Update, context: ContextTypes.DEFAULT_
     context.user_data[f"last_refresh_{chain}_wallet_msg"] = msg
     context.user_data[f"last_refresh_{chain}_wallet_markup"] = markup
     if "refresh" not in query.data:
-        await query.edit_message_text(msg, reply_markup=markup, parse_mode="Markdown")
+        await edit_if_changed(query, context, msg, markup)
     logger.info(f"Displayed {chain_display} wallet details for user {user_id}")
 
 async def reset_wallet(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -98,13 +134,12 @@ async def export_wallet(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
             return
 
         try:
-            encrypted_key = wallet.encrypted_private_key.encode('utf-8')
-            decrypted_bytes = CIPHER.decrypt(encrypted_key)
+            decrypted_bytes = await get_decrypted_key(context, user_id, chain, wallet)
 
             if chain == "solana":
-                keypair = Keypair.from_seed(decrypted_bytes[:32])
-                full_keypair_bytes = keypair.secret() + bytes(keypair.pubkey())
-                exported_key = base58.b58encode(full_keypair_bytes).decode('ascii')
+                keypair = Keypair.from_seed(bytes(decrypted_bytes[:32]))
+                full_keypair_bytes = bytes(keypair)  # 64-byte secret||pubkey, built by solders
+                exported_key = based58.b58encode(full_keypair_bytes).decode('ascii')
                 key_label = "Private Key"
             else:  # TON
                 exported_key = decrypted_bytes.decode('utf-8')
@@ -151,7 +186,8 @@ async def withdraw_tokens(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     user_id = str(update.effective_user.id)
     chain = "solana" if "solana" in query.data else "ton"
     chain_unit = "SOL" if chain == "solana" else "TON"
-    gas_reserve = 0.0001 if chain == "solana" else 0.003 # Consistent gas reserve for both "All" and "X"
+    gas_reserve_units = GAS_RESERVE_UNITS[chain]  # Consistent gas reserve for both "All" and "X"
+    gas_reserve = gas_reserve_units / 1_000_000_000
     is_withdraw_all = "_all" in query.data
     logger.info(f"withdraw_tokens triggered for user {user_id} with data: {query.data}, chain: {chain}, all: {is_withdraw_all}")
 
@@ -161,18 +197,23 @@ async def withdraw_tokens(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             await query.edit_message_text(f"No {chain.capitalize()} wallet found. Create one first!", parse_mode="Markdown")
             return ConversationHandler.END
         balance, _ = await get_wallet_balance_and_usd(wallet.public_key, chain)
-        if balance <= gas_reserve:
+        balance_units = to_base_units(balance)
+        if balance_units <= gas_reserve_units:
             await query.edit_message_text(
                 f"Insufficient {chain_unit} balance. You have {balance:.6f} {chain_unit}, need at least {gas_reserve:.6f} for gas.",
                 parse_mode="Markdown"
             )
             return ConversationHandler.END
-        max_withdrawable = balance - gas_reserve
+        # Amounts are tracked in integer lamports/nanoTON; floats are only for display
+        max_withdrawable_units = balance_units - gas_reserve_units
+        max_withdrawable = max_withdrawable_units / 1_000_000_000
         context.user_data["chain"] = chain
         context.user_data["max_withdrawable"] = max_withdrawable
+        context.user_data["max_withdrawable_units"] = max_withdrawable_units
 
         if is_withdraw_all:
             context.user_data["withdraw_amount"] = max_withdrawable
+            context.user_data["withdraw_units"] = max_withdrawable_units
             await query.edit_message_text(
                 f"Please send the {chain_unit} destination address to withdraw all {max_withdrawable:.6f} {chain_unit}:",
                 parse_mode="Markdown"
@@ -193,16 +234,20 @@ async def withdraw_amount_handler(update: Update, context: ContextTypes.DEFAULT_
     chain_unit = "SOL" if chain == "solana" else "TON"
     logger.info(f"withdraw_amount_handler triggered for user {user_id}, chain: {chain}, input: {update.message.text}")
     try:
-        amount = float(update.message.text.strip())
+        amount = Decimal(update.message.text.strip())
+        if not amount.is_finite():
+            raise ValueError
+        amount_units = to_base_units(amount)
         max_withdrawable = context.user_data["max_withdrawable"]
-        if amount <= 0 or amount > max_withdrawable:
+        if amount_units <= 0 or amount_units > context.user_data["max_withdrawable_units"]:
             await update.message.reply_text(
                 f"Invalid amount. Enter a value between 0 and {max_withdrawable:.6f} {chain_unit}.",
                 parse_mode="Markdown"
             )
             return WITHDRAW_AMOUNT
-        context.user_data["withdraw_amount"] = amount
-    except ValueError:
+        context.user_data["withdraw_amount"] = float(amount)
+        context.user_data["withdraw_units"] = amount_units
+    except (ValueError, InvalidOperation):
         await update.message.reply_text(f"Invalid amount. Enter a number (e.g., 1.5 {chain_unit}).", parse_mode="Markdown")
         return WITHDRAW_AMOUNT
 
@@ -244,14 +289,14 @@ async def confirm_withdraw(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 
     async with await get_async_session() as session:
         wallet = await get_wallet(user_id, chain, session)
-        encrypted_key = wallet.encrypted_private_key.encode('utf-8')
-        private_key = CIPHER.decrypt(encrypted_key)  # Decrypted bytes
+    private_key = await get_decrypted_key(context, user_id, chain, wallet)  # Decrypted bytes
 
     try:
         if chain == "ton":
             mnemonic = private_key.decode('utf-8')  # TON uses mnemonic
-            nano_amount = int(amount * 1_000_000_000)  # Convert to nanoTON
-            tx_id = await send_ton_transaction(mnemonic, destination_address, nano_amount)
+            nano_amount = context.user_data["withdraw_units"]
+            tx_id = await send_ton_transaction(mnemonic, destination_address, nano_amount, wallet.public_key)
+            invalidate_balance_cache(wallet.public_key, chain)
             explorer_url = f"https://tonscan.org/tx/{tx_id}"
         elif chain == "solana":
             raise NotImplementedError("Solana withdrawal not yet implemented")
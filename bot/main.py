@@ -1,10 +1,15 @@
+import asyncio
 import sys
 import os
+import time
+from urllib.parse import urlparse
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 import logging
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes, MessageHandler,filters,ConversationHandler
+import orjson
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes, MessageHandler,filters
 from telegram.error import BadRequest
 from sqlalchemy.ext.asyncio import AsyncSession
 from database.db import get_async_session, get_user, add_user, update_user_ai_mode
@@ -12,9 +17,8 @@ from bot.handlers.buy import buy_handler, buy_conv_handler
 from bot.handlers.wallet import wallet_handler, wallet_callbacks
 from bot.handlers.sell import sell_handler, sell_conv_handler
 from bot.handlers.start import start_handler, start_callback_handler
-from bot.handlers.settings import settings_handler  
+from bot.handlers.settings import settings_handler, settings_command_handler, settings_callback_handler, settings_input_handler
 from bot.handlers.help import handler as help_command_handler, callback_handler as help_callback_handler
-from bot.handlers.settings import settings_command_handler, settings_callback_handler, settings_input_handler
 from bot.handlers.positions import positions_handler
 from bot.handlers.pnl import pnl_handler
 from bot.handlers.token_list import token_list_handler
@@ -22,10 +26,13 @@ from bot.handlers.watchlist import watchlist_handler
 from bot.handlers.feedback import feedback_conv_handler , feedback_handler
 from bot.ai.agents.trading_agent import trading_agent
 from dotenv import load_dotenv
-from langchain_core.messages import HumanMessage, AIMessage,SystemMessage
-from bot.ai.prompts.trading_prompts import TRADING_PROMPT
+from langchain_core.messages import HumanMessage, AIMessageChunk
+from bot.ai.prompts.trading_prompts import TRADING_SYSTEM_MESSAGE
 from services.token_info import detect_chain 
 from bot.handlers.token_details import token_details
+from bot.handlers.constants import MAIN_MENU
+from services.http_session import get_http_session, close_http_session, OrjsonHTTPXRequest
+from blockchain.solana.utils import close_solana_clients
 
 load_dotenv()
 # Configure logging to save to a file
@@ -40,25 +47,25 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
+STREAM_EDIT_INTERVAL = 1.0  # Telegram rate-limits edits; refresh a streaming AI reply at most this often
+# Outbound Bot API connections. PTB's default pool is small enough that bursts of answer/edit calls
+# queue behind each other; a larger pool only removes that local queueing, Telegram's own per-chat
+# and global flood limits still apply.
+BOT_API_POOL_SIZE = 256
+GET_UPDATES_POOL_SIZE = 16
+# Optional webhook mode: when WEBHOOK_URL (the public https URL Telegram should POST to) is set,
+# updates are pushed to a local aiohttp server instead of being long-polled. Telegram only
+# accepts webhooks on ports 443, 80, 88 and 8443; put a TLS-terminating proxy in front if needed.
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
 
 if not TELEGRAM_TOKEN:
     logger.critical("TELEGRAM_TOKEN is missing from the environment!")
     sys.exit(1)
 
 
-MAIN_MENU = InlineKeyboardMarkup([
-    [InlineKeyboardButton("🟩 Buy", callback_data="buy"),
-     InlineKeyboardButton("🟥 Sell", callback_data="sell")],
-    [InlineKeyboardButton("Positions", callback_data="positions"),
-     InlineKeyboardButton("Token List", callback_data="token_list")],
-    [InlineKeyboardButton("P&L", callback_data="pnl"),
-     InlineKeyboardButton("Watchlist", callback_data="watchlist")], 
-    [InlineKeyboardButton("Wallet", callback_data="wallet"),
-     InlineKeyboardButton("Settings", callback_data="settings"),
-     InlineKeyboardButton("Feedback", callback_data="feedback")],
-    [InlineKeyboardButton("Help", callback_data="help")]
-])
-
 async def toggle_ai_mode(user_id: int, sess: AsyncSession, current_mode: bool) -> bool:
     """Toggle AI mode in the database."""
     new_mode = not current_mode
@@ -76,20 +83,18 @@ async def ai_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
         
         if new_mode:
             await update.message.reply_text("AI Mode is now ON. Let’s chat!")
-            state = {"messages": [SystemMessage(content=TRADING_PROMPT), HumanMessage(content="Hi")], "user_id": user_id}
+            state = {"messages": [TRADING_SYSTEM_MESSAGE, HumanMessage(content="Hi")], "user_id": user_id}
             config = {"configurable": {"thread_id": str(user_id)}}
-            logger.info(f"Invoking agent with state: {state}")
+            logger.info(f"Invoking agent for user {user_id}")
             try:
                 result = await trading_agent.ainvoke(state, config)
                 response = result["messages"][-1].content
                 await update.message.reply_text(response, parse_mode="Markdown")
-                context.user_data["ai_messages"] = result["messages"]
             except Exception as e:
                 logger.error(f"Agent invocation failed: {str(e)}")
                 await update.message.reply_text("Oops, AI hiccup! Try again.")
         else:
             await update.message.reply_text("AI Mode is now OFF. Back to normal bot mode.")
-            context.user_data.pop("ai_messages", None)
             logger.info(f"User {user_id} toggled AI mode to OFF")
 
 async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -119,20 +124,45 @@ async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE
 async def handle_ai_message(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int, user_input: str) -> None:
     """Handle AI mode messages."""
     logger.info(f"User {user_id} sent AI input: {user_input}")
-    messages = context.user_data.get("ai_messages", [SystemMessage(content=TRADING_PROMPT)])
-    messages.append(HumanMessage(content=user_input))
-    state = {"messages": messages, "user_id": user_id}
+    # The checkpointer keeps the conversation per thread, so only the new turn is sent; the
+    # system prompt's fixed id makes the reducer update it in place rather than append it again.
+    state = {"messages": [TRADING_SYSTEM_MESSAGE, HumanMessage(content=user_input)], "user_id": user_id}
     config = {"configurable": {"thread_id": str(user_id)}}
     
     try:
-        result = await trading_agent.ainvoke(state, config)
-        response = result["messages"][-1].content
+        # Show the reply while the model is still generating it, editing it as tokens stream in
+        reply = None
+        streamed_id = None
+        text = ""
+        last_edit = 0.0
+        async for chunk, metadata in trading_agent.astream(state, config, stream_mode="messages"):
+            if metadata.get("langgraph_node") != "chatbot" or not isinstance(chunk, AIMessageChunk) or not chunk.content:
+                continue
+            if chunk.id != streamed_id:  # A new completion (e.g. after a tool call) replaces the old text
+                streamed_id, text = chunk.id, ""
+            text += chunk.content
+            now = time.monotonic()
+            if reply is None:
+                reply = await update.message.reply_text(text)
+                last_edit = now
+            elif now - last_edit >= STREAM_EDIT_INTERVAL:
+                await reply.edit_text(text)
+                last_edit = now
+
+        snapshot = await trading_agent.aget_state(config)
+        response = snapshot.values["messages"][-1].content
         if not response:
             logger.warning(f"Empty response from agent for user {user_id}")
             await update.message.reply_text("Hmm, I’m stumped! Try again?")
             return
-        context.user_data["ai_messages"] = result["messages"]
-        await update.message.reply_text(response, parse_mode="Markdown")
+        if reply is None:
+            await update.message.reply_text(response, parse_mode="Markdown")
+        else:
+            try:
+                await reply.edit_text(response, parse_mode="Markdown")
+            except BadRequest as e:
+                if "Message is not modified" not in str(e):
+                    raise
         logger.info(f"Sent AI response to user {user_id}: {response}")
     except Exception as e:
         logger.error(f"Agent invocation failed for user {user_id}: {str(e)}")
@@ -157,33 +187,34 @@ async def main_menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
         - Provides a fallback message for unhandled options.
     """
     query = update.callback_query
+    route = _CALLBACK_ROUTES.get(query.data)
+    if route is not None:
+        await route(update, context)  # The routed handler answers the query itself
+        return
     await query.answer()
-    
+
     if query.data == "main_menu":
         await query.edit_message_text("Welcome to Not-Cotrader! Choose an option:", reply_markup=MAIN_MENU)
         logger.info(f"User {update.effective_user.id} returned to main menu")
-    elif query.data == "buy":
-        await buy_handler(update, context)  # Delegate to buy_handler
-    elif query.data == "sell":
-        await sell_handler(update, context)  # Delegate to sell_handler
-    elif query.data == "settings":
-        await settings_handler(update, context)
-    elif query.data == "wallet":
-        await wallet_handler(update, context)
-    elif query.data == "positions":
-        await positions_handler(update, context)
-    elif query.data == "pnl":
-        await pnl_handler(update, context)
-    elif query.data == "token_list":
-        await token_list_handler(update, context)
-    elif query.data == "help":
-        await help_callback_handler(update, context)
-    elif query.data == "feedback":
-        await feedback_handler(update, context)
     else:
         logger.warning(f"Unknown callback data: {query.data}")
         await query.edit_message_text("Invalid option. Use the menu below.", reply_markup=MAIN_MENU)
 
+# Exact callback_data -> callback for the menu buttons, looked up by main_menu_handler. Views that
+# are only ever opened from the menu are routed here instead of each registering its own
+# regex-matched CallbackQueryHandler; the CallbackQueryHandler exports wrap their function in .callback.
+_CALLBACK_ROUTES = {
+    "buy": buy_handler,
+    "sell": sell_handler,
+    "settings": settings_handler,
+    "wallet": wallet_handler.callback,
+    "positions": positions_handler.callback,
+    "pnl": pnl_handler.callback,
+    "token_list": token_list_handler.callback,
+    "help": help_callback_handler.callback,
+    "feedback": feedback_handler,
+}
+
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
     Handle uncaught exceptions and notify the user, suppressing 'Message is not modified' errors.
@@ -216,6 +247,65 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     else:
         logger.warning("Update object has no query or message to respond to.")
 
+async def post_init(application: Application) -> None:
+    """
+    Open the shared HTTP session before the first update is handled.
+
+    The session is also exposed as bot_data["http"] for handlers that want it from the context.
+
+    Args:
+        application (Application): The Telegram application being started.
+    """
+    application.bot_data["http"] = get_http_session()
+
+async def post_shutdown(application: Application) -> None:
+    """
+    Release process-wide resources once the application has stopped.
+
+    Args:
+        application (Application): The Telegram application being shut down.
+    """
+    await close_http_session()
+    await close_solana_clients()
+
+async def run_webhook(application: Application) -> None:
+    """
+    Serve updates pushed by Telegram to WEBHOOK_URL until the process is interrupted.
+
+    The aiohttp server only validates the secret header and queues each update; the
+    application processes them exactly as it would polled ones.
+
+    Args:
+        application (Application): The Telegram application, built without an Updater.
+    """
+    async def receive_update(request: web.Request) -> web.Response:
+        if WEBHOOK_SECRET and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != WEBHOOK_SECRET:
+            return web.Response(status=403)
+        await application.update_queue.put(Update.de_json(orjson.loads(await request.read()), application.bot))
+        return web.Response()
+
+    web_app = web.Application()
+    web_app.router.add_post(urlparse(WEBHOOK_URL).path or "/", receive_update)
+    runner = web.AppRunner(web_app)
+
+    async with application:
+        # run_polling would call these hooks itself
+        await post_init(application)
+        await application.bot.set_webhook(
+            url=WEBHOOK_URL, secret_token=WEBHOOK_SECRET, allowed_updates=Update.ALL_TYPES
+        )
+        await application.start()
+        await runner.setup()
+        await web.TCPSite(runner, WEBHOOK_LISTEN, WEBHOOK_PORT).start()
+        logger.info("Webhook server listening on %s:%s", WEBHOOK_LISTEN, WEBHOOK_PORT)
+        try:
+            await asyncio.Event().wait()  # Cancelled on Ctrl+C
+        finally:
+            await runner.cleanup()
+            await application.stop()
+            # Here rather than after the block: cancellation would skip it
+            await post_shutdown(application)
+
 def main() -> None:
     """
     Initialize and run the Telegram bot.
@@ -234,7 +324,24 @@ def main() -> None:
         - Starts the job queue for scheduled tasks.
     """
     try:
-        app = Application.builder().token(TELEGRAM_TOKEN).build()
+        request = OrjsonHTTPXRequest(
+            connection_pool_size=BOT_API_POOL_SIZE, pool_timeout=20.0, connect_timeout=10.0, read_timeout=20.0
+        )
+        builder = (
+            Application.builder()
+            .token(TELEGRAM_TOKEN)
+            .request(request)
+            .post_init(post_init)
+            .post_shutdown(post_shutdown)
+        )
+        if WEBHOOK_URL:
+            # No Updater: updates arrive through run_webhook's server
+            builder = builder.updater(None)
+        else:
+            builder = builder.get_updates_request(
+                OrjsonHTTPXRequest(connection_pool_size=GET_UPDATES_POOL_SIZE, pool_timeout=20.0)
+            )
+        app = builder.build()
 
         # Register handlers
         app.add_handler(CommandHandler("ai", ai_command))
@@ -250,13 +357,10 @@ def main() -> None:
         # Single text message handler
         app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text_message))
         app.add_handler(help_command_handler)
-        app.add_handler(help_callback_handler)
         app.add_handler(settings_command_handler)
         app.add_handler(settings_callback_handler)
         app.add_handler(settings_input_handler)
-        app.add_handler(positions_handler)
-        app.add_handler(pnl_handler)
-        app.add_handler(token_list_handler)
+        # Catch-all: positions, pnl, token_list and help are dispatched by exact match here
         app.add_handler(CallbackQueryHandler(main_menu_handler))
         # Error handler
         app.add_error_handler(error_handler)
@@ -265,7 +369,13 @@ def main() -> None:
         app.job_queue.start() 
 
         logger.info("Bot starting with job queue enabled...")
-        app.run_polling(allowed_updates=Update.ALL_TYPES)
+        if WEBHOOK_URL:
+            try:
+                asyncio.run(run_webhook(app))
+            except KeyboardInterrupt:
+                logger.info("Webhook server stopped")
+        else:
+            app.run_polling(allowed_updates=Update.ALL_TYPES)
     except Exception as e:
         logger.critical(f"Failed to start bot: {str(e)}", exc_info=True)
 
@@ -5,7 +5,7 @@ from sqlalchemy.future import select
 from sqlalchemy import delete
 from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy import update
-from database.models import engine, AsyncSessionFactory, Base, User, Watchlist
+from database.models import engine, AsyncSessionFactory, Base, User, Watchlist, Position
 from dotenv import load_dotenv
 import os
 
@@ -20,13 +20,14 @@ async def init_db() -> None:
     logger.info("Database tables created")
 
 async def get_async_session() -> AsyncSession:
-    """Create and return an asynchronous database session."""
-    try:
-        session = AsyncSessionFactory()
-        return session
-    except Exception as e:
-        logger.error(f"Failed to create async session: {str(e)}")
-        raise
+    """
+    Return a new session from the shared AsyncSessionFactory.
+
+    Creating the session is cheap and does not touch the database: a pooled connection is
+    checked out only when the session first executes a statement, and returned when it closes.
+    Code that doesn't need an awaitable can use AsyncSessionFactory() directly.
+    """
+    return AsyncSessionFactory()
 
 async def get_user(telegram_id: int, sess: AsyncSession) -> Optional[User]:
     """Fetch a user by their Telegram ID asynchronously."""
@@ -109,4 +110,39 @@ async def delete_watchlist_token(user_id: str, token_address: str, session: Asyn
     except Exception as e:
         await session.rollback()
         logger.error(f"Failed to delete watchlist token {token_address} for user {user_id}: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+
+async def get_positions(telegram_id: int, session: AsyncSession) -> Dict[str, Dict]:
+    """Retrieve a user's positions as {token_address: {"entry_price": ..., "chain": ...}} in one query."""
+    try:
+        result = await session.execute(
+            select(Position.token_address, Position.chain, Position.entry_price)
+            .join(User, Position.user_id == User.id)
+            .where(User.telegram_id == str(telegram_id))
+        )
+        return {
+            token_address: {"entry_price": entry_price, "chain": chain}
+            for token_address, chain, entry_price in result
+        }
+    except Exception as e:
+        logger.error(f"Failed to fetch positions for user {telegram_id}: {str(e)}")
+        raise
+
+async def upsert_position(telegram_id: int, token_address: str, chain: str, entry_price: float, session: AsyncSession) -> None:
+    """Record (or overwrite) the entry price of a user's position in a token."""
+    try:
+        user_id = select(User.id).where(User.telegram_id == str(telegram_id)).scalar_subquery()
+        stmt = insert(Position).values(
+            user_id=user_id, token_address=token_address, chain=chain, entry_price=entry_price
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id", "token_address"],
+            set_={"chain": chain, "entry_price": entry_price},
+        )
+        await session.execute(stmt)
+        await session.commit()
+        logger.info(f"Recorded position in {token_address} for user {telegram_id}")
+    except Exception as e:
+        await session.rollback()
+        logger.error(f"Failed to record position in {token_address} for user {telegram_id}: {str(e)}")
+        raise
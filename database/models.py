@@ -1,12 +1,21 @@
 import sqlalchemy
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Boolean, Float, ForeignKey, JSON
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 # SQLite for prototyping; w PostgreSQL in production (e.g., "postgresql+asyncpg://...")
 DATABASE_URL = "sqlite+aiosqlite:///bot.db"
-engine = create_async_engine(DATABASE_URL, echo=False)  # Set echo=True for debugging
+# Pooled connections are reused across handlers instead of being opened per session
+engine = create_async_engine(
+    DATABASE_URL,
+    echo=False,  # Set echo=True for debugging
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=25,
+    max_overflow=25,
+    pool_pre_ping=True,
+)
 Base = declarative_base()
 
 class User(Base):
@@ -25,6 +34,7 @@ class User(Base):
     ai_mode = Column(Boolean, default=False)
     wallets = relationship("Wallet", back_populates="user")  # Relationship to Wallet
     watchlist = relationship("Watchlist", back_populates="user")  
+    positions = relationship("Position", back_populates="user")
 
 class Wallet(Base):
     """
@@ -64,5 +74,28 @@ class Watchlist(Base):
         sqlalchemy.UniqueConstraint("user_id", "token_data", name="unique_user_token"),
     )
 
+class Position(Base):
+    """
+    Represents a token position opened through the bot, used for PnL in the positions view.
+
+    Columns:
+        id: Auto-incrementing primary key.
+        user_id: Foreign key to User.
+        token_address: Token mint / jetton master address.
+        chain: 'solana' or 'ton'.
+        entry_price: Native coin spent per token on the latest buy.
+    """
+    __tablename__ = "positions"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    token_address = Column(String, nullable=False)
+    chain = Column(String, nullable=False)
+    entry_price = Column(Float, nullable=False)
+    user = relationship("User", back_populates="positions")
+
+    __table_args__ = (
+        sqlalchemy.UniqueConstraint("user_id", "token_address", name="unique_user_position"),
+    )
+
 # Session factory for async database interactions
 AsyncSessionFactory = async_sessionmaker(engine, expire_on_commit=False)
\ No newline at end of file
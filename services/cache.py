@@ -0,0 +1,65 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+from cachetools import TTLCache
+
+logger = logging.getLogger(__name__)
+
+class AsyncTTLCache:
+    """
+    TTL cache for coroutine results that also de-duplicates concurrent misses (singleflight).
+
+    The first caller to miss on a key starts the fetch; callers arriving while it is in
+    flight await the same task instead of issuing their own request. None results are
+    not cached unless cache_none is set, so failed lookups are retried on the next call.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, cache_none: bool = False):
+        self._cache: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._cache_none = cache_none
+
+    async def get_or_fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Return the cached value for key, or await fetch() (once across concurrent callers).
+
+        Args:
+            key: Cache key.
+            fetch: Zero-argument callable returning the coroutine that produces the value.
+
+        Returns:
+            The cached or freshly fetched value.
+        """
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch(key, fetch))
+            # Mark the exception retrieved even if every waiter was cancelled
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[key] = task
+        # Shielded so one cancelled caller doesn't cancel the fetch the others are waiting on
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await fetch()
+            if value is not None or self._cache_none:
+                self._cache[key] = value
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def peek(self, key: Hashable) -> Any:
+        """Return the cached value for key without fetching, or None if it isn't cached."""
+        return self._cache.get(key)
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """Drop one cached key, or every entry when key is None."""
+        if key is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(key, None)
@@ -1,10 +1,77 @@
+import base64
 import logging
-from cryptography.fernet import Fernet
+import os
+from cryptography.exceptions import InvalidTag
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 
 logger = logging.getLogger(__name__)
 
-# Centralized encryption key (fixed 32-byte base64-encoded key)
-ENCRYPTION_KEY = b'MzI2NDUzMjE0NTY3ODkwMTIzNDU2Nzg5MDEyMzQ1Njc='  # Valid key
-CIPHER = Fernet(ENCRYPTION_KEY)
+# Centralized encryption key, loaded once at import. FERNET_KEY must be a 32-byte
+# url-safe base64 key. New tokens are written with it; the fixed key stays a decrypt-only
+# fallback, so wallets stored before FERNET_KEY was set remain decryptable.
+_LEGACY_ENCRYPTION_KEY = b'MzI2NDUzMjE0NTY3ODkwMTIzNDU2Nzg5MDEyMzQ1Njc='
+_env_key = os.environ.get("FERNET_KEY")
+ENCRYPTION_KEY = _env_key.encode() if _env_key else _LEGACY_ENCRYPTION_KEY
+if not _env_key:
+    logger.warning("FERNET_KEY is not set; falling back to the built-in encryption key")
 
-logger.info("Initialized CIPHER for encryption/decryption")
\ No newline at end of file
+# Fernet tokens always start with the 0x80 version byte, so a different first byte marks AES-GCM
+_AESGCM_VERSION = b"\x01"
+_NONCE_SIZE = 12
+
+class WalletCipher:
+    """
+    AES-256-GCM cipher exposing the Fernet encrypt/decrypt interface used across the codebase.
+
+    Tokens are url-safe base64 of version byte || 96-bit nonce || ciphertext+tag. AES-GCM runs on
+    the CPU's AES-NI/PCLMULQDQ instructions in a single pass, where Fernet needs AES-CBC plus a
+    separate HMAC. decrypt() still accepts Fernet tokens, so wallets stored before the switch
+    keep working; they are simply re-encrypted with AES-GCM whenever they are next written.
+
+    Like MultiFernet, it encrypts with the first key only and decrypts with each key in turn,
+    so tokens written under an older key keep working after the key changes.
+    """
+
+    def __init__(self, key: bytes, *fallback_keys: bytes):
+        keys = (key, *fallback_keys)
+        self._fernet = MultiFernet([Fernet(k) for k in keys])
+        self._aeads = [AESGCM(self._derive_aes_key(k)) for k in keys]
+
+    @staticmethod
+    def _derive_aes_key(key: bytes) -> bytes:
+        # Derive a dedicated AES key instead of reusing Fernet's signing/encryption halves
+        return HKDF(
+            algorithm=hashes.SHA256(), length=32, salt=None, info=b"not-cotrader wallet aes-gcm"
+        ).derive(base64.urlsafe_b64decode(key))
+
+    def encrypt(self, data: bytes) -> bytes:
+        nonce = os.urandom(_NONCE_SIZE)
+        ciphertext = self._aeads[0].encrypt(nonce, data, _AESGCM_VERSION)
+        return base64.urlsafe_b64encode(_AESGCM_VERSION + nonce + ciphertext)
+
+    def decrypt(self, token: bytes) -> bytes:
+        try:
+            raw = base64.urlsafe_b64decode(token)
+        except (TypeError, ValueError):
+            raise InvalidToken
+        if raw[:1] != _AESGCM_VERSION:
+            return self._fernet.decrypt(token)  # Legacy Fernet token
+        nonce, ciphertext = raw[1:1 + _NONCE_SIZE], raw[1 + _NONCE_SIZE:]
+        for aead in self._aeads:
+            try:
+                return aead.decrypt(nonce, ciphertext, _AESGCM_VERSION)
+            except (InvalidTag, ValueError):
+                continue
+        raise InvalidToken
+
+# Single shared instance; import CIPHER rather than constructing another cipher
+CIPHER = (
+    WalletCipher(ENCRYPTION_KEY, _LEGACY_ENCRYPTION_KEY)
+    if ENCRYPTION_KEY != _LEGACY_ENCRYPTION_KEY
+    else WalletCipher(ENCRYPTION_KEY)
+)
+
+logger.info("Initialized CIPHER for encryption/decryption")
@@ -0,0 +1,93 @@
+import logging
+import aiohttp
+import orjson
+from typing import Any, Optional
+from telegram.request import BaseRequest, HTTPXRequest, RequestData
+
+logger = logging.getLogger(__name__)
+
+# Sent with every request on the shared session. Upstream APIs (STON.fi, toncenter,
+# CoinGecko) only compress their JSON when asked; aiohttp decodes it transparently.
+_default_headers = {
+    "Accept": "application/json",
+    "Accept-Encoding": "gzip, deflate",
+}
+
+_session: Optional[aiohttp.ClientSession] = None
+
+def _json_dumps(obj: Any) -> str:
+    return orjson.dumps(obj).decode()
+
+async def read_json(response: aiohttp.ClientResponse) -> Any:
+    """Decode a response body with orjson (faster than aiohttp's stdlib-json response.json())."""
+    return orjson.loads(await response.read())
+
+def get_http_session() -> aiohttp.ClientSession:
+    """
+    Return the process-wide aiohttp session, creating it on first use.
+
+    Must be called from within the running event loop. The session is shared by
+    all callers, so it must never be closed by them (use close_http_session on shutdown).
+    """
+    global _session
+    if _session is None or _session.closed:
+        # Pooled keep-alive connections: repeat calls to the same API skip the TCP/TLS handshake,
+        # and resolved hostnames are reused for five minutes
+        connector = aiohttp.TCPConnector(limit=100, limit_per_host=30, ttl_dns_cache=300, keepalive_timeout=60)
+        _session = aiohttp.ClientSession(
+            connector=connector, headers=_default_headers, json_serialize=_json_dumps
+        )
+        logger.info("Created shared HTTP session")
+    return _session
+
+async def close_http_session() -> None:
+    """Close the shared aiohttp session, if one was created."""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+        logger.info("Closed shared HTTP session")
+    _session = None
+
+class _OrjsonRequestData:
+    """
+    Wraps a PTB RequestData so its JSON-encoded parameters are produced by orjson.
+
+    Follows the RequestData.json_parameters tip: non-string values of `parameters` are
+    encoded, strings are sent as is. Everything else is delegated to the wrapped object.
+    """
+
+    __slots__ = ("_data",)
+
+    def __init__(self, data: RequestData):
+        self._data = data
+
+    @property
+    def json_parameters(self) -> dict:
+        return {
+            name: value if isinstance(value, str) else orjson.dumps(value).decode()
+            for name, value in self._data.parameters.items()
+        }
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._data, name)
+
+class OrjsonHTTPXRequest(HTTPXRequest):
+    """
+    HTTPXRequest that encodes Bot API parameters and decodes replies with orjson.
+
+    Every send/edit serializes its reply_markup and other parameters; the stdlib json
+    module PTB uses by default is several times slower for these small payloads.
+    """
+
+    async def do_request(self, url: str, method: str, request_data: Optional[RequestData] = None, *args, **kwargs):
+        if request_data is not None:
+            request_data = _OrjsonRequestData(request_data)
+        return await super().do_request(url, method, request_data, *args, **kwargs)
+
+    @staticmethod
+    def parse_json_payload(payload: bytes) -> dict:
+        try:
+            return orjson.loads(payload)
+        except orjson.JSONDecodeError:
+            # orjson rejects invalid UTF-8; PTB's parser replaces it (or raises TelegramError)
+            return BaseRequest.parse_json_payload(payload)
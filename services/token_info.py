@@ -1,13 +1,27 @@
+import asyncio
 import logging
-from typing import Dict, Optional, Tuple
-from contextlib import asynccontextmanager
-from telegram.ext import CallbackQueryHandler, ContextTypes, ConversationHandler
-from blockchain.solana.token import get_solana_token_info, get_sol_price
-from blockchain.ton.token import get_ton_token_info, get_ton_price
+from typing import Dict, List, Optional, Tuple
 import aiohttp
+from cachetools import TTLCache
+from telegram.ext import ContextTypes
+from blockchain.solana.token import get_solana_token_info, get_sol_price
+from blockchain.ton.token import get_ton_token_info
+from blockchain.ton.utils import get_ton_price
+from services.cache import AsyncTTLCache
+from services.http_session import get_http_session, read_json
 
 logger = logging.getLogger(__name__)
 
+_token_info_cache = AsyncTTLCache(maxsize=1024, ttl=10)
+# Results of batched lookups, which carry fewer fields than get_token_info, kept apart for the same 10 seconds
+_batch_info_cache: TTLCache = TTLCache(maxsize=4096, ttl=10)
+# Addresses a get_token_infos call is currently fetching -> future for its info (or None)
+_inflight_infos: Dict[str, asyncio.Future] = {}
+_TON_FRIENDLY_PREFIXES = frozenset(("EQ", "UQ"))
+
+DEXSCREENER_TOKENS_API = "https://api.dexscreener.com/latest/dex/tokens"
+_DEXSCREENER_BATCH_SIZE = 30  # Most addresses Dexscreener accepts in one tokens request
+
 def detect_chain(token_address: str) -> str:
     """
     Detect the blockchain chain based on the token address format.
@@ -21,69 +35,176 @@ def detect_chain(token_address: str) -> str:
     Raises:
         ValueError: If the address format is unrecognized.
     """
-    logger.info(f"Detecting chain for address: {token_address}")
-    if len(token_address) == 48 and token_address.startswith(("EQ", "UQ")):
-        logger.info(f"TON address detected: {token_address}")
-        return "ton"
-    elif 40 <= len(token_address) <= 44 and not token_address.startswith(("EQ", "UQ")):
-        logger.info(f"Solana address detected: {token_address}")
+    # Dispatch on the prefix plus a length check only; checksums are verified by the
+    # chain-specific services. The length checks keep ordinary chat text from matching.
+    prefix = token_address[:2]
+    if prefix in _TON_FRIENDLY_PREFIXES:
+        if len(token_address) == 48:
+            return "ton"
+    elif prefix == "0:":
+        if len(token_address) == 66:  # Raw form: workchain 0 + 64 hex chars
+            return "ton"
+    elif 40 <= len(token_address) <= 44:
         return "solana"
-    else:
-        logger.error(f"Unknown chain for address: {token_address}")
-        raise ValueError("Invalid or unsupported token address")
+    logger.debug("Unknown chain for address: %s", token_address)
+    raise ValueError("Invalid or unsupported token address")
+
+def is_ton_address(token_address: str) -> bool:
+    """
+    Cheaply check whether an address has a TON format detect_chain accepts (user-friendly or raw).
+
+    Use this where the chain is already implied (e.g. TON-only tools) instead of the full,
+    logging detect_chain.
+    """
+    prefix = token_address[:2]
+    if prefix in _TON_FRIENDLY_PREFIXES:
+        return len(token_address) == 48
+    return prefix == "0:" and len(token_address) == 66
 
 async def get_token_info(token_address: str) -> Optional[Tuple[Dict, float]]:
     """
     Fetch token information and native chain price based on the detected chain.
 
+    Results are cached for a few seconds and concurrent requests for the same token share
+    one fetch, since the buy flow and the AI tools look up the same token repeatedly.
+    The returned dict is shared between callers and must not be mutated.
+
     Args:
         token_address: The token address to fetch info for.
 
     Returns:
         A tuple of (token_info dictionary, chain_price_usd), or None if fetching fails.
     """
+    return await _token_info_cache.get_or_fetch(token_address, lambda: _fetch_token_info(token_address))
+
+def invalidate_token_info(token_address: str) -> None:
+    """Drop any cached info for a token, e.g. after the user's own trade moved its price."""
+    _token_info_cache.invalidate(token_address)
+    _batch_info_cache.pop(token_address, None)
+
+async def _fetch_token_info(token_address: str) -> Optional[Tuple[Dict, float]]:
+    """Uncached implementation of get_token_info."""
     try:
         chain = detect_chain(token_address)
         logger.info(f"Fetching token info for {token_address} on chain: {chain}")
         
-        async with aiohttp.ClientSession() as session:
-            if chain == "solana":
-                token_info = await get_solana_token_info(token_address)
-                chain_price_usd = await get_sol_price(session)
-            elif chain == "ton":
-                token_info = await get_ton_token_info(token_address)
-                chain_price_usd = await get_ton_price(session)
-            else:
-                return None
-            
-            if token_info:
-                return token_info, chain_price_usd
+        if chain == "solana":
+            token_info = await get_solana_token_info(token_address)
+            chain_price_usd = await get_sol_price(get_http_session())
+        elif chain == "ton":
+            token_info = await get_ton_token_info(token_address)
+            chain_price_usd = await get_ton_price()
+        else:
             return None
+
+        if token_info:
+            return token_info, chain_price_usd
+        return None
     except ValueError as e:
         logger.error(f"Token info failed: {str(e)}")
         return None
 
-async def format_token_info(
-    token_info: Dict,
-    chain: str,
-    wallet_balance: float,
-    chain_price_usd: float,
-    context: Optional[ContextTypes.DEFAULT_TYPE] = None,
-    show_explorer_link: bool = False  # Changed default to True
-) -> str:
+async def get_token_infos(token_addresses: List[str]) -> Dict[str, Dict]:
     """
-    Format token info into a clear, readable Telegram message with dynamic trade details.
+    Fetch price and name data for many tokens (Solana and/or TON) with batched requests.
+
+    Tokens looked up in the last 10 seconds (by this function or get_token_info) are served
+    from memory, and tokens another call is already fetching are awaited rather than requested
+    again. The rest go to Dexscreener, once per 30 addresses; tokens it has no pair for
+    (or reports under a different address form) fall back to get_token_info individually.
+
+    Args:
+        token_addresses: The token addresses to look up.
+
+    Returns:
+        A dict of token address -> token_info with at least name, symbol, address and
+        price_usd. Tokens that could not be fetched are absent.
+    """
+    infos: Dict[str, Dict] = {}
+    to_fetch = []
+    waiting: Dict[str, asyncio.Future] = {}
+    for address in dict.fromkeys(token_addresses):
+        cached = _token_info_cache.peek(address)
+        info = cached[0] if cached else _batch_info_cache.get(address)
+        if info is not None:
+            infos[address] = info
+        elif address in _inflight_infos:
+            waiting[address] = _inflight_infos[address]
+        else:
+            to_fetch.append(address)
+
+    loop = asyncio.get_running_loop()
+    owned = {address: loop.create_future() for address in to_fetch}
+    _inflight_infos.update(owned)
+    try:
+        session = get_http_session()
+        batches = [
+            to_fetch[i:i + _DEXSCREENER_BATCH_SIZE]
+            for i in range(0, len(to_fetch), _DEXSCREENER_BATCH_SIZE)
+        ]
+        for batch_infos in await asyncio.gather(*(_fetch_dexscreener_batch(session, batch) for batch in batches)):
+            _batch_info_cache.update(batch_infos)
+            infos.update(batch_infos)
+
+        missing = [address for address in to_fetch if address not in infos]
+        if missing:
+            logger.info("Batched lookup missed %d token(s); fetching them individually", len(missing))
+            for address, result in zip(missing, await asyncio.gather(*(get_token_info(address) for address in missing))):
+                if result:
+                    infos[address] = result[0]
+    finally:
+        # Hand the results (None on failure or cancellation) to calls that waited on this one
+        for address, future in owned.items():
+            _inflight_infos.pop(address, None)
+            future.set_result(infos.get(address))
+
+    for address, future in waiting.items():
+        info = await asyncio.shield(future)
+        if info is not None:
+            infos[address] = info
+    return infos
+
+async def _fetch_dexscreener_batch(session: aiohttp.ClientSession, token_addresses: List[str]) -> Dict[str, Dict]:
+    """Query Dexscreener for up to 30 tokens at once, keeping the first pair listed for each."""
+    wanted = set(token_addresses)
+    infos: Dict[str, Dict] = {}
+    url = f"{DEXSCREENER_TOKENS_API}/{','.join(token_addresses)}"
+    try:
+        async with session.get(url, timeout=aiohttp.ClientTimeout(total=5)) as resp:
+            if resp.status != 200:
+                logger.warning("Dexscreener batch lookup returned %s", resp.status)
+                return infos
+            data = await read_json(resp)
+        for pair in data.get("pairs") or ():
+            base = pair.get("baseToken", {})
+            address = base.get("address")
+            if address in wanted and address not in infos and pair.get("priceUsd"):
+                infos[address] = {
+                    "name": base.get("name", "Unknown"),
+                    "symbol": base.get("symbol", "UNK"),
+                    "address": address,
+                    "price_usd": float(pair["priceUsd"]),
+                    "liquidity": float(pair.get("liquidity", {}).get("usd", 0.0)),
+                    "market_cap": float(pair.get("marketCap", pair.get("fdv", 0))),
+                }
+    except Exception as e:
+        logger.error("Dexscreener batch lookup failed: %s", e)
+    return infos
+
+def format_token_static(token_info: Dict, chain: str, show_explorer_link: bool = False) -> str:
+    """
+    Format the part of the token message that depends only on the token data.
+
+    Covers the header, address, market figures and links. Callers that redraw the same
+    token repeatedly (e.g. on refresh) can reuse the result while token_info is unchanged.
 
     Args:
         token_info: Dictionary containing token data.
         chain: The blockchain chain ('ton' or 'solana').
-        wallet_balance: User's wallet balance for trade info.
-        chain_price_usd: Current price of the chain's native token (TON or SOL) in USD.
-        context: Optional Telegram context to access user_data for trade settings.
-        show_explorer_link: Whether to show the blockchain explorer link (default: True).
+        show_explorer_link: Whether to show the blockchain explorer link (default: False).
 
     Returns:
-        A formatted string for Telegram display.
+        The static section of the Telegram message, ending with a separator line.
     """
     price_display = f"${token_info['price_usd']:.9f}" if token_info['price_usd'] > 0 else "Nil"
     liquidity_display = (
@@ -94,11 +215,6 @@ async def format_token_info(
         f"${token_info['market_cap']/1000000:.2f}m" if token_info['market_cap'] >= 1000000
         else f"${token_info['market_cap']/1000:.2f}k" if token_info['market_cap'] > 0 else "Nil"
     )
-    holders_display = (
-        f"{token_info['holders_count']/1000000:.2f}m" if token_info['holders_count'] >= 1000000
-        else f"{token_info['holders_count']/1000:.2f}k" if token_info['holders_count'] >= 1000
-        else str(token_info['holders_count']) if token_info['holders_count'] > 0 else "Nil"
-    )
     
     # Generate the explorer link, included by default if show_explorer_link is True
     explorer_link = (
@@ -121,13 +237,71 @@ async def format_token_info(
             links.append(f"[Web]({website_links[0]})")
         links_display = "Links: " + " • ".join(links) if links else "Links: Nil"
 
-    mint_display = "🟢" if token_info['mintable'] else "🔴"
-    renounced_display = "🟢" if token_info['renounced'] else "🔴"
+    # Conditionally include the explorer link in the header
+    header = (
+        f"**🟩 {token_info['symbol']} - {token_info['name']}** {explorer_display}\n"
+        if show_explorer_link else
+        f"**🟩 {token_info['symbol']} - {token_info['name']}**\n"
+    )
+
+    return (
+        f"{header}"
+        f"Address: `{token_info['address']}`\n"
+        f"─────────────────\n"
+        f"💰 Market Cap: {market_cap_display}\n"
+        f"🌊 Liquidity : {liquidity_display}\n"
+        f"📊 Price     : {price_display}\n"
+        f"─────────────────\n"
+        f"🔗 {links_display}\n"
+        f"─────────────────\n"
+    )
+
+def format_token_dynamic(
+    token_info: Dict,
+    chain: str,
+    wallet_balance: float,
+    chain_price_usd: float,
+    context: Optional[ContextTypes.DEFAULT_TYPE] = None,
+    is_sell: bool = False
+) -> str:
+    """
+    Format the trade details section, which changes with the balance and trade settings.
+
+    Args:
+        token_info: Dictionary containing token data.
+        chain: The blockchain chain ('ton' or 'solana').
+        wallet_balance: User's wallet balance for trade info.
+        chain_price_usd: Current price of the chain's native token (TON or SOL) in USD.
+        context: Optional Telegram context to access user_data for trade settings.
+        is_sell: Describe selling user_data["sell_amount"] tokens for the native coin
+            instead of a buy (default: False).
 
+    Returns:
+        The trade details section of the Telegram message.
+    """
     unit = "TON" if chain == "ton" else "SOL"
+    slippage = context.user_data.get("slippage", 5) if context else 5
+    if is_sell:
+        sell_amount = context.user_data.get("sell_amount", 1.0) if context else 1.0
+        input_usd = sell_amount * token_info['price_usd']
+        if chain_price_usd > 0:
+            min_output = input_usd / chain_price_usd * (1 - slippage / 100)
+            trade_output = (
+                f"{sell_amount} {token_info['symbol']} (${input_usd:.2f}) → "
+                f"{min_output:.6f} {unit} (${min_output * chain_price_usd:.2f})"
+            )
+        else:
+            trade_output = f"{sell_amount} {token_info['symbol']} (${input_usd:.2f}) → N/A"
+        return (
+            f"❗️ **Trade Details**\n"
+            f"Sell Amount: {sell_amount} {token_info['symbol']} • Slippage: {slippage}%\n"
+            f"Trade     : {trade_output}\n"
+            f"💸 Balance : {wallet_balance:.2f} {unit}\n"
+            f"☀️ *Set trade and tap Execute*"
+        )
+
     default_amount = 0.5 if chain == "solana" else 1.5
     buy_amount = context.user_data.get("buy_amount", default_amount) if context else default_amount
-    slippage = context.user_data.get("slippage", 5) if context else 5
 
     input_usd = buy_amount * chain_price_usd
     if token_info['price_usd'] > 0:
@@ -141,23 +315,7 @@ async def format_token_info(
     else:
         trade_output = f"{buy_amount} {unit} (${input_usd:.2f}) → N/A"
 
-    # Conditionally include the explorer link in the header
-    header = (
-        f"**🟩 {token_info['symbol']} - {token_info['name']}** {explorer_display}\n"
-        if show_explorer_link else
-        f"**🟩 {token_info['symbol']} - {token_info['name']}**\n"
-    )
-
     return (
-        f"{header}"
-        f"Address: `{token_info['address']}`\n"
-        f"─────────────────\n"
-        f"💰 Market Cap: {market_cap_display}\n"
-        f"🌊 Liquidity : {liquidity_display}\n"
-        f"📊 Price     : {price_display}\n"
-        f"─────────────────\n"
-        f"🔗 {links_display}\n"
-        f"─────────────────\n"
         f"❗️ **Trade Details**\n"
         f"Buy Amount: {buy_amount} {unit} • Slippage: {slippage}%\n"
         f"Trade     : {trade_output}\n"
@@ -165,3 +323,35 @@ async def format_token_info(
         f"☀️ *Set trade and tap Execute*"
     )
 
+def format_token_info(
+    token_info: Dict,
+    chain: str,
+    wallet_balance: float,
+    chain_price_usd: float,
+    context: Optional[ContextTypes.DEFAULT_TYPE] = None,
+    show_explorer_link: bool = False,  # Changed default to True
+    is_sell: bool = False
+) -> str:
+    """
+    Format token info into a clear, readable Telegram message with dynamic trade details.
+
+    Combines format_token_static and format_token_dynamic. This is plain string formatting
+    that takes microseconds, so it is a regular function: call it directly from handlers
+    (a thread hop would cost more than the work, and context.user_data isn't thread-safe).
+
+    Args:
+        token_info: Dictionary containing token data.
+        chain: The blockchain chain ('ton' or 'solana').
+        wallet_balance: User's wallet balance for trade info.
+        chain_price_usd: Current price of the chain's native token (TON or SOL) in USD.
+        context: Optional Telegram context to access user_data for trade settings.
+        show_explorer_link: Whether to show the blockchain explorer link (default: True).
+        is_sell: Render the trade details for a sell rather than a buy (default: False).
+
+    Returns:
+        A formatted string for Telegram display.
+    """
+    return (
+        format_token_static(token_info, chain, show_explorer_link)
+        + format_token_dynamic(token_info, chain, wallet_balance, chain_price_usd, context, is_sell)
+    )
@@ -1,13 +1,16 @@
+import asyncio
 import logging
 import os
-import aiohttp
 from pytoniq_core import Address
+from yarl import URL
 from tonutils.client import TonapiClient
 from tonutils.jetton.dex.stonfi import StonfiRouterV2
 from tonutils.jetton.dex.stonfi.v2.pton.constants import PTONAddresses
-from tonutils.utils import to_nano, to_amount
-from tonutils.wallet import WalletV4R2
+from tonutils.utils import to_amount
+from blockchain.ton.utils import REQUEST_TIMEOUT, wait_for_balance_change
+from blockchain.ton.wallet import load_ton_wallet
 from services.crypto import CIPHER
+from services.http_session import get_http_session, read_json
 from typing import Dict
 
 logger = logging.getLogger(__name__)
@@ -18,90 +21,88 @@ IS_TESTNET = os.getenv("IS_TESTNET", "False") == "True"
 DECIMALS = 9
 JETTON_DECIMALS = 9  # Assuming 9 decimals for jettons, adjust if specific tokens differ
 DEFAULT_SLIPPAGE_BPS = 50
+# STON.fi simulate URLs with the static fields pre-encoded; callers only add per-swap fields.
+_PTON_ADDRESS = PTONAddresses.TESTNET if IS_TESTNET else PTONAddresses.MAINNET
+_STONFI_SIMULATE_URL = URL("https://api.ston.fi/v1/swap/simulate")
+_STONFI_BUY_URL = _STONFI_SIMULATE_URL.with_query({"offer_address": _PTON_ADDRESS, "dex_v2": "true"})
+_STONFI_SELL_URL = _STONFI_SIMULATE_URL.with_query({"ask_address": _PTON_ADDRESS, "dex_v2": "true"})
 
 def nano_to_units(nano_amount: int, decimals: int = DECIMALS) -> float:
     """Convert nano units to human-readable units (TON or jetton)."""
     return nano_amount / 10**decimals
 
-async def get_router_address_buy(token_mint: str, amount_ton: float, slippage_bps: int) -> str:
-    url = "https://api.ston.fi/v1/swap/simulate"
-    headers = {"Accept": "application/json"}
-    slippage_tolerance = slippage_bps / 100
-    params = {
-        "offer_address": PTONAddresses.TESTNET if IS_TESTNET else PTONAddresses.MAINNET,
+async def get_router_address_buy(token_mint: str, nano_amount: int, slippage_bps: int) -> str:
+    url = _STONFI_BUY_URL.update_query({
         "ask_address": token_mint,
-        "units": to_nano(amount_ton, DECIMALS),
-        "slippage_tolerance": slippage_tolerance,
-        "dex_v2": "true",
-    }
-    logger.info(f"Fetching buy router address with params: {params}")
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, params=params, headers=headers) as response:
+        "units": nano_amount,
+        "slippage_tolerance": slippage_bps / 100,
+    })
+    logger.info("Fetching buy router address: %s", url)
+    session = get_http_session()
+    async with asyncio.timeout(REQUEST_TIMEOUT):
+        async with session.post(url) as response:
             if response.status == 200:
-                content = await response.json()
-                logger.info(f"STON.fi simulation response: {content}")
+                content = await read_json(response)
+                logger.info("STON.fi simulation response: %s", content)
                 router_address = content.get("router_address")
                 if not router_address:
                     raise ValueError("Router address not found in API response.")
                 return router_address
             else:
                 error_text = await response.text()
-                logger.error(f"Failed to get buy router address: {response.status}, {error_text}")
+                logger.error("Failed to get buy router address: %s, %s", response.status, error_text)
                 raise Exception(f"Failed to get router address: {response.status}: {error_text}")
 
-async def get_router_address_sell(from_jetton_address: str, jetton_amount: float, slippage_bps: int) -> str:
-    url = "https://api.ston.fi/v1/swap/simulate"
-    headers = {"Accept": "application/json"}
-    slippage_tolerance = slippage_bps / 100
-    params = {
+async def get_router_address_sell(from_jetton_address: str, jetton_units: int, slippage_bps: int) -> str:
+    url = _STONFI_SELL_URL.update_query({
         "offer_address": from_jetton_address,
-        "ask_address": PTONAddresses.TESTNET if IS_TESTNET else PTONAddresses.MAINNET,
-        "units": to_nano(jetton_amount, JETTON_DECIMALS),
-        "slippage_tolerance": slippage_tolerance,
-        "dex_v2": "true",
-    }
-    logger.info(f"Fetching sell router address with params: {params}")
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, params=params, headers=headers) as response:
+        "units": jetton_units,
+        "slippage_tolerance": slippage_bps / 100,
+    })
+    logger.info("Fetching sell router address: %s", url)
+    session = get_http_session()
+    async with asyncio.timeout(REQUEST_TIMEOUT):
+        async with session.post(url) as response:
             if response.status == 200:
-                content = await response.json()
-                logger.info(f"STON.fi simulation response: {content}")
+                content = await read_json(response)
+                logger.info("STON.fi simulation response: %s", content)
                 router_address = content.get("router_address")
                 if not router_address:
                     raise ValueError("Router address not found in API response.")
                 return router_address
             else:
                 error_text = await response.text()
-                logger.error(f"Failed to get sell router address: {response.status}, {error_text}")
+                logger.error("Failed to get sell router address: %s, %s", response.status, error_text)
                 raise Exception(f"Failed to get router address: {response.status}: {error_text}")
 
-async def execute_ton_swap(wallet, token_mint: str, amount_ton: float, slippage_bps: int = DEFAULT_SLIPPAGE_BPS) -> Dict:
+async def execute_ton_swap(wallet, token_mint: str, nano_amount: int, slippage_bps: int = DEFAULT_SLIPPAGE_BPS) -> Dict:
     try:
         client = TonapiClient(api_key=API_KEY, is_testnet=IS_TESTNET)
         try:
             decrypted_mnemonic = CIPHER.decrypt(wallet.encrypted_private_key.encode('utf-8')).decode('utf-8')
             mnemonic_list = decrypted_mnemonic.split()
-            ton_wallet, _, _, _ = WalletV4R2.from_mnemonic(client, mnemonic_list)
+            ton_wallet = load_ton_wallet(client, mnemonic_list, wallet.public_key)
         except Exception as e:
-            logger.error(f"Failed to decrypt mnemonic: {str(e)}")
+            logger.error("Failed to decrypt mnemonic: %s", e)
             raise ValueError("Invalid encrypted mnemonic or decryption key")
 
         wallet_balance_before = await client.get_account_balance(ton_wallet.address.to_str())
-        logger.info(f"Wallet balance before buy: {nano_to_units(wallet_balance_before):.9f} TON")
+        logger.info("Wallet balance before buy: %.9f TON", nano_to_units(wallet_balance_before))
 
-        router_address = await get_router_address_buy(token_mint, amount_ton, slippage_bps)
+        router_address = await get_router_address_buy(token_mint, nano_amount, slippage_bps)
         router = StonfiRouterV2(client, router_address=Address(router_address))
 
-        offer_amount = to_nano(amount_ton, DECIMALS)
-        min_ask_amount = int(offer_amount * (1 - slippage_bps / 10000))
-        to, value, body = await router.get_swap_ton_to_jetton_tx_params(
-            user_wallet_address=ton_wallet.address,
-            receiver_address=ton_wallet.address,
-            offer_jetton_address=Address(token_mint),
-            offer_amount=offer_amount,
-            min_ask_amount=min_ask_amount,
-            refund_address=ton_wallet.address,
-        )
+        offer_amount = nano_amount
+        min_ask_amount = offer_amount * (10_000 - slippage_bps) // 10_000
+        async with asyncio.timeout(REQUEST_TIMEOUT):
+            to, value, body = await router.get_swap_ton_to_jetton_tx_params(
+                user_wallet_address=ton_wallet.address,
+                receiver_address=ton_wallet.address,
+                offer_jetton_address=Address(token_mint),
+                offer_amount=offer_amount,
+                min_ask_amount=min_ask_amount,
+                refund_address=ton_wallet.address,
+            )
 
         if value > wallet_balance_before:
             wallet_address = ton_wallet.address.to_str(is_bounceable=False)
@@ -113,44 +114,45 @@ async def execute_ton_swap(wallet, token_mint: str, amount_ton: float, slippage_
             amount=to_amount(value),
             body=body,
         )
-        logger.info(f"TON buy transaction sent: {tx_hash}")
+        logger.info("TON buy transaction sent: %s", tx_hash)
 
-        wallet_balance_after = await client.get_account_balance(ton_wallet.address.to_str())
+        wallet_balance_after = await wait_for_balance_change(client, ton_wallet.address.to_str(), wallet_balance_before)
         total_deducted = wallet_balance_before - wallet_balance_after
         gas_fees_used = total_deducted - offer_amount
         return {"tx_id": tx_hash, "gas_fees_used": gas_fees_used}
 
     except Exception as e:
-        logger.error(f"Failed to execute TON buy: {str(e)}", exc_info=True)
+        logger.error("Failed to execute TON buy: %s", e, exc_info=True)
         raise
 
-async def execute_jetton_to_ton_swap(wallet, from_jetton_address: str, jetton_amount: float, slippage_bps: int = DEFAULT_SLIPPAGE_BPS) -> Dict:
+async def execute_jetton_to_ton_swap(wallet, from_jetton_address: str, jetton_units: int, slippage_bps: int = DEFAULT_SLIPPAGE_BPS) -> Dict:
     try:
         client = TonapiClient(api_key=API_KEY, is_testnet=IS_TESTNET)
         try:
             decrypted_mnemonic = CIPHER.decrypt(wallet.encrypted_private_key.encode('utf-8')).decode('utf-8')
             mnemonic_list = decrypted_mnemonic.split()
-            ton_wallet, _, _, _ = WalletV4R2.from_mnemonic(client, mnemonic_list)
+            ton_wallet = load_ton_wallet(client, mnemonic_list, wallet.public_key)
         except Exception as e:
-            logger.error(f"Failed to decrypt mnemonic: {str(e)}")
+            logger.error("Failed to decrypt mnemonic: %s", e)
             raise ValueError("Invalid encrypted mnemonic or decryption key")
 
         ton_balance_before = await client.get_account_balance(ton_wallet.address.to_str())
-        logger.info(f"TON balance before sell: {nano_to_units(ton_balance_before):.9f} TON")
+        logger.info("TON balance before sell: %.9f TON", nano_to_units(ton_balance_before))
 
-        router_address = await get_router_address_sell(from_jetton_address, jetton_amount, slippage_bps)
+        router_address = await get_router_address_sell(from_jetton_address, jetton_units, slippage_bps)
         router = StonfiRouterV2(client, router_address=Address(router_address))
 
-        offer_amount = to_nano(jetton_amount, JETTON_DECIMALS)
-        min_ask_amount = int(offer_amount * (1 - slippage_bps / 10000))
-        to, value, body = await router.get_swap_jetton_to_ton_tx_params(
-            offer_jetton_address=Address(from_jetton_address),
-            receiver_address=ton_wallet.address,
-            user_wallet_address=ton_wallet.address,
-            offer_amount=offer_amount,
-            min_ask_amount=min_ask_amount,
-            refund_address=ton_wallet.address,
-        )
+        offer_amount = jetton_units
+        min_ask_amount = offer_amount * (10_000 - slippage_bps) // 10_000
+        async with asyncio.timeout(REQUEST_TIMEOUT):
+            to, value, body = await router.get_swap_jetton_to_ton_tx_params(
+                offer_jetton_address=Address(from_jetton_address),
+                receiver_address=ton_wallet.address,
+                user_wallet_address=ton_wallet.address,
+                offer_amount=offer_amount,
+                min_ask_amount=min_ask_amount,
+                refund_address=ton_wallet.address,
+            )
 
         if value > ton_balance_before:
             wallet_address = ton_wallet.address.to_str(is_bounceable=False)
@@ -162,12 +164,12 @@ async def execute_jetton_to_ton_swap(wallet, from_jetton_address: str, jetton_am
             amount=to_amount(value),
             body=body,
         )
-        logger.info(f"Jetton-to-TON sell transaction sent: {tx_hash}")
+        logger.info("Jetton-to-TON sell transaction sent: %s", tx_hash)
 
-        ton_balance_after = await client.get_account_balance(ton_wallet.address.to_str())
+        ton_balance_after = await wait_for_balance_change(client, ton_wallet.address.to_str(), ton_balance_before)
         gas_fees_used = ton_balance_before - ton_balance_after
         return {"tx_id": tx_hash, "gas_fees_used": gas_fees_used}
 
     except Exception as e:
-        logger.error(f"Failed to execute jetton-to-TON sell: {str(e)}", exc_info=True)
+        logger.error("Failed to execute jetton-to-TON sell: %s", e, exc_info=True)
         raise
\ No newline at end of file
@@ -1,23 +1,85 @@
+import asyncio
 import logging
 import os
-from blockchain.solana.utils import get_sol_balance, get_sol_price
+import time
+from decimal import Decimal, ROUND_DOWN, ROUND_HALF_UP
+from blockchain.solana.utils import get_sol_balance, get_sol_price, get_solana_client
 from blockchain.ton.utils import get_ton_balance, get_ton_price
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.constants import ParseMode
+from telegram.error import BadRequest
 from telegram.ext import ContextTypes
-from database.db import get_async_session
-from services.wallet_management import get_wallet
-import aiohttp
-from solana.rpc.async_api import AsyncClient as SolanaAsyncClient
+from bot.handlers.constants import MAIN_MENU_BTN
+from services.wallet_management import cached_get_wallets
+from services.cache import AsyncTTLCache
+from services.http_session import get_http_session
 from spl.token.constants import TOKEN_PROGRAM_ID
 from solders.pubkey import Pubkey
 
 logger = logging.getLogger(__name__)
 
+def to_base_units(amount, decimals: int = 9) -> int:
+    """
+    Convert a human amount (e.g. 1.5 TON) to integer base units (nanoTON, lamports, jetton units).
+
+    The amount goes through Decimal (floats via their shortest repr), so 0.1 TON is exactly
+    100_000_000 nanoTON. Fractions of a base unit are truncated.
+    """
+    return int((Decimal(str(amount)) * 10**decimals).to_integral_value(rounding=ROUND_DOWN))
+
+# Native balance kept back for fees on withdrawals, in lamports / nanoTON
+GAS_RESERVE_UNITS = {"solana": 100_000, "ton": 3_000_000}
+
+def percent_to_bps(percent) -> int:
+    """Convert a slippage percentage (e.g. 0.5 or "5") to integer basis points (50, 500)."""
+    return int((Decimal(str(percent)) * 100).to_integral_value(rounding=ROUND_HALF_UP))
+
 TON_API_KEY = os.getenv("TON_API_KEY", "AGVENPU5U7V6FDQAAAAEOR3JTJPI7Q7EFPHIOEUOEVVEHZ452BPDMPC2JCBNKBBWTJMHCBI")
 IS_TESTNET = os.getenv("IS_TESTNET", "False") == "True"
 SOLANA_RPC_ENDPOINT = "https://api.mainnet-beta.solana.com"  # Adjust for testnet if needed
 
 
+_BALANCE_FETCHERS = {"solana": get_sol_balance, "ton": get_ton_balance}
+_PRICE_FETCHERS = {"solana": get_sol_price, "ton": get_ton_price}
+# Native coin prices are the same for every user and move slowly; share them for 15 seconds
+_chain_price_cache = AsyncTTLCache(maxsize=4, ttl=15)
+
+async def _fetch_chain_price(chain: str):
+    price = await _PRICE_FETCHERS[chain]()
+    return price or None  # Failed lookups come back as 0.0; returning None keeps them out of the cache
+
+async def get_chain_price_usd(chain: str) -> float:
+    """
+    Get the USD price of a chain's native token (SOL or TON), cached across users for 15 seconds.
+
+    Args:
+        chain (str): The blockchain ('solana' or 'ton').
+
+    Returns:
+        float: The price in USD, or 0.0 if it could not be fetched.
+    """
+    return await _chain_price_cache.get_or_fetch(chain, lambda: _fetch_chain_price(chain)) or 0.0
+
+# Wallet and token balances, keyed by (address, chain) and (address, token, chain). Menu
+# refreshes mostly land within seconds of each other, so these answer them without an RPC.
+# Failed lookups are not cached; call invalidate_balance_cache after a trade or withdrawal.
+_balance_cache = AsyncTTLCache(maxsize=10_000, ttl=15)
+_token_balance_cache = AsyncTTLCache(maxsize=10_000, ttl=15)
+
+def invalidate_balance_cache(wallet_address: str, chain: str, token_address: str = None) -> None:
+    """
+    Drop the cached native balance of a wallet, and optionally its balance of one token.
+
+    Args:
+        wallet_address (str): The wallet address whose balance changed.
+        chain (str): The blockchain ('solana' or 'ton').
+        token_address (str, optional): The token traded, if any.
+    """
+    chain = chain.lower()
+    _balance_cache.invalidate((wallet_address, chain))
+    if token_address is not None:
+        _token_balance_cache.invalidate((wallet_address, token_address, chain))
+
 async def get_wallet_balance_and_usd(wallet_address: str, chain: str) -> tuple[float, float]:
     """
     Get the balance and USD equivalent for a wallet address on a specified chain.
@@ -39,23 +101,68 @@ async def get_wallet_balance_and_usd(wallet_address: str, chain: str) -> tuple[f
     Raises:
         Exception: If balance or price retrieval fails (caught and logged).
     """
+    chain = chain.lower()
+    result = await _balance_cache.get_or_fetch(
+        (wallet_address, chain), lambda: _fetch_wallet_balance_and_usd(wallet_address, chain)
+    )
+    return result if result is not None else (0.0, 0.0)
+
+async def _fetch_wallet_balance_and_usd(wallet_address: str, chain: str):
+    """Uncached get_wallet_balance_and_usd; returns None on failure so the result isn't cached."""
     try:
-        if chain.lower() == "solana":
-            balance = await get_sol_balance(wallet_address)
-            price = await get_sol_price()
-        elif chain.lower() == "ton":
-            balance = await get_ton_balance(wallet_address)
-            price = await get_ton_price()
-        else:
+        if chain not in _BALANCE_FETCHERS:
             logger.error(f"Unsupported chain: {chain}")
-            return 0.0, 0.0
+            return None
+        # The balance RPC and the price lookup are independent; run them together
+        balance, price = await asyncio.gather(
+            _BALANCE_FETCHERS[chain](wallet_address), get_chain_price_usd(chain)
+        )
 
         usd_value = balance * price
         logger.info(f"Calculated USD value for {wallet_address} on {chain}: ${usd_value}")
         return balance, usd_value
     except Exception as e:
         logger.error(f"Error in get_wallet_balance_and_usd for {wallet_address}: {str(e)}")
+        return None
+
+async def get_wallet_balance_or_zero(wallet, chain: str) -> tuple[float, float]:
+    """
+    Like get_wallet_balance_and_usd, but takes a wallet row that may be None.
+
+    Lets callers gather the balances of several optional wallets in one call.
+
+    Args:
+        wallet: The Wallet object, or None if the user has no wallet on this chain.
+        chain (str): The blockchain to use ('solana' or 'ton').
+
+    Returns:
+        tuple[float, float]: (balance, usd_value), or (0.0, 0.0) when wallet is None.
+    """
+    if wallet is None:
         return 0.0, 0.0
+    return await get_wallet_balance_and_usd(wallet.public_key, chain)
+
+# Supported chains and their native coin symbols, in display order
+CHAINS = (("solana", "SOL"), ("ton", "TON"))
+
+async def fetch_natives(user_id: int) -> tuple:
+    """
+    Look up a user's wallets on every chain in CHAINS together with their native balances.
+
+    The wallets come from one cached_get_wallets call; the balances are then fetched concurrently.
+
+    Args:
+        user_id (int): The Telegram user ID.
+
+    Returns:
+        tuple: One (wallet or None, balance, usd_value) per entry of CHAINS, in the same order;
+            the amounts are 0.0 when there is no wallet.
+    """
+    wallets = await cached_get_wallets(user_id, [chain for chain, _ in CHAINS])
+    balances = await asyncio.gather(
+        *(get_wallet_balance_or_zero(wallets.get(chain), chain) for chain, _ in CHAINS)
+    )
+    return tuple((wallets.get(chain), balance, usd_value) for (chain, _), (balance, usd_value) in zip(CHAINS, balances))
 
 async def get_token_balance(public_key: str, token_address: str, chain: str) -> float:
     """
@@ -72,53 +179,117 @@ async def get_token_balance(public_key: str, token_address: str, chain: str) ->
     Raises:
         Exception: If balance retrieval fails (caught and logged, returns 0.0).
     """
+    chain = chain.lower()
+    balance = await _token_balance_cache.get_or_fetch(
+        (public_key, token_address, chain), lambda: _fetch_token_balance(public_key, token_address, chain)
+    )
+    return balance if balance is not None else 0.0
+
+async def _fetch_token_balance(public_key: str, token_address: str, chain: str):
+    """Uncached get_token_balance; returns None on failure so the result isn't cached."""
     try:
-        if chain.lower() == "solana":
+        if chain == "solana":
             # Solana SPL token balance
-            async with SolanaAsyncClient(SOLANA_RPC_ENDPOINT) as client:
-                # Get the token account address (Associated Token Account)
-                token_mint = Pubkey(token_address)
-                wallet_pubkey = Pubkey(public_key)
-                ata = Pubkey.find_program_address(
-                    [bytes(wallet_pubkey), bytes(TOKEN_PROGRAM_ID), bytes(token_mint)],
-                    TOKEN_PROGRAM_ID
-                )[0]
-
-                # Fetch token account balance
-                response = await client.get_token_account_balance(ata)
-                if "result" in response and "value" in response["result"]:
-                    amount = int(response["result"]["value"]["amount"])
-                    decimals = int(response["result"]["value"]["decimals"])
-                    balance = amount / 10**decimals
-                    logger.info(f"Solana token balance for {public_key} ({token_address}): {balance}")
-                    return balance
-                else:
-                    logger.warning(f"No token account found for {public_key} with mint {token_address}")
-                    return 0.0
-
-        elif chain.lower() == "ton":
+            client = get_solana_client(SOLANA_RPC_ENDPOINT)
+            # Get the token account address (Associated Token Account)
+            token_mint = Pubkey(token_address)
+            wallet_pubkey = Pubkey(public_key)
+            ata = Pubkey.find_program_address(
+                [bytes(wallet_pubkey), bytes(TOKEN_PROGRAM_ID), bytes(token_mint)],
+                TOKEN_PROGRAM_ID
+            )[0]
+
+            # Fetch token account balance
+            response = await client.get_token_account_balance(ata)
+            if "result" in response and "value" in response["result"]:
+                amount = int(response["result"]["value"]["amount"])
+                decimals = int(response["result"]["value"]["decimals"])
+                balance = amount / 10**decimals
+                logger.info(f"Solana token balance for {public_key} ({token_address}): {balance}")
+                return balance
+            else:
+                logger.warning(f"No token account found for {public_key} with mint {token_address}")
+                return 0.0
+
+        elif chain == "ton":
             # TON jetton balance via TonAPI
             url = f"https://{'testnet.' if IS_TESTNET else ''}tonapi.io/v2/accounts/{public_key}/jettons/{token_address}"
             headers = {"Authorization": f"Bearer {TON_API_KEY}"}
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=headers) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        balance_nano = int(data.get("balance", 0))  # Nano units
-                        # Fetch jetton decimals (assuming 9 if not provided; ideally fetch from contract)
-                        decimals = 9  # Adjust if you have a way to fetch this dynamically
-                        balance = balance_nano / 10**decimals
-                        logger.info(f"TON jetton balance for {public_key} ({token_address}): {balance}")
-                        return balance
-                    else:
-                        logger.error(f"Failed to fetch TON jetton balance: {response.status}, {await response.text()}")
-                        return 0.0
+            session = get_http_session()
+            async with session.get(url, headers=headers) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    balance_nano = int(data.get("balance", 0))  # Nano units
+                    # Fetch jetton decimals (assuming 9 if not provided; ideally fetch from contract)
+                    decimals = 9  # Adjust if you have a way to fetch this dynamically
+                    balance = balance_nano / 10**decimals
+                    logger.info(f"TON jetton balance for {public_key} ({token_address}): {balance}")
+                    return balance
+                else:
+                    logger.error(f"Failed to fetch TON jetton balance: {response.status}, {await response.text()}")
+                    return None
         else:
             logger.error(f"Unsupported chain for token balance: {chain}")
-            return 0.0
+            return None
     except Exception as e:
         logger.error(f"Error fetching token balance for {public_key} on {chain}: {str(e)}")
-        return 0.0
+        return None
+
+# Minimum seconds between two refreshes of the same view by one user
+REFRESH_COOLDOWN = 1.5
+
+def on_cooldown(context: ContextTypes.DEFAULT_TYPE, key: str, cooldown: float = REFRESH_COOLDOWN) -> bool:
+    """
+    Return True if the action tracked under key ran less than cooldown seconds ago for this user.
+
+    Otherwise record the current time under key in context.user_data and return False.
+    """
+    now = time.monotonic()
+    if now - context.user_data.get(key, float("-inf")) < cooldown:
+        return True
+    context.user_data[key] = now
+    return False
+
+async def edit_if_changed(query, context: ContextTypes.DEFAULT_TYPE, text: str, reply_markup=None, parse_mode="Markdown") -> bool:
+    """
+    Edit the callback query's message unless it already shows this text and markup.
+
+    After each edit, context.chat_data records the message id, a hash of what was rendered
+    and a hash of the message Telegram sent back. The edit is skipped only when the same view
+    is rendered again and the message still matches that reply, so an edit made elsewhere
+    (another handler moving to a different screen) is never mistaken for this view.
+    A "message is not modified" reply is swallowed.
+
+    Args:
+        query: The callback query whose message is edited.
+        context (ContextTypes.DEFAULT_TYPE): The Telegram context object.
+        text (str): The new message text.
+        reply_markup: The new inline keyboard, if any.
+        parse_mode (str): Parse mode for the text (default: "Markdown").
+
+    Returns:
+        bool: True if the message was edited, False if the edit was skipped.
+    """
+    message = query.message
+    # PTB keyboards are immutable and hashable, so the markup hashes without serialising it
+    render = hash((text, reply_markup))
+    current = hash((message.text, message.reply_markup))
+    if context.chat_data.get("_last_msg_hash") == (message.message_id, render, current):
+        return False
+    try:
+        edited = await query.edit_message_text(text, reply_markup=reply_markup, parse_mode=parse_mode)
+    except BadRequest as e:
+        if "not modified" not in str(e):
+            raise
+        edited = message
+    if edited is True:
+        # Inline messages return no Message to fingerprint
+        context.chat_data.pop("_last_msg_hash", None)
+    else:
+        context.chat_data["_last_msg_hash"] = (
+            message.message_id, render, hash((edited.text, edited.reply_markup))
+        )
+    return True
 
 async def refresh_handler(update: Update, context: ContextTypes.DEFAULT_TYPE, callback_data: str, prev_message_func: callable) -> None:
     """
@@ -137,26 +308,26 @@ async def refresh_handler(update: Update, context: ContextTypes.DEFAULT_TYPE, ca
         None
 
     Notes:
-        - Uses context.user_data to store and compare old/new message content and markup.
-        - Logs whether an update was skipped or applied.
+        - prev_message_func stores the new content and markup in context.user_data.
+        - The edit goes through edit_if_changed, so an unchanged view is not re-sent.
     """
     query = update.callback_query
+    user_id = update.effective_user.id
+    if on_cooldown(context, "_last_refresh_ts"):
+        # Repeated taps just get acknowledged; they don't re-run the RPC lookups
+        await query.answer("Please wait…")
+        return
     await query.answer()
-    user_id = str(update.effective_user.id)
-
-    old_msg = context.user_data.get(f"last_{callback_data}_msg", "")
-    old_markup = context.user_data.get(f"last_{callback_data}_markup", None)
 
     await prev_message_func(update, context)
 
     new_msg = context.user_data.get(f"last_{callback_data}_msg", "")
     new_markup = context.user_data.get(f"last_{callback_data}_markup", None)
 
-    if old_msg == new_msg and old_markup == new_markup:
-        logger.debug(f"No changes detected for {callback_data} - skipping update for user {user_id}")
-    else:
-        await query.edit_message_text(new_msg, reply_markup=new_markup, parse_mode="Markdown")
+    if await edit_if_changed(query, context, new_msg, new_markup):
         logger.info(f"Refreshed view for user {user_id} with callback: {callback_data}")
+    else:
+        logger.debug(f"No changes detected for {callback_data} - skipping update for user {user_id}")
 
 async def main_menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
@@ -175,30 +346,28 @@ async def main_menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
     Notes:
         - Fetches wallet addresses and balances from the database and blockchain utils.
         - Displays 'Not set' for wallets not configured by the user.
-        - Uses Markdown formatting for the message with clickable addresses.
+        - Uses HTML formatting for the message with tap-to-copy addresses.
     """
     query = update.callback_query
     await query.answer()
-    user_id = str(update.effective_user.id)
+    user_id = update.effective_user.id
 
-    async with await get_async_session() as session:
-        sol_wallet = await get_wallet(user_id, "solana", session)
-        ton_wallet = await get_wallet(user_id, "ton", session)
-        sol_address = sol_wallet.public_key if sol_wallet else "Not set"
-        ton_address = ton_wallet.public_key if ton_wallet else "Not set"
-        sol_balance, sol_usd = await get_wallet_balance_and_usd(sol_address, "solana") if sol_wallet else (0.0, 0.0)
-        ton_balance, ton_usd = await get_wallet_balance_and_usd(ton_address, "ton") if ton_wallet else (0.0, 0.0)
+    # One wallet query for both chains, then both balances concurrently
+    (sol_wallet, sol_balance, sol_usd), (ton_wallet, ton_balance, ton_usd) = await fetch_natives(user_id)
+    sol_address = sol_wallet.public_key if sol_wallet else "Not set"
+    ton_address = ton_wallet.public_key if ton_wallet else "Not set"
 
     from bot.handlers.start import TRADING_MENU
     msg = (
         "Not-Cotrader\n\n"
-        f"Sol-Wallet: {sol_balance:.2f} SOL (${sol_usd:.2f})\n`{sol_address}`\n(tap to copy)\n\n"
-        f"TON-Wallet: {ton_balance:.2f} TON (${ton_usd:.2f})\n`{ton_address}`\n(tap to copy)\n\n"
+        f"Sol-Wallet: {sol_balance:.2f} SOL (${sol_usd:.2f})\n<code>{sol_address}</code>\n(tap to copy)\n\n"
+        f"TON-Wallet: {ton_balance:.2f} TON (${ton_usd:.2f})\n<code>{ton_address}</code>\n(tap to copy)\n\n"
         "Start trading by typing a mint/contract address"
     )
-    await query.edit_message_text(msg, reply_markup=TRADING_MENU, parse_mode="Markdown")
+    await query.edit_message_text(msg, reply_markup=TRADING_MENU, parse_mode=ParseMode.HTML)
     logger.info(f"Returned to TRADING_MENU for user {user_id}")
 
+
 def add_common_buttons(keyboard: list, callback_data: str) -> InlineKeyboardMarkup:
     """
     Add reusable 'Refresh' and 'Main Menu' buttons to an existing keyboard.
@@ -213,9 +382,6 @@ def add_common_buttons(keyboard: list, callback_data: str) -> InlineKeyboardMark
     Returns:
         InlineKeyboardMarkup: The updated keyboard markup with added buttons.
     """
-    common_buttons = [
-        InlineKeyboardButton("Refresh", callback_data=f"refresh_{callback_data}"),
-        InlineKeyboardButton("Main Menu", callback_data="main_menu")
-    ]
-    keyboard.insert(0, common_buttons)
+    # Only the Refresh button depends on callback_data; the Main Menu button is shared
+    keyboard.insert(0, [InlineKeyboardButton("Refresh", callback_data=f"refresh_{callback_data}"), MAIN_MENU_BTN])
     return InlineKeyboardMarkup(keyboard)
\ No newline at end of file
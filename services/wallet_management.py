@@ -1,14 +1,18 @@
 import logging
-from typing import Optional
+from typing import Dict, Iterable, Optional, Union
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from database.db import get_async_session, get_user
-from database.models import User, Wallet
+from cachetools import TTLCache
+from database.db import get_user
+from database.models import AsyncSessionFactory, User, Wallet
 from blockchain.solana.wallet import create_solana_wallet
 from blockchain.ton.wallet import create_ton_wallet
 
 logger = logging.getLogger(__name__)
 
+# Wallet rows keyed by (user_id, chain); they only change when a wallet is created
+_wallet_cache: TTLCache = TTLCache(maxsize=4096, ttl=30)
+
 async def create_user_wallet(user_id: str, chain: str, session: AsyncSession) -> Optional[Wallet]:
     """
     Create a custodial wallet for a user on the specified chain asynchronously.
@@ -74,6 +78,7 @@ async def create_user_wallet(user_id: str, chain: str, session: AsyncSession) ->
             user.has_wallet = True
 
         await session.commit()
+        invalidate_wallet_cache(user_id, chain)
         logger.info(f"Created {chain} wallet for user {user_id}: {public_key}")
         return wallet
 
@@ -124,4 +129,103 @@ async def get_wallet(user_id: str, chain: str, session: AsyncSession) -> Optiona
 
     except Exception as e:
         logger.error(f"Error fetching wallet for {user_id} on {chain}: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+
+async def get_wallets(user_id: Union[int, str], session: AsyncSession, chains: Iterable[str] = ("solana", "ton")) -> Dict[str, Wallet]:
+    """
+    Retrieve a user's wallets on several chains with a single query.
+
+    Unlike calling get_wallet per chain, the user lookup is folded into the wallet query
+    as a join, so this is one database round-trip regardless of the number of chains.
+
+    Args:
+        user_id (Union[int, str]): The user's Telegram ID.
+        session (AsyncSession): An active SQLAlchemy asynchronous session.
+        chains (Iterable[str]): The chains to fetch (default: solana and ton).
+
+    Returns:
+        Dict[str, Wallet]: Wallets keyed by chain; chains without a wallet are absent.
+
+    Raises:
+        Exception: If the database query fails (logged and raised).
+    """
+    chains = list(chains)
+    try:
+        result = await session.execute(
+            select(Wallet)
+            .join(User, Wallet.user_id == User.id)
+            .where(User.telegram_id == str(user_id), Wallet.chain.in_(chains))
+        )
+        return {wallet.chain: wallet for wallet in result.scalars()}
+    except Exception as e:
+        logger.error(f"Error fetching wallets for {user_id} on {chains}: {str(e)}")
+        raise
+
+async def cached_get_wallets(user_id: Union[int, str], chains: Iterable[str] = ("solana", "ton")) -> Dict[str, Wallet]:
+    """
+    Retrieve a user's wallets on several chains, querying only for those not already cached.
+
+    Shares the cache with cached_get_wallet; at most one get_wallets query is issued.
+
+    Args:
+        user_id (Union[int, str]): The user's Telegram ID.
+        chains (Iterable[str]): The chains to fetch (default: solana and ton).
+
+    Returns:
+        Dict[str, Wallet]: The (detached) wallets keyed by chain; chains without a wallet are absent.
+    """
+    key = str(user_id)
+    wallets: Dict[str, Wallet] = {}
+    missing = []
+    for chain in chains:
+        wallet = _wallet_cache.get((key, chain))
+        if wallet is None:
+            missing.append(chain)
+        else:
+            wallets[chain] = wallet
+    if missing:
+        async with AsyncSessionFactory() as session:
+            fetched = await get_wallets(key, session, missing)
+        for chain, wallet in fetched.items():
+            _wallet_cache[(key, chain)] = wallet
+        wallets.update(fetched)
+    return wallets
+
+async def cached_get_wallet(user_id: Union[int, str], chain: str) -> Optional[Wallet]:
+    """
+    Retrieve a user’s wallet for a specific chain, serving repeat lookups from memory.
+
+    Wallets found in the database are cached for 30 seconds, so the several lookups
+    made during a single buy or AI tool flow cost one query. Misses are not cached,
+    so a wallet created moments later is picked up immediately.
+
+    Args:
+        user_id (Union[int, str]): The user's Telegram ID; handlers may pass update.effective_user.id as is.
+        chain (str): The blockchain to retrieve the wallet for ('solana' or 'ton').
+
+    Returns:
+        Optional[Wallet]: The (detached) Wallet object if found, None otherwise.
+
+    Raises:
+        ValueError: If the chain is unsupported.
+        Exception: If the database query fails (logged and raised).
+    """
+    key = (str(user_id), chain)
+    wallet = _wallet_cache.get(key)
+    if wallet is None:
+        async with AsyncSessionFactory() as session:
+            wallet = await get_wallet(key[0], chain, session)
+        if wallet is not None:
+            _wallet_cache[key] = wallet
+    return wallet
+
+def invalidate_wallet_cache(user_id: str, chain: Optional[str] = None) -> None:
+    """
+    Drop cached wallets for a user, for one chain or (by default) all of them.
+
+    Args:
+        user_id (str): The user's Telegram ID.
+        chain (Optional[str]): The chain to invalidate; None invalidates every chain.
+    """
+    for cached_chain in ([chain] if chain else ["solana", "ton"]):
+        _wallet_cache.pop((str(user_id), cached_chain), None)